@@ -1,5 +1,8 @@
 import os
-from pymongo import MongoClient
+import threading
+from typing import Any, Dict, Optional
+
+from pymongo import MongoClient, monitoring
 
 # --- Configuration ---
 MONGODB_URI = os.getenv(
@@ -8,14 +11,137 @@ MONGODB_URI = os.getenv(
 )
 MONGODB_DB = os.getenv("MONGODB_DB", "multisport")
 
+# Pool de connexions du client partagé (un seul MongoClient par processus)
+MONGODB_POOL_OPTIONS = {
+    "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", "50")),
+    "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", "2")),
+    "maxIdleTimeMS": int(os.getenv("MONGODB_MAX_IDLE_MS", "300000")),
+    "waitQueueTimeoutMS": int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "2000")),
+    "serverSelectionTimeoutMS": int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    "connectTimeoutMS": int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000")),
+    "socketTimeoutMS": int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "10000")),
+    "retryWrites": True,
+}
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Compteurs du pool (événements CMAP de pymongo) : connexions ouvertes, empruntées, attentes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.created = 0
+        self.closed = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.clears = 0
+        self.checkout_wait_ms_total = 0.0
+        self.checkout_wait_ms_max = 0.0
+
+    def connection_created(self, event):
+        with self._lock:
+            self.created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.closed += 1
+
+    def connection_checked_out(self, event):
+        # durée de l'emprunt (attente d'une connexion libre ou ouverture TLS comprise)
+        wait_ms = (getattr(event, "duration", None) or 0.0) * 1000.0
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.checkout_wait_ms_total += wait_ms
+            self.checkout_wait_ms_max = max(self.checkout_wait_ms_max, wait_ms)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.clears += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "open": self.created - self.closed,
+                "created": self.created,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "checkout_wait_ms_mean": round(self.checkout_wait_ms_total / self.checkouts, 3) if self.checkouts else 0.0,
+                "checkout_wait_ms_max": round(self.checkout_wait_ms_max, 3),
+                "pool_cleared": self.clears,
+                "max_pool_size": MONGODB_POOL_OPTIONS["maxPoolSize"],
+            }
+
+
+pool_metrics = PoolMetrics()
+_client: Optional[MongoClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> MongoClient:
+    """Client Mongo partagé par tout le processus, créé au premier usage (thread-safe)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(MONGODB_URI, event_listeners=[pool_metrics], **MONGODB_POOL_OPTIONS)
+    return _client
+
+
+def get_database(name: str = None):
+    return get_client()[name or MONGODB_DB]
+
+
+def close_client() -> None:
+    """Ferme le client partagé (arrêt du serveur) ; le prochain get_client() en recrée un."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def pool_stats() -> Dict[str, Any]:
+    return dict(pool_metrics.stats(), connected=_client is not None)
+
 
 class DatabaseMongo:
+    """Accès à la base sur le client partagé : l'instancier ne coûte ni connexion ni handshake TLS."""
+
     def __init__(self) -> None:
-        self.client = MongoClient(MONGODB_URI)
+        self.client = get_client()
         self.db = self.client[MONGODB_DB]
-    
+
     def get_collection(self, collection_name):
         return self.db[collection_name]
-    
+
     def close(self):
-        self.client.close()
+        # le client est partagé par tout le processus : voir close_client()
+        pass
@@ -0,0 +1,271 @@
+"""
+app/availability.py
+Index de disponibilité des salles en mémoire.
+
+Pour chaque (salle, date) et (salle, jour de semaine), les créneaux occupés (planning des activités + réservations) sont
+gardés triés par heure de début, en minutes depuis minuit, avec le maximum cumulé des heures
+de fin. Un test de conflit coûte une recherche dichotomique (O(log n)) au lieu de deux requêtes
+Mongo, et compare des entiers au lieu de chaînes "HH:MM" (où "9:00" > "10:00").
+
+Sources (schéma date ISO + minutes de app/booking_schema.py) :
+ - `activite.planning` : créneaux hebdomadaires (jour de semaine), lus dans le cache du catalogue ;
+ - `reservations` : seulement celles d'aujourd'hui et après (le coût ne grossit pas avec l'historique),
+   lues une fois, puis l'index est complété à chaque réservation confirmée (`add`) et relu toutes les
+   `ttl_seconds` (réservations faites par d'autres bornes) dans un thread de fond : la requête qui
+   trouve l'index périmé répond avec l'index courant sans attendre la relecture.
+L'index est reconstruit (tout de suite) dès que l'empreinte du catalogue change.
+
+Recherche de créneaux libres (`search`) : pour toutes les salles d'une activité, une matrice
+d'occupation (salles × quarts d'heure) est construite puis les débuts possibles d'un créneau
+de `duree` minutes sont calculés d'un seul coup (sommes cumulées numpy).
+
+Variable d'environnement : AVAILABILITY_TTL_SECONDS (60).
+"""
+import bisect
+import datetime
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.booking_schema import planning_fields, reservation_fields, resolve_date
+from app.catalog import catalog, normalize_key
+from app.temporal import minutes_to_heure
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+# Créneaux proposés dans les heures d'ouverture (minutes depuis minuit)
+OPENING_HOURS = (8 * 60, 22 * 60)
+
+ReservationsLoader = Callable[[], List[Dict[str, Any]]]
+
+
+def load_reservations_from_repository() -> List[Dict[str, Any]]:
+    from app.repositories import get_repositories
+
+    return get_repositories().reservations.upcoming(datetime.date.today().isoformat())
+
+
+DayKey = Tuple[str, Any]
+
+
+def day_keys(salle: Any, jour: Any) -> List[DayKey]:
+    """
+    Clés d'index à consulter pour une salle (ObjectId ou nom, en chaîne) et un jour :
+    (salle, date ISO) pour les réservations et (salle, jour de semaine) pour le planning ;
+    jour normalisé si la date n'a pas pu être résolue.
+    """
+    date = resolve_date(jour)
+    if date is None:
+        return [(str(salle), normalize_key(jour))]
+    return [(str(salle), date), (str(salle), datetime.date.fromisoformat(date).weekday())]
+
+
+class DayIntervals:
+    """Intervalles [début, fin[ d'une salle pour un jour, triés par début."""
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        # max_ends[i] = max(ends[0..i]) : un intervalle qui commence avant `i` peut-il encore déborder ?
+        self.max_ends: List[int] = []
+
+    def add(self, start: int, end: int) -> None:
+        i = bisect.bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.max_ends.insert(i, 0)
+        running = self.max_ends[i - 1] if i else end
+        for j in range(i, len(self.ends)):
+            running = max(running, self.ends[j])
+            self.max_ends[j] = running
+
+    def overlaps(self, start: int, end: int) -> bool:
+        """Vrai si un intervalle chevauche [start, end[."""
+        i = bisect.bisect_left(self.starts, end)  # intervalles qui commencent avant `end`
+        return i > 0 and self.max_ends[i - 1] > start
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def intervals(self) -> List[Tuple[int, int]]:
+        return list(zip(self.starts, self.ends))
+
+
+def build_index(activites: Iterable[Dict[str, Any]], reservations: Iterable[Dict[str, Any]]) -> Dict[DayKey, DayIntervals]:
+    days: Dict[DayKey, DayIntervals] = {}
+
+    def add(salle, day, fields):
+        if salle is not None and day is not None and "start" in fields:
+            days.setdefault((str(salle), day), DayIntervals()).add(fields["start"], fields["end"])
+
+    for entry in (p for a in activites for p in (a.get("planning") or [])):
+        fields = planning_fields(entry)
+        add(entry.get("salle"), fields.get("jour_semaine", fields.get("date")), fields)
+    for doc in reservations:
+        fields = reservation_fields(doc)
+        add(doc.get("salle"), fields.get("date") or normalize_key(doc.get("jour")) or None, fields)
+    return days
+
+
+class AvailabilityIndex:
+    def __init__(self, reservations_loader: ReservationsLoader = load_reservations_from_repository,
+                 ttl_seconds: float = None):
+        self.reservations_loader = reservations_loader
+        self.ttl = float(ttl_seconds if ttl_seconds is not None else os.getenv("AVAILABILITY_TTL_SECONDS", "60"))
+        self._days: Dict[DayKey, DayIntervals] = {}
+        self._catalog_fingerprint: Optional[str] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        # une relecture à la fois ; `_pending` garde les réservations ajoutées pendant qu'elle lit la base
+        self._rebuild_lock = threading.Lock()
+        self._pending: Optional[List[Tuple[Any, Any, int, int]]] = None
+        self._refreshing = False
+        self.rebuilds = 0
+        self.background_refreshes = 0
+        self.checks = 0
+        self.last_error: Optional[str] = None
+
+    def rebuild(self) -> bool:
+        """Relit planning (catalogue) et réservations ; garde l'index courant si Mongo ne répond pas."""
+        with self._rebuild_lock:
+            snapshot = catalog.snapshot()
+            with self._lock:
+                self._loaded_at = time.time()
+                self._pending = []
+            try:
+                reservations = self.reservations_loader()
+                days = build_index(snapshot.activites, reservations)
+            except Exception as e:
+                with self._lock:
+                    self._pending = None
+                self.last_error = str(e)
+                print(f"[Availability] Réservations indisponibles: {e}")
+                return False
+            self.last_error = None
+            with self._lock:
+                # une réservation confirmée pendant la lecture (peut-être absente du résultat) n'est pas perdue
+                for salle, jour, start, end in self._pending:
+                    days.setdefault(day_keys(salle, jour)[0], DayIntervals()).add(start, end)
+                self._pending = None
+                self._days = days
+                self._catalog_fingerprint = snapshot.fingerprint
+                self.rebuilds += 1
+        return True
+
+    def invalidate(self) -> None:
+        """Force une relecture à la prochaine requête (ex: réservation concurrente d'une autre borne)."""
+        self._loaded_at = 0.0
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self.background_refreshes += 1
+
+        def run():
+            try:
+                self.rebuild()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="availability-refresh", daemon=True).start()
+
+    def _ensure_fresh(self) -> None:
+        # premier chargement, invalidation ou catalogue modifié : relecture immédiate (index faux sinon)
+        if not self._loaded_at or catalog.snapshot().fingerprint != self._catalog_fingerprint:
+            self.rebuild()
+        elif time.time() - self._loaded_at > self.ttl:
+            self._refresh_in_background()
+
+    def _intervals(self, salle: Any, jour: Any) -> List[DayIntervals]:
+        days = self._days
+        return [days[key] for key in day_keys(salle, jour) if key in days]
+
+    def is_booked(self, salle: Any, jour: Any, start: int, end: int) -> bool:
+        """Vrai si [start, end[ (minutes) chevauche un créneau de planning ou une réservation ce jour-là."""
+        self._ensure_fresh()
+        self.checks += 1
+        return any(day.overlaps(start, end) for day in self._intervals(salle, jour))
+
+    def add(self, salle: Any, jour: Any, start: int, end: int) -> None:
+        """Enregistre une réservation confirmée (sans attendre la prochaine relecture)."""
+        with self._lock:
+            self._days.setdefault(day_keys(salle, jour)[0], DayIntervals()).add(start, end)
+            if self._pending is not None:
+                self._pending.append((salle, jour, start, end))
+
+    def occupancy(self, salle_ids: List[Any], jour: str) -> np.ndarray:
+        """Matrice booléenne (salles × quarts d'heure) : True si le quart d'heure est occupé."""
+        self._ensure_fresh()
+        grid = np.zeros((len(salle_ids), SLOTS_PER_DAY), dtype=bool)
+        for row, salle in enumerate(salle_ids):
+            for start, end in (interval for day in self._intervals(salle, jour) for interval in day.intervals()):
+                grid[row, start // SLOT_MINUTES:-(-end // SLOT_MINUTES)] = True
+        return grid
+
+    def free_starts(self, salle_ids: List[Any], jour: str, duree: int = 60,
+                    opening: Tuple[int, int] = OPENING_HOURS) -> np.ndarray:
+        """Matrice booléenne (salles × quarts d'heure) : True si un créneau de `duree` peut y commencer."""
+        width = -(-duree // SLOT_MINUTES)
+        grid = self.occupancy(salle_ids, jour)
+        # busy[:, i] = quarts d'heure occupés dans [i, i + width[
+        cumulative = np.zeros((len(salle_ids), SLOTS_PER_DAY + 1), dtype=np.int32)
+        np.cumsum(grid, axis=1, out=cumulative[:, 1:])
+        n_starts = SLOTS_PER_DAY - width + 1
+        busy = cumulative[:, width:width + n_starts] - cumulative[:, :n_starts]
+        starts = np.zeros_like(grid)
+        first = -(-opening[0] // SLOT_MINUTES)
+        last = (opening[1] - duree) // SLOT_MINUTES
+        if last >= first:
+            starts[:, first:last + 1] = busy[:, first:last + 1] == 0
+        return starts
+
+    def search(self, salles: List[Dict[str, Any]], jour: str, minutes: int = None, duree: int = 60,
+               limit: int = 3) -> Dict[str, Any]:
+        """
+        Créneaux libres de chaque salle pour un jour, et si `minutes` est donné : salles libres à
+        cette heure et `limit` créneaux libres les plus proches (toutes salles confondues).
+        """
+        ids = [s.get("_id", s.get("nom")) for s in salles]
+        starts = self.free_starts(ids, jour, duree)
+        result: Dict[str, Any] = {"jour": jour, "duree": duree, "salles": []}
+        for row, salle in enumerate(salles):
+            # plages contiguës de débuts possibles → fenêtres libres [premier début, dernier début + durée]
+            edges = np.flatnonzero(np.diff(np.concatenate(([0], starts[row].astype(np.int8), [0]))))
+            windows = [{"debut": minutes_to_heure(int(a) * SLOT_MINUTES),
+                        "fin": minutes_to_heure((int(b) - 1) * SLOT_MINUTES + duree)}
+                       for a, b in zip(edges[::2], edges[1::2])]
+            result["salles"].append({"salle_id": str(ids[row]), "nom": salle.get("nom"), "creneaux_libres": windows})
+
+        if minutes is not None:
+            result["heure"] = minutes_to_heure(minutes)
+            result["salles_libres"] = [salle.get("nom") for salle, salle_id in zip(salles, ids)
+                                       if not self.is_booked(salle_id, jour, minutes, minutes + duree)]
+            rows, cols = np.nonzero(starts)
+            distance = np.abs(cols * SLOT_MINUTES - minutes)
+            order = np.lexsort((cols, distance))[:limit]
+            result["plus_proches"] = [{"salle": salles[rows[i]].get("nom"),
+                                       "debut": minutes_to_heure(int(cols[i]) * SLOT_MINUTES),
+                                       "fin": minutes_to_heure(int(cols[i]) * SLOT_MINUTES + duree)}
+                                      for i in order]
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        days = self._days
+        return {
+            "days": len(days),
+            "intervals": sum(len(d) for d in days.values()),
+            "loaded_at": self._loaded_at or None,
+            "rebuilds": self.rebuilds,
+            "background_refreshes": self.background_refreshes,
+            "checks": self.checks,
+            "last_error": self.last_error,
+        }
+
+
+# Instance partagée (dialogue)
+availability = AvailabilityIndex()
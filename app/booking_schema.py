@@ -0,0 +1,172 @@
+"""
+app/booking_schema.py
+Schéma des créneaux de salle : date ISO + minutes entières.
+
+Réservations (collection `reservations`) :
+    {"salle": ObjectId, "date": "2026-10-20", "start": 1080, "end": 1140,
+     "jour": "demain", "heure_debut": "18:00", "heure_fin": "19:00", ...}
+Planning des activités (`activite.planning[]`, créneaux hebdomadaires) :
+    {"salle": ObjectId, "jour_semaine": 0, "start": 540, "end": 600, "jour": "Lundi", ...}
+
+`jour` / `heure_debut` / `heure_fin` restent écrits pour l'affichage et les anciens clients.
+Un chevauchement devient une seule condition d'intervalle (start < fin demandée, end > début
+demandé) couverte par les index composés ci-dessous, au lieu d'un $or sur des chaînes "HH:MM"
+comparées lexicographiquement et d'un `jour` qui dépendait du jour où il avait été prononcé.
+
+Réservation atomique (`book_slot`) : la réservation porte elle-même ses quarts d'heure
+(`slots`: [72, 73, 74, 75]) sous un index unique multiclé (salle, date, slots). Son insertion est
+l'unique écriture, et c'est elle qui détecte un conflit (clé dupliquée) : deux bornes qui réservent
+la même salle au même moment ne peuvent pas réussir toutes les deux, et aucun verrou ne peut
+survivre sans sa réservation (supprimer la réservation libère le créneau).
+L'ancienne collection de verrous `reservation_slots` est supprimée par la migration.
+
+Migration des documents existants : python -m scripts.migrate_booking_schema
+"""
+import datetime
+import re
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from app.temporal import JOURS, heure_to_minutes, minutes_to_heure, parse_date
+
+RESERVATIONS_INDEX = [("salle", ASCENDING), ("date", ASCENDING), ("start", ASCENDING), ("end", ASCENDING)]
+PLANNING_INDEX = [("planning.salle", ASCENDING), ("planning.jour_semaine", ASCENDING),
+                  ("planning.start", ASCENDING), ("planning.end", ASCENDING)]
+
+SLOTS_INDEX = [("salle", ASCENDING), ("date", ASCENDING), ("slots", ASCENDING)]
+SLOTS_INDEX_NAME = "salle_date_slots"
+SLOT_LOCK_MINUTES = 15
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_JOURS_IDX = {j: i for i, j in enumerate(JOURS)}
+
+
+def resolve_date(jour: Any, today: datetime.date = None) -> Optional[str]:
+    """'2026-10-20' / 'demain' / 'lundi' / '12 mars' → date ISO (relative à `today`), None si inconnue."""
+    if isinstance(jour, datetime.datetime):
+        return jour.date().isoformat()
+    if isinstance(jour, datetime.date):
+        return jour.isoformat()
+    jour = str(jour or "").strip()
+    if _ISO_DATE.match(jour):
+        try:
+            return datetime.date.fromisoformat(jour).isoformat()
+        except ValueError:  # "2026-13-45"
+            return None
+    found = parse_date(jour, today) if jour else None
+    return found[1] if found else None
+
+
+def weekday_of(jour: Any) -> Optional[int]:
+    """Jour de semaine (0 = lundi) d'un créneau hebdomadaire ('Lundi'), None si ce n'est pas un nom de jour."""
+    if isinstance(jour, int):
+        return jour
+    return _JOURS_IDX.get(str(jour or "").strip().lower())
+
+
+def _created_on(doc: Dict[str, Any]) -> Optional[datetime.date]:
+    """Date de création d'un document (horodatage de son ObjectId), référence de 'demain' / 'lundi'."""
+    generation_time = getattr(doc.get("_id"), "generation_time", None)
+    return generation_time.date() if generation_time else None
+
+
+def reservation_fields(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Champs date / start / end d'une réservation, calculés depuis jour / heure_debut / heure_fin si absents."""
+    out = {}
+    date = doc.get("date") or resolve_date(doc.get("jour"), _created_on(doc))
+    start = doc["start"] if isinstance(doc.get("start"), int) else heure_to_minutes(doc.get("heure_debut"))
+    end = doc["end"] if isinstance(doc.get("end"), int) else heure_to_minutes(doc.get("heure_fin"))
+    if date:
+        out["date"] = date
+    if start is not None and end is not None and end > start:
+        out["start"], out["end"] = start, end
+    return out
+
+
+def planning_fields(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Champs jour_semaine (ou date pour un créneau ponctuel) / start / end d'une entrée de planning."""
+    out = {}
+    weekday = entry.get("jour_semaine")
+    if weekday is None:
+        weekday = weekday_of(entry.get("jour"))
+    if weekday is not None:
+        out["jour_semaine"] = weekday
+    else:
+        date = entry.get("date") or resolve_date(entry.get("jour"))
+        if date:
+            out["date"] = date
+    start = entry["start"] if isinstance(entry.get("start"), int) else heure_to_minutes(entry.get("heure_debut"))
+    end = entry["end"] if isinstance(entry.get("end"), int) else heure_to_minutes(entry.get("heure_fin"))
+    if start is not None and end is not None and end > start:
+        out["start"], out["end"] = start, end
+    return out
+
+
+def reservation_document(salle: Any, activite: str, jour: str, date: str, start: int, end: int) -> Dict[str, Any]:
+    return {
+        "salle": salle,
+        "activite": activite,
+        "date": date,
+        "start": start,
+        "end": end,
+        "jour": jour,
+        "heure_debut": minutes_to_heure(start),
+        "heure_fin": minutes_to_heure(end),
+        "statut": "confirmee",
+    }
+
+
+def overlap_query(salle: Any, date: str, start: int, end: int) -> Dict[str, Any]:
+    """Réservations de `salle` le `date` qui chevauchent [start, end[ (index RESERVATIONS_INDEX)."""
+    return {"salle": salle, "date": date, "start": {"$lt": end}, "end": {"$gt": start}}
+
+
+def planning_overlap_query(salle: Any, date: str, start: int, end: int) -> Dict[str, Any]:
+    """Activités dont un créneau hebdomadaire chevauche [start, end[ le jour de semaine de `date`."""
+    weekday = datetime.date.fromisoformat(date).weekday()
+    return {"planning": {"$elemMatch": {"salle": salle, "jour_semaine": weekday,
+                                        "start": {"$lt": end}, "end": {"$gt": start}}}}
+
+
+def ensure_indexes(db) -> None:
+    """Crée les index composés et l'index unique des quarts d'heure réservés (idempotent)."""
+    db.get_collection("reservations").create_index(RESERVATIONS_INDEX, name="salle_date_start_end")
+    db.get_collection("activite").create_index(PLANNING_INDEX, name="planning_salle_jour_start_end")
+    # partiel : les réservations pas encore migrées (sans `slots`) ne se bloquent pas entre elles
+    db.get_collection("reservations").create_index(SLOTS_INDEX, name=SLOTS_INDEX_NAME, unique=True,
+                                                   partialFilterExpression={"slots": {"$exists": True}})
+
+
+class SlotTaken(Exception):
+    """Un quart d'heure du créneau demandé est déjà verrouillé par une autre réservation."""
+
+
+def slot_numbers(start: int, end: int) -> List[int]:
+    """Numéros des quarts d'heure touchés par [start, end[."""
+    return list(range(start // SLOT_LOCK_MINUTES, -(-end // SLOT_LOCK_MINUTES)))
+
+
+def slot_locks(salle: Any, date: str, start: int, end: int, reservation_id: Any) -> List[Dict[str, Any]]:
+    """Un verrou par quart d'heure touché par [start, end[ (backends mémoire et SQLite)."""
+    return [{"salle": salle, "date": date, "slot": slot, "reservation": reservation_id}
+            for slot in slot_numbers(start, end)]
+
+
+def book_slot(db, reservation: Dict[str, Any]) -> Any:
+    """
+    Réserve atomiquement le créneau de `reservation` (document de reservation_document) :
+    une seule insertion, la réservation avec ses quarts d'heure, conflit détecté par l'index unique.
+    Lève SlotTaken si le créneau est pris ; rien n'est alors écrit.
+    """
+    reservation.setdefault("_id", ObjectId())
+    reservation["slots"] = slot_numbers(reservation["start"], reservation["end"])
+    try:
+        db.get_collection("reservations").insert_one(reservation)
+    except DuplicateKeyError as e:
+        if SLOTS_INDEX_NAME in str(e):
+            raise SlotTaken(f"{reservation['salle']} {reservation['date']} {reservation['start']}-{reservation['end']}")
+        raise
+    return reservation["_id"]
@@ -0,0 +1,211 @@
+"""
+app/catalog.py
+Cache en mémoire du catalogue Mongo (collections `salle` et `activite`).
+
+Ces collections changent rarement : elles sont lues une fois, puis les chemins de dialogue
+utilisent des index précalculés (activité → salles, clé de salle normalisée → document,
+nom d'activité → document) au lieu d'interroger Atlas à chaque tour.
+
+Rafraîchissement :
+ - change stream Mongo sur les deux collections (Atlas est un replica set) : rechargement
+   dès qu'un document change ;
+ - sinon (serveur autonome, droits insuffisants) : relecture toutes les `ttl_seconds`.
+Chaque relecture calcule une empreinte ; l'instantané n'est remplacé (affectation de
+référence) et les abonnés `on_change` prévenus que si le catalogue a réellement changé.
+
+Variables d'environnement : CATALOG_TTL_SECONDS (300), CATALOG_CHANGE_STREAM (1 / 0).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.gazetteer import CatalogLoader
+
+CATALOG_COLLECTIONS = ("salle", "activite")
+
+
+def normalize_key(name: str) -> str:
+    """'Salle A' / 'salle_a' / 'Natation ' → 'salle a' / 'natation' (minuscules, sans accents)."""
+    s = unicodedata.normalize("NFD", str(name or "").lower())
+    s = "".join(c for c in s if unicodedata.category(c) != "Mn")
+    return " ".join(s.replace("_", " ").replace("-", " ").split())
+
+
+def documents_fingerprint(salles: List[Dict[str, Any]], activites: List[Dict[str, Any]]) -> str:
+    """Empreinte du contenu complet des documents (descriptions, plannings compris)."""
+    payload = json.dumps([sorted(json.dumps(d, default=str, sort_keys=True) for d in docs) for docs in (salles, activites)])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def load_catalog_from_mongo() -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    from app.DB_access import DatabaseMongo
+
+    db = DatabaseMongo()
+    salles = list(db.get_collection("salle").find({}))
+    activites = list(db.get_collection("activite").find({}))
+    return salles, activites
+
+
+def load_catalog_from_repository() -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Catalogue du backend de données DATA_BACKEND (app/repositories.py)."""
+    from app.repositories import get_repositories
+
+    return get_repositories().catalog.load()
+
+
+class CatalogSnapshot:
+    """Instantané figé du catalogue et de ses index. Les documents sont partagés : ne pas les modifier."""
+
+    def __init__(self, salles: List[Dict[str, Any]], activites: List[Dict[str, Any]], fingerprint: str = None):
+        self.salles = salles
+        self.activites = activites
+        self.fingerprint = fingerprint if fingerprint is not None else documents_fingerprint(salles, activites)
+        self.loaded_at = time.time()
+        self.activity_names = [a["nom"] for a in activites if a.get("nom")]
+        self._activity_by_key = {normalize_key(a["nom"]): a for a in activites if a.get("nom")}
+        self._salle_by_key: Dict[str, Dict[str, Any]] = {}
+        self._salles_by_activity: Dict[str, List[Dict[str, Any]]] = {}
+        for salle in salles:
+            for name in [salle.get("nom")] + list(salle.get("aliases") or []):
+                if name:
+                    self._salle_by_key.setdefault(normalize_key(name), salle)
+            supported = salle.get("activites_supportees") or []
+            if isinstance(supported, str):
+                supported = [supported]
+            for activite in supported:
+                rooms = self._salles_by_activity.setdefault(normalize_key(activite), [])
+                if salle not in rooms:
+                    rooms.append(salle)
+
+    def activity(self, name: str) -> Optional[Dict[str, Any]]:
+        return self._activity_by_key.get(normalize_key(name))
+
+    def salle(self, key: str) -> Optional[Dict[str, Any]]:
+        """Document de salle pour une clé normalisée ('salle_a'), un nom ('Salle A') ou un alias."""
+        return self._salle_by_key.get(normalize_key(key))
+
+    def salles_for_activity(self, activite: str) -> List[Dict[str, Any]]:
+        """Salles dont `activites_supportees` contient l'activité (exacte, sinon sous-chaîne comme l'ancien $regex)."""
+        key = normalize_key(activite)
+        if not key:
+            return []
+        rooms = self._salles_by_activity.get(key)
+        if rooms is not None:
+            return list(rooms)
+        out: List[Dict[str, Any]] = []
+        for supported, candidates in self._salles_by_activity.items():
+            if key in supported:
+                out.extend(s for s in candidates if s not in out)
+        return out
+
+
+class Catalog:
+    def __init__(self, loader: CatalogLoader = load_catalog_from_repository, ttl_seconds: float = None,
+                 change_stream: bool = None):
+        self.loader = loader
+        self.ttl = float(ttl_seconds if ttl_seconds is not None else os.getenv("CATALOG_TTL_SECONDS", "300"))
+        if change_stream is None:
+            change_stream = os.getenv("CATALOG_CHANGE_STREAM", "1") != "0"
+        # le change stream n'existe que sur Mongo
+        self.change_stream = change_stream and os.getenv("DATA_BACKEND", "mongo") == "mongo"
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.mode = "ttl"
+        self.refreshes = 0
+        self.changes = 0
+        self.last_error: Optional[str] = None
+        # appelés après chaque changement réel du catalogue (ex: reconstruire le gazetteer)
+        self.on_change: List[Callable[[], None]] = []
+
+    def refresh(self) -> bool:
+        """Relit les collections ; remplace l'instantané si l'empreinte a changé."""
+        with self._refresh_lock:
+            self.refreshes += 1
+            self._checked_at = time.time()
+            try:
+                salles, activites = self.loader()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"[Catalog] Catalogue indisponible: {e}")
+                return False
+            self.last_error = None
+            fingerprint = documents_fingerprint(salles, activites)
+            if self._snapshot is not None and self._snapshot.fingerprint == fingerprint:
+                return False
+            self._snapshot = CatalogSnapshot(salles, activites, fingerprint)  # swap atomique
+            self.changes += 1
+            print(f"[Catalog] Chargé : {len(salles)} salles, {len(activites)} activités")
+        for callback in self.on_change:
+            callback()
+        return True
+
+    def snapshot(self) -> CatalogSnapshot:
+        """
+        Instantané courant. Sans thread de fond, relit le catalogue quand le TTL est écoulé
+        (30 s au plus tant que Mongo n'a jamais répondu) ; catalogue vide si aucun chargement n'a réussi.
+        """
+        if self._thread is None:
+            due = self.ttl if self._snapshot is not None else min(self.ttl, 30.0)
+            if time.time() - self._checked_at > due:
+                self.refresh()
+        return self._snapshot or _EMPTY
+
+    def _watch(self) -> None:
+        """Bloque sur un change stream des collections du catalogue jusqu'à stop()."""
+        from app.DB_access import DatabaseMongo
+
+        db = DatabaseMongo().db
+        pipeline = [{"$match": {"ns.coll": {"$in": list(CATALOG_COLLECTIONS)}}}]
+        with db.watch(pipeline, max_await_time_ms=1000) as stream:
+            self.mode = "change_stream"
+            while not self._stop.is_set():
+                if stream.try_next() is not None:
+                    self.refresh()
+
+    def start(self) -> None:
+        """Charge le catalogue puis le tient à jour en arrière-plan (change stream, sinon TTL)."""
+        if self._thread is not None:
+            return
+
+        def loop():
+            self.refresh()
+            if self.change_stream:
+                try:
+                    self._watch()
+                except Exception as e:
+                    print(f"[Catalog] Change stream indisponible ({e}), relecture toutes les {self.ttl}s")
+            self.mode = "ttl"
+            while not self._stop.wait(self.ttl):
+                self.refresh()
+
+        self._thread = threading.Thread(target=loop, name="catalog-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "mode": self.mode if self._thread is not None else "lazy_ttl",
+            "salles": len(snapshot.salles) if snapshot else 0,
+            "activites": len(snapshot.activites) if snapshot else 0,
+            "fingerprint": snapshot.fingerprint if snapshot else None,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            "refreshes": self.refreshes,
+            "changes": self.changes,
+            "last_error": self.last_error,
+        }
+
+
+_EMPTY = CatalogSnapshot([], [], "")
+
+# Instance partagée (dialogue, gazetteer NLU)
+catalog = Catalog()
@@ -4,17 +4,26 @@ Dialog manager that uses LLMClient to generate assistant replies and
 maintains per-session message history (user/assistant).
 Falls back to simple rule-based replies if LLM fails.
 """
-from typing import Tuple, Dict, Any, List
-from app.sessions import SessionStore
-from app.llm import LLMClient, LLMError
+from contextvars import ContextVar, Token
+from typing import Tuple, Dict, Any, List, NamedTuple, Optional, Union
+from app.sessions import SessionStore, SessionTurn
+from app.llm import LLMError
+from app.llm_router import LLMRouter
 from app.navigation import get_navigation_instructions
+from app.catalog import catalog
+from app.availability import OPENING_HOURS, availability
+from app.booking_schema import SlotTaken, reservation_document, resolve_date
+from app.repositories import get_repositories
+from app.dialog_routing import RoutingPolicy, routing_stats
+from app.response_cache import context_fingerprint, response_cache
+from app.history import HistoryManager, llm_summarizer
+from app.streaming import ReplyStream, SentenceChunker
+import asyncio
 import os
+import re
 import json
 import random
 from .tools import parse_heure_to_minutes, parse_minutes_to_heure
-from app.DB_access import DatabaseMongo
-
-db = DatabaseMongo()
 
 DEFAULT_SYSTEM_PROMPT = (
     "Tu es l'assistant conversationnel d'un robot d'accueil dans une salle multisports. "
@@ -43,80 +52,160 @@ RULES = {
 
 llm_openai = "llm_openai_config.json"
 
+# Réponses à "Vouliez-vous dire … ?" (entité retrouvée par l'index approché)
+_AFFIRMATIVE = re.compile(r"^\s*(oui|ouais|exact(ement)?|c'est ça|c'est bien ça|d'accord|ok|absolument|tout à fait)\b", re.IGNORECASE)
+_NEGATIVE = re.compile(r"^\s*(non|nan|pas du tout|pas ça)\b", re.IGNORECASE)
+# intention → entités approchées à faire confirmer avant d'agir
+_CONFIRMABLE_INTENTS = {
+    "navigate": ("location",),
+    "ask_activities": ("activity",),
+    "book_activity": ("activity", "location"),
+    # "natacion" seul : pas d'intention reconnue, l'entité retrouvée est proposée quand même
+    "unknown": ("activity", "location"),
+}
+# intention à reprendre après confirmation d'un tour "unknown", selon l'entité retrouvée
+_FUZZY_ONLY_INTENTS = {"activity": "ask_activities", "location": "navigate"}
+
+
+def fuzzy_guess(intent: str, entities: Dict[str, Any], booking_in_progress: bool = False) -> Optional[Dict[str, Any]]:
+    """Entité retrouvée approximativement (distance > 0) à faire confirmer, ou None.
+    Pendant une réservation, tout lieu ou activité approché est confirmé avant de remplir un slot."""
+    kinds = ("activity", "location") if booking_in_progress else _CONFIRMABLE_INTENTS.get(intent, ())
+    fuzzy = [f for f in entities.get("fuzzy", []) if f["distance"] > 0]
+    return next((f for kind in kinds for f in fuzzy if f["kind"] == kind), None)
+
+class _TurnState:
+    """Tour en cours : session lue une fois (SessionTurn), route prise, flux de réponse éventuel."""
+
+    def __init__(self, session_id: str, turn: SessionTurn, stream: Optional[ReplyStream]):
+        self.session_id = session_id
+        self.turn = turn
+        self.stream = stream
+        # "rule" / "flow" / "cache" / "llm" / "llm_fallback" (app/dialog_routing.py)
+        self.route = "flow"
+
+
+# état du tour propre à chaque requête (tâche asyncio ou thread, copié par asyncio.to_thread) :
+# deux requêtes simultanées sur la même session (relance, flux + respond) ne se marchent pas dessus
+_current_turn: ContextVar[Optional[_TurnState]] = ContextVar("dialog_turn", default=None)
+
+
+def _turn_of(session_id: str) -> Optional[_TurnState]:
+    state = _current_turn.get()
+    return state if state is not None and state.session_id == session_id else None
+
+
+def _set_route(route: str) -> None:
+    state = _current_turn.get()
+    if state is not None:
+        state.route = route
+
+
+class PendingGeneration(NamedTuple):
+    """Tour arrivé à l'appel LLM : _handle s'arrête là, handle / ahandle font l'appel (thread ou asyncio)."""
+    intent: str
+    entities: Dict[str, Any]
+    actions: Dict[str, Any]
+    cache_key: Optional[tuple]
+    system_prompt: str
+    history: List[Dict[str, str]]
+
+
 class DialogManager:
     def __init__(self, sessions: SessionStore, llm_config_path: str = None):
         self.sessions = sessions
         cfg_path = llm_config_path or os.path.join(os.path.dirname(__file__), "..", "configs", llm_openai)
-        self.llm = LLMClient(cfg_path)
+        # un ou plusieurs backends (clé "backends") : couverture au p95, disjoncteurs, bascule
+        self.llm = LLMRouter.from_config(cfg_path)
         # system prompt can be overridden in config file (optional)
         try:
             with open(cfg_path, "r", encoding="utf-8") as f:
                 cfg = json.load(f)
                 self.system_prompt = cfg.get("system_prompt", DEFAULT_SYSTEM_PROMPT)
         except Exception:
+            cfg = {}
             self.system_prompt = DEFAULT_SYSTEM_PROMPT
+        # intentions déterministes servies sans LLM (app/dialog_routing.py)
+        self.routing = RoutingPolicy(cfg.get("routing"))
+        # réponses LLM des questions fréquentes ; vidé si le prompt ou la config LLM changent
+        llm_cfg = {k: v for k, v in cfg.items()
+                   if k not in ("headers", "api_key", "routing", "response_cache", "history", "hedging", "circuit_breaker")}
+        if "backends" in llm_cfg:
+            llm_cfg["backends"] = [{k: v for k, v in spec.items() if k not in ("headers", "api_key")}
+                                   for spec in llm_cfg["backends"]]
+        response_cache.configure(cfg.get("response_cache"),
+                                 context_fingerprint(system_prompt=self.system_prompt, llm=llm_cfg))
+        # historique sous budget de tokens : les anciens tours sont repliés dans un résumé en session
+        history_cfg = cfg.get("history") or {}
+        self.history = HistoryManager(
+            history_cfg, llm_summarizer(self.llm) if history_cfg.get("summarizer") == "llm" else None)
+        # index unique des verrous de créneaux : sans lui, la réservation ne détecte pas les conflits
+        try:
+            get_repositories().reservations.ensure_schema()
+        except Exception as e:
+            print("[DialogManager] Index des réservations non créés:", e)
+
+    def close(self) -> None:
+        """Appelé par le registre quand un rechargement remplace ce DialogManager."""
+        self.llm.close()
+
+    def _session(self, session_id: str) -> Dict[str, Any]:
+        """Session du tour en cours (lue une seule fois), sinon lecture directe du store."""
+        state = _turn_of(session_id)
+        return state.turn.data if state is not None else self.sessions.get(session_id)
+
+    def _save(self, session_id: str, session: Dict[str, Any]) -> None:
+        # pendant un tour, l'écriture est différée à la fin du tour (SessionTurn.flush)
+        if _turn_of(session_id) is None:
+            self.sessions.update(session_id, session)
 
     def _append_message(self, session_id: str, role: str, content: str) -> None:
-        session = self.sessions.get(session_id)
-        history = session.setdefault("history", [])
-        history.append({"role": role, "content": content})
-        # limit history length to avoid huge prompts (keep last N pairs)
-        max_msgs = 20
-        if len(history) > max_msgs:
-            # keep the last max_msgs entries
-            session["history"] = history[-max_msgs:]
-        self.sessions.update(session_id, session)
+        session = self._session(session_id)
+        # au-delà du budget de tokens, les plus anciens messages passent dans le résumé de session
+        self.history.append(session, role, content, self.system_prompt)
+        self._save(session_id, session)
     
     def _get_booking_slots(self, session_id: str) -> Dict[str, Any]:
-        session = self.sessions.get(session_id)
+        session = self._session(session_id)
         return session.get("booking_slots", {})
     
     def _set_booking_slots(self, session_id: str, slots: Dict[str, Any]) -> None:
         """Sauvegarde les slots de réservation dans la session."""
-        session = self.sessions.get(session_id)
+        session = self._session(session_id)
         session["booking_slots"] = slots
-        self.sessions.update(session_id, session)
+        self._save(session_id, session)
 
     def _clear_booking_slots(self, session_id: str) -> None:
         """Supprime les slots de réservation (fin du flux)."""
-        session = self.sessions.get(session_id)
+        session = self._session(session_id)
         session.pop("booking_slots", None)
-        self.sessions.update(session_id, session)
+        self._save(session_id, session)
 
     def _is_room_booked(self, salle: str, jour: str, heure_debut: str,heure_fin:str) -> bool:
-        """Vérifie dans la base de données si la salle est déjà réservée pour le créneau donné."""
-        acitivites_planinng = db.get_collection("activite").find_one(
-            {
-                "planning": {"$elemMatch": {"salle": salle, "jour": jour,
-                                             "$or": [
-                                                        {"heure_debut": {"$lt": heure_fin, "$gte": heure_debut}},
-                                                        {"heure_fin": {"$gt": heure_debut, "$lte": heure_fin}},
-                                                        {"$and": [{"heure_debut": {"$lte": heure_debut}}, {"heure_fin": {"$gte": heure_fin}}]},
-                                                     ]
-            }}})
-        if acitivites_planinng:
-            return True
-        db_query = {
-            "salle": salle,
-            "jour": jour,
-            "$or": [
-                {"heure_debut": {"$lt": heure_fin, "$gte": heure_debut}},
-                {"heure_fin": {"$gt": heure_debut, "$lte": heure_fin}},
-                {"heure_debut":heure_debut, "heure_fin":heure_fin},
-                {"$and": [{"heure_debut": {"$lte": heure_debut}}, {"heure_fin": {"$gte": heure_fin}}]},
-            ]
-        }
-        existing = db.get_collection("reservations").find_one(db_query)
-        return existing is not None
+        """Vérifie si la salle est déjà occupée (planning ou réservation) pour le créneau donné."""
+        # index en mémoire (app/availability.py) : recherche dichotomique, pas de requête Mongo
+        return availability.is_booked(salle, jour, parse_heure_to_minutes(heure_debut), parse_heure_to_minutes(heure_fin))
+
+    def _ask_fuzzy_confirmation(self, session_id: str, intent: str, entities: Dict[str, Any],
+                                guess: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Entité retrouvée approximativement : on fait confirmer avant d'agir."""
+        name = guess["match"].replace("_", " ")
+        session = self._session(session_id)
+        session["pending_confirmation"] = {"intent": intent, "entities": entities}
+        self._save(session_id, session)
+        text = "Vouliez-vous dire {} ?".format(name)
+        self._append_message(session_id, "assistant", text)
+        return text, {"type": "confirm_entity", "kind": guess["kind"], "suggestion": guess}
 
     def _is_booking_in_progress(self, session_id: str) -> bool:
-        session = self.sessions.get(session_id)
+        session = self._session(session_id)
         return "booking_slots" in session
 
     def _extract_booking_entities(self, entities: Dict[str, Any], raw_text: str) -> Dict[str, Any]:
         """
-        Extrait les valeurs de slots depuis les entities NLU et le texte brut.
-        Retourne un dict avec les clés : salle, activite, jour, heure (celles trouvées).
+        Extrait les valeurs de slots depuis les entities NLU.
+        Retourne un dict avec les clés : salle, activite, jour, date, heure, minutes (celles trouvées).
+        Date et heure sont déjà normalisées par NLU.parse (app/temporal.py) : pas de re-parsing du texte.
         """
         found = {}
 
@@ -130,58 +219,11 @@ class DialogManager:
         if activities:
             found["activite"] = activities[0]
 
-        # --- Jour / Date ---
-        times = entities.get("time", [])
-        # On essaie aussi de détecter une date dans le texte brut
-        import re
-        date_patterns = [
-            r'\b(\d{1,2})\s+(janvier|février|mars|avril|mai|juin|juillet|août|septembre|octobre|novembre|décembre)\b',
-            r'\b(\d{1,2})[/\-](\d{1,2})(?:[/\-](\d{2,4}))?\b',
-            r'\b(lundi|mardi|mercredi|jeudi|vendredi|samedi|dimanche)\b',
-            r'\b(demain|après[- ]demain|aujourd\'?hui)\b',
-        ]
-        for pattern in date_patterns:
-            m = re.search(pattern, raw_text, re.IGNORECASE)
-            if m:
-                found["jour"] = m.group(0)
-                break
-        # si spaCy a trouvé un temps et qu'on n'a pas encore de jour
-        if "jour" not in found and times:
-            for t in times:
-                # vérifier si ça ressemble à une date plutôt qu'une heure
-                if re.search(r'(janvier|février|mars|avril|mai|juin|juillet|août|septembre|octobre|novembre|décembre|lundi|mardi|mercredi|jeudi|vendredi|samedi|dimanche|demain)', t, re.IGNORECASE):
-                    found["jour"] = t
-                    break
-
-        # --- Heure ---
-        hour_patterns = [
-            r'\b(\d{1,2})\s*:\s*(\d{2})\b',                # 10:00, 18:30
-            r'\b(\d{1,2})\s*[hH]\s*(\d{1,2})\b',            # 19h30, 19H00
-            r'\b(\d{1,2})\s*[hH]\b',                         # 19h (sans minutes)
-            r'\bà\s+(\d{1,2})\b',                            # à 19
-        ]
-        for pattern in hour_patterns:
-            m = re.search(pattern, raw_text, re.IGNORECASE)
-            if m:
-                h = int(m.group(1))
-                mins = 0
-                if m.lastindex >= 2 and m.group(2) and m.group(2).strip():
-                    mins = int(m.group(2))
-                found["heure"] = "{:02d}:{:02d}".format(h, mins)
-                break
-        # si spaCy a trouvé un temps et qu'on n'a pas encore d'heure
-        if "heure" not in found and times:
-            for t in times:
-                if re.search(r'\d{1,2}\s*[hH:]', t):
-                    # Normaliser aussi
-                    m2 = re.search(r'(\d{1,2})\s*[hH:]\s*(\d{1,2})?', t)
-                    if m2:
-                        h = int(m2.group(1))
-                        mins = int(m2.group(2)) if m2.group(2) else 0
-                        found["heure"] = "{:02d}:{:02d}".format(h, mins)
-                    else:
-                        found["heure"] = t
-                    break
+        # --- Jour / Date / Heure ---
+        for key in ("jour", "date", "heure", "minutes"):
+            values = entities.get(key)
+            if values:
+                found[key] = values[0]
 
         return found
 
@@ -210,25 +252,28 @@ class DialogManager:
 
         return None, None
 
+    def _salles_for_activity(self, activite: str) -> List[Dict[str, Any]]:
+        """Salles associées à une activité (index du catalogue en mémoire), sinon toutes les salles."""
+        snapshot = catalog.snapshot()
+        return snapshot.salles_for_activity(activite) or snapshot.salles
+
     def _find_salles_for_activity(self, activite: str, jour: str, heure: str) -> List[Dict[str, Any]]:
         """
         Cherche les salles disponibles pour une activité, un jour et une heure donnés.
-        Retourne une liste de salles disponibles depuis MongoDB.
+        Retourne les salles de l'activité libres sur le créneau d'une heure (index de disponibilité).
         """
-        # Chercher les salles associées à cette activité
-        activite_cap = activite.capitalize()
-        salles = list(db.get_collection("salle").find(
-            {"activites_supportees": {"$regex": activite_cap, "$options": "i"}},
-            {"_id": 0}
-        ))
-
-        if not salles:
-            # Fallback : chercher toutes les salles
-            salles = list(db.get_collection("salle").find({}, {"_id": 0}))
-
-        # TODO: filtrer par disponibilité réelle (vérifier les réservations existantes)
-        # Pour l'instant, on retourne toutes les salles qui correspondent à l'activité
-        return salles
+        debut = parse_heure_to_minutes(heure)
+        salles = self._salles_for_activity(activite)
+        if debut is not None:
+            salles = [s for s in salles if not availability.is_booked(s.get("_id", s.get("nom")), jour, debut, debut + 60)]
+        return [{k: v for k, v in s.items() if k != "_id"} for s in salles]
+
+    def _nearest_free_slots(self, activite: str, jour: str, heure: str) -> List[Dict[str, Any]]:
+        """Créneaux libres les plus proches de l'heure demandée, toutes salles de l'activité confondues."""
+        debut = parse_heure_to_minutes(heure)
+        if debut is None:
+            return []
+        return availability.search(self._salles_for_activity(activite), jour, debut)["plus_proches"]
 
     def _handle_booking_flow(self, session_id: str, intent: str, entities: Dict[str, Any], raw_text: str) -> Tuple[str, Dict[str, Any]]:
         """
@@ -268,12 +313,19 @@ class DialogManager:
             )
 
             if not salles_dispo:
-                text = "Désolé, aucune salle n'est disponible pour {} le {} à {}. Voulez-vous essayer un autre créneau ?".format(
+                proches = self._nearest_free_slots(slots["activite"], slots["jour"], slots["heure"])
+                text = "Désolé, aucune salle n'est disponible pour {} le {} à {}.".format(
                     slots["activite"], slots["jour"], slots["heure"]
                 )
+                if proches:
+                    text += " Créneaux libres les plus proches : {}. Voulez-vous l'un d'eux ?".format(
+                        ", ".join("{} à {}".format(p["salle"], p["debut"]) for p in proches)
+                    )
+                else:
+                    text += " Voulez-vous essayer un autre créneau ?"
                 self._clear_booking_slots(session_id)
                 self._append_message(session_id, "assistant", text)
-                return text, {"type": "booking_no_availability"}
+                return text, {"type": "booking_no_availability", "plus_proches": proches}
 
             if len(salles_dispo) == 1:
                 salle_choisie = salles_dispo[0]
@@ -312,24 +364,54 @@ class DialogManager:
         Résout une clé de salle normalisée (ex: 'salle_a', 'salle_b') 
         vers le document MongoDB (ex: {"nom": "Salle A", "_id": ObjectId(...)}).
         """
-        # "salle_a" → "salle a" → chercher "Salle A" en case-insensitive
-        search_name = salle_key.replace("_", " ")
-        salle_doc = db.get_collection("salle").find_one({
-            "$or": [
-                {"nom": {"$regex": "^" + search_name + "$", "$options": "i"}},
-                {"nom": {"$regex": "^" + salle_key + "$", "$options": "i"}},
-            ]
-        })
-        return salle_doc
+        # "salle_a" → "salle a" → "Salle A" (clé normalisée du catalogue en mémoire)
+        return catalog.snapshot().salle(salle_key)
+
+    def _room_taken(self, session_id: str, salle_doc: Dict[str, Any], jour: str, date: str, heure: str,
+                    heure_fin: str, debut: int) -> Tuple[str, Dict[str, Any]]:
+        """Créneau déjà pris : propose les créneaux libres les plus proches dans la même salle."""
+        proches = availability.search([salle_doc], date, debut)["plus_proches"]
+        text = "Désolé, la salle {} est déjà réservée le {} de {} à {}.".format(
+            salle_doc["nom"], jour, heure, heure_fin
+        )
+        if proches:
+            text += " Elle est libre à {}. Voulez-vous l'un de ces créneaux ou une autre salle ?".format(
+                ", ".join(p["debut"] for p in proches)
+            )
+        else:
+            text += " Voulez-vous essayer un autre créneau ou une autre salle ?"
+        self._clear_booking_slots(session_id)
+        self._append_message(session_id, "assistant", text)
+        return text, {"type": "booking_no_availability", "plus_proches": proches}
+
+    def _ask_heure_again(self, session_id: str, slots: Dict[str, Any], reason: str) -> Tuple[str, Dict[str, Any]]:
+        """Heure illisible ou hors des heures d'ouverture : on la redemande, les autres slots sont gardés."""
+        slots.pop("heure", None)
+        slots.pop("minutes", None)
+        self._set_booking_slots(session_id, slots)
+        text = "{} A quelle heure souhaitez-vous reserver ?".format(reason)
+        self._append_message(session_id, "assistant", text)
+        return text, {"type": "booking_slot_filling", "missing_slot": "heure", "current_slots": slots}
 
     def _confirm_booking(self, session_id: str, slots: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
         """Confirme la réservation et nettoie les slots."""
         salle_key = slots.get("salle", "?")
         activite = slots.get("activite", "")
         jour = slots.get("jour", "?")
+        # date ISO résolue par NLU.parse ; à défaut, depuis le jour prononcé ("demain", "lundi")
+        date = slots.get("date") or resolve_date(jour) or jour
         heure = slots.get("heure", "?")
-        heure_fin = parse_heure_to_minutes(heure) + 60
-        heure_fin = parse_minutes_to_heure(heure_fin)
+        debut = slots.get("minutes")
+        if debut is None:
+            debut = parse_heure_to_minutes(heure)
+        if debut is None:
+            return self._ask_heure_again(session_id, slots, "Je n'ai pas compris l'heure.")
+        if debut < OPENING_HOURS[0] or debut + 60 > OPENING_HOURS[1]:
+            ouverture, fermeture = (parse_minutes_to_heure(m) for m in OPENING_HOURS)
+            reason = "La salle est ouverte de {} à {} : un créneau d'une heure commence au plus tard à {}.".format(
+                ouverture, fermeture, parse_minutes_to_heure(OPENING_HOURS[1] - 60))
+            return self._ask_heure_again(session_id, slots, reason)
+        heure_fin = parse_minutes_to_heure(debut + 60)
 
         # Résoudre la salle vers son document MongoDB
         salle_doc = self._resolve_salle(salle_key)
@@ -345,13 +427,26 @@ class DialogManager:
 
         activite_str = " pour l'activité {}".format(activite) if activite else ""
 
-        if self._is_room_booked(salle_id, jour, heure, heure_fin):
-            text = "Désolé, la salle {} est déjà réservée le {} de {} à {}. Voulez-vous essayer un autre créneau ou une autre salle ?".format(
-                salle_nom, jour, heure, heure_fin
-            )
-            self._clear_booking_slots(session_id)
+        # planning et réservations connues : index en mémoire, sans aller-retour Mongo
+        if self._is_room_booked(salle_id, date, heure, heure_fin):
+            return self._room_taken(session_id, salle_doc, jour, date, heure, heure_fin, debut)
+
+        # Enregistrer avec l'ObjectId de la salle : les verrous de créneaux (index unique) refusent
+        # une réservation concurrente faite entre-temps par une autre borne
+        reservation_data = reservation_document(salle_id, activite, jour, date, debut, debut + 60)
+        try:
+            get_repositories().reservations.book(reservation_data)
+        except SlotTaken:
+            availability.invalidate()
+            return self._room_taken(session_id, salle_doc, jour, date, heure, heure_fin, debut)
+        except Exception as e:
+            # rien n'est écrit (insertion unique) : les slots restent en session pour réessayer
+            print("[BookingFlow] Erreur lors de l'enregistrement:", e)
+            text = "Désolé, je n'ai pas pu enregistrer votre réservation pour le moment. Voulez-vous que je réessaie ?"
             self._append_message(session_id, "assistant", text)
-            return text, {"type": "booking_no_availability"}
+            return text, {"type": "booking_error", "reason": "storage_unavailable", "current_slots": slots}
+        availability.add(salle_id, date, debut, debut + 60)
+        print("[BookingFlow] Réservation enregistrée:", reservation_data)
 
         text = "Parfait ! Je confirme votre réservation de la salle {}{} le {} de {} à {}. Souhaitez-vous autre chose ?".format(
             salle_nom, activite_str, jour, heure, heure_fin
@@ -364,36 +459,106 @@ class DialogManager:
                 "salle_nom": salle_nom,
                 "activite": activite,
                 "jour": jour,
+                "date": date,
                 "heure_debut": heure,
                 "heure_fin": heure_fin
             }
         }
 
-        # Enregistrer avec l'ObjectId de la salle
-        try:
-            reservation_data = {
-                "salle": salle_id,
-                "activite": activite,
-                "jour": jour,
-                "heure_debut": heure,
-                "heure_fin": heure_fin,
-                "statut": "confirmee",
-            }
-            db.get_collection("reservations").insert_one(reservation_data)
-            print("[BookingFlow] Réservation enregistrée:", reservation_data)
-        except Exception as e:
-            print("[BookingFlow] Erreur lors de l'enregistrement:", e)
-
         self._clear_booking_slots(session_id)
         self._append_message(session_id, "assistant", text)
         return text, actions
 
     
 
-    def handle(self, session_id: str, parse_result: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    def handle(self, session_id: str, parse_result: Dict[str, Any], turn: SessionTurn = None,
+               stream: ReplyStream = None) -> Tuple[str, Dict[str, Any]]:
         """
         parse_result should contain at least {"intent": str, "entities": {...}} and original text under 'raw_text'
+        `turn` : tour déjà ouvert par l'appelant (il l'écrira) ; sinon un tour est ouvert et écrit ici.
+        `stream` : si donné, une réponse LLM y est poussée phrase par phrase pendant la génération.
         """
+        if turn is not None:
+            return self._handle_in_turn(session_id, parse_result, turn, stream)
+        with self.sessions.turn(session_id) as own_turn:
+            return self._handle_in_turn(session_id, parse_result, own_turn, stream)
+
+    async def ahandle(self, session_id: str, parse_result: Dict[str, Any], turn: SessionTurn = None,
+                      stream: ReplyStream = None) -> Tuple[str, Dict[str, Any]]:
+        """Version asyncio de handle : la génération LLM est attendue sans occuper de thread."""
+        if turn is not None:
+            return await self._ahandle_in_turn(session_id, parse_result, turn, stream)
+        async with self.sessions.turn(session_id) as own_turn:
+            return await self._ahandle_in_turn(session_id, parse_result, own_turn, stream)
+
+    @staticmethod
+    def _enter_turn(session_id: str, turn: SessionTurn, stream: Optional[ReplyStream]) -> Token:
+        return _current_turn.set(_TurnState(session_id, turn, stream))
+
+    @staticmethod
+    def _leave_turn(token: Token, parse_result: Dict[str, Any]) -> None:
+        route = _current_turn.get().route
+        _current_turn.reset(token)
+        routing_stats.record(parse_result.get("intent", "unknown"), route)
+
+    def _handle_in_turn(self, session_id: str, parse_result: Dict[str, Any], turn: SessionTurn,
+                        stream: ReplyStream = None) -> Tuple[str, Dict[str, Any]]:
+        token = self._enter_turn(session_id, turn, stream)
+        try:
+            result = self._handle(session_id, parse_result)
+            if isinstance(result, PendingGeneration):
+                result = self._generate(session_id, result)
+            return result
+        finally:
+            self._leave_turn(token, parse_result)
+
+    async def _ahandle_in_turn(self, session_id: str, parse_result: Dict[str, Any], turn: SessionTurn,
+                               stream: ReplyStream = None) -> Tuple[str, Dict[str, Any]]:
+        token = self._enter_turn(session_id, turn, stream)
+        try:
+            # flux de dialogue (réservation : écritures Mongo) dans un thread, génération LLM sur la boucle
+            result = await asyncio.to_thread(self._handle, session_id, parse_result)
+            if isinstance(result, PendingGeneration):
+                result = await self._agenerate(session_id, result)
+            return result
+        finally:
+            self._leave_turn(token, parse_result)
+
+    def _generate_stream(self, pending: "PendingGeneration", stream: ReplyStream) -> Tuple[str, bool]:
+        """Génère en flux ; les phrases complètes partent au robot avant la fin de la génération.
+        Renvoie (texte, complet)."""
+        chunker = SentenceChunker()
+        try:
+            for delta in self.llm.generate_chat_stream(pending.system_prompt, pending.history):
+                for sentence in chunker.feed(delta):
+                    stream.sentence(sentence)
+        except LLMError as e:
+            return self._interrupted(chunker, e)
+        for sentence in chunker.flush():
+            stream.sentence(sentence)
+        return " ".join(chunker.sentences), True
+
+    async def _agenerate_stream(self, pending: "PendingGeneration", stream: ReplyStream) -> Tuple[str, bool]:
+        chunker = SentenceChunker()
+        try:
+            async for delta in self.llm.agenerate_chat_stream(pending.system_prompt, pending.history):
+                for sentence in chunker.feed(delta):
+                    stream.sentence(sentence)
+        except LLMError as e:
+            return self._interrupted(chunker, e)
+        for sentence in chunker.flush():
+            stream.sentence(sentence)
+        return " ".join(chunker.sentences), True
+
+    @staticmethod
+    def _interrupted(chunker: SentenceChunker, error: LLMError) -> Tuple[str, bool]:
+        if not chunker.sentences:
+            raise error
+        # le début de la réponse est déjà prononcé : on le garde plutôt que d'enchaîner sur RULES
+        print("[DialogManager] Flux LLM interrompu, réponse partielle conservée:", error)
+        return " ".join(chunker.sentences), False
+
+    def _handle(self, session_id: str, parse_result: Dict[str, Any]) -> Union[Tuple[str, Dict[str, Any]], PendingGeneration]:
 
         # --- BLOC DE DEBUG ---
         print("\n" + "="*40)
@@ -409,11 +574,28 @@ class DialogManager:
         if user_text:
             self._append_message(session_id, "user", user_text)
 
-        session = self.sessions.get(session_id)
-        history: List[Dict[str, str]] = session.get("history", [])
+        session = self._session(session_id)
 
         actions = {}
 
+        # ─── CONFIRMATION D'UNE ENTITÉ APPROCHÉE ("Vouliez-vous dire salle B ?") ───
+        pending = session.pop("pending_confirmation", None)
+        if pending is not None:
+            self._save(session_id, session)
+            if _AFFIRMATIVE.search(user_text):
+                intent = pending["intent"]
+                entities = dict(pending["entities"])
+                entities.pop("fuzzy", None)
+            elif _NEGATIVE.search(user_text):
+                text = "Pardon, pouvez-vous répéter le nom ?"
+                self._append_message(session_id, "assistant", text)
+                return text, actions
+        guess = fuzzy_guess(intent, entities, self._is_booking_in_progress(session_id))
+        if guess is not None:
+            if intent == "unknown" and not self._is_booking_in_progress(session_id):
+                intent = _FUZZY_ONLY_INTENTS[guess["kind"]]
+            return self._ask_fuzzy_confirmation(session_id, intent, entities, guess)
+
         # ─── SLOT FILLING : si une réservation est en cours, on continue le flux ───
         if self._is_booking_in_progress(session_id):
             slots = self._get_booking_slots(session_id)
@@ -500,9 +682,7 @@ class DialogManager:
         elif intent == "ask_activities":
             activity = entities.get("activity", [""])[0]
             if not activity:
-                cursor = db.get_collection("activite").find({}, {"_id": 0, "nom": 1})
-                names = list(sport["nom"] for sport in cursor)
-                print(names)
+                names = catalog.snapshot().activity_names
                 text = "Nous proposons les activités suivantes : {}. Laquelle vous intéresse ?".format(", ".join(names)) if names else "Nous proposons plusieurs activités. Laquelle vous intéresse ?"
                 self._append_message(session_id, "assistant", text)
                 actions = {
@@ -512,8 +692,9 @@ class DialogManager:
             else:
                 activity = activity.capitalize()
                 print("[DialogManager] User asked about activity:", activity)
-                info = db.get_collection("activite").find_one({"nom": activity}, {"_id": 0})
-                print(info)
+                info = catalog.snapshot().activity(activity)
+                if info:
+                    info = {k: v for k, v in info.items() if k != "_id"}
                 if info:
                     text = "L'activité {} est disponible. {}".format(activity, info.get("description", ""))
                     info_serializable = json.loads(json.dumps(info, default=str))
@@ -527,44 +708,94 @@ class DialogManager:
                 self._append_message(session_id, "assistant", text)
                 return text, actions
 
-        # Try LLM generation
+        # ─── RÉPONSE DIRECTE : intention déterministe et NLU confiant → pas d'appel LLM ───
+        fast_text = self.routing.fast_reply(intent, parse_result.get("confidence", 0.0), user_text,
+                                            catalog.snapshot().activity_names, entities)
+        if fast_text is not None:
+            _set_route("rule")
+            self._append_message(session_id, "assistant", fast_text)
+            return fast_text, actions
+
+        # ─── CACHE : question autonome déjà posée avec le même prompt et le même catalogue ───
+        cache_key = None
+        if response_cache.cacheable(intent, user_text):
+            cache_key = response_cache.key(intent, user_text, catalog.snapshot().fingerprint,
+                                           (entities.get("date") or [None])[0])
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                _set_route("cache")
+                self._append_message(session_id, "assistant", cached)
+                return cached, actions
+
+        # Try LLM generation : l'appel lui-même est fait par handle (thread) ou ahandle (asyncio)
+        _set_route("llm")
+        print("[DialogManager] calling LLM with intent:", intent)
+        system_prompt, history = self.history.prompt(session, self.system_prompt)
+        print("[DialogManager] System prompt length:", len(system_prompt))
+        print("[DialogManager] History length:", len(history))
+        return PendingGeneration(intent, entities, actions, cache_key, system_prompt, history)
+
+    def _generate(self, session_id: str, pending: "PendingGeneration") -> Tuple[str, Dict[str, Any]]:
+        stream = _turn_of(session_id).stream
         try:
-            print("[DialogManager] calling LLM with intent:", intent)
-            print("[DialogManager] System prompt length:", len(self.system_prompt))
-            print("[DialogManager] History length:", len(history))
-
-            assistant_text = self.llm.generate_chat(self.system_prompt, history)
-            
-            if not assistant_text or not assistant_text.strip():
-                print("[DialogManager] WARNING: LLM returned empty response, using fallback")
-                raise LLMError("Empty response from LLM")
-            
-            print("[DialogManager] LLM response length:", len(assistant_text))
-            
-            self._append_message(session_id, "assistant", assistant_text)
-            return assistant_text, actions
+            if stream is None:
+                return self._llm_reply(session_id, pending,
+                                       self.llm.generate_chat(pending.system_prompt, pending.history))
+            stream.actions(pending.actions)
+            return self._llm_reply(session_id, pending, *self._generate_stream(pending, stream))
         except LLMError as e:
-            print("[DialogManager] LLMError:", e)
-            rule_val = RULES.get(intent)
-            if rule_val:
-                if isinstance(rule_val, list):
-                    tmpl = random.choice(rule_val)
-                else:
-                    tmpl = rule_val
+            return self._llm_fallback(session_id, pending, e)
 
-                if "{" in tmpl:
-                    resp = tmpl.format(**entities)
-                else:
-                    resp = tmpl
+    async def _agenerate(self, session_id: str, pending: "PendingGeneration") -> Tuple[str, Dict[str, Any]]:
+        stream = _turn_of(session_id).stream
+        try:
+            if stream is None:
+                reply = (await self.llm.agenerate_chat(pending.system_prompt, pending.history),)
+            else:
+                stream.actions(pending.actions)
+                reply = await self._agenerate_stream(pending, stream)
+            # l'ajout à l'historique peut replier les anciens messages par un résumé LLM bloquant
+            # (summarizer "llm") : dans un thread, comme le reste du tour
+            return await asyncio.to_thread(self._llm_reply, session_id, pending, *reply)
+        except LLMError as e:
+            return await asyncio.to_thread(self._llm_fallback, session_id, pending, e)
+
+    def _llm_reply(self, session_id: str, pending: "PendingGeneration", assistant_text: str,
+                   complete: bool = True) -> Tuple[str, Dict[str, Any]]:
+        if not assistant_text or not assistant_text.strip():
+            print("[DialogManager] WARNING: LLM returned empty response, using fallback")
+            raise LLMError("Empty response from LLM")
+
+        print("[DialogManager] LLM response length:", len(assistant_text))
+        if pending.cache_key is not None and complete:
+            response_cache.put(pending.cache_key, assistant_text)
+
+        self._append_message(session_id, "assistant", assistant_text)
+        return assistant_text, pending.actions
+
+    def _llm_fallback(self, session_id: str, pending: "PendingGeneration", error: LLMError) -> Tuple[str, Dict[str, Any]]:
+        print("[DialogManager] LLMError:", error)
+        _set_route("llm_fallback")
+        rule_val = RULES.get(pending.intent)
+        if rule_val:
+            if isinstance(rule_val, list):
+                tmpl = random.choice(rule_val)
+            else:
+                tmpl = rule_val
 
-                self._append_message(session_id, "assistant", resp)
-                return resp, {}
+            if "{" in tmpl:
+                resp = tmpl.format(**pending.entities)
+            else:
+                resp = tmpl
+
+            self._append_message(session_id, "assistant", resp)
+            return resp, {}
+
+        default = "Désolé, le système de dialogue n'est pas disponible pour le moment. Pouvez-vous reformuler ?"
+        self._append_message(session_id, "assistant", default)
+        return default, {}
 
-            default = "Désolé, le système de dialogue n'est pas disponible pour le moment. Pouvez-vous reformuler ?"
-            self._append_message(session_id, "assistant", default)
-            return default, {}
 
-        
 if __name__ == "__main__":
     import time
     
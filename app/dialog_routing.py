@@ -0,0 +1,105 @@
+"""
+app/dialog_routing.py
+Routage des tours de dialogue : réponse directe (modèles + catalogue) ou LLM.
+
+Les intentions au contenu déterministe (salutation, horaires, présentation du robot, liste des
+activités) sont servies depuis des modèles quand le NLU est assez sûr de lui, sans aller-retour
+LLM (Gemini : jusqu'à `timeout` secondes). Politique configurable dans la config LLM
+(`configs/llm_openai_config.json`, clé "routing") :
+
+    "routing": {
+        "enabled": true,
+        "intents": {
+            "greeting": {"min_confidence": 0.5, "max_words": 4},
+            "ask_hours": {"min_confidence": 0.5, "templates": ["..."]}
+        }
+    }
+
+Chaque tour est compté par route : `rule` (modèle), `flow` (navigation, réservation, catalogue,
+confirmation), `cache` (réponse LLM déjà produite, app/response_cache.py), `llm`, `llm_fallback`
+(LLM en échec → RULES) ; /v1/metrics expose la part des tours servis sans LLM.
+"""
+import random
+import threading
+from typing import Any, Dict, List, Optional
+
+# Modèles par défaut ; {activites} est remplacé par les activités du catalogue
+DEFAULT_TEMPLATES: Dict[str, List[str]] = {
+    "greeting": [
+        "Bonjour ! Je peux vous aider pour les horaires, les inscriptions, les réservations ou pour vous orienter. Que souhaitez‑vous ?",
+        "Bonjour ! En quoi puis-je vous être utile pour votre visite à la salle multisports ?",
+    ],
+    "ask_hours": ["La salle est ouverte du lundi au vendredi de 8h à 22h, et le weekend de 9h à 18h."],
+    "who_are_you": [
+        "Je suis le robot d'accueil de la salle multisports. Je peux vous donner les horaires, présenter les "
+        "activités ({activites}), vous guider dans le bâtiment ou réserver une salle.",
+    ],
+}
+
+DEFAULT_POLICY: Dict[str, Dict[str, Any]] = {
+    # une salutation suivie d'une question ("bonjour, c'est combien ?") reste pour le LLM
+    "greeting": {"min_confidence": 0.5, "max_words": 4},
+    "ask_hours": {"min_confidence": 0.5},
+    "who_are_you": {"min_confidence": 0.25},
+}
+
+ROUTES = ("rule", "flow", "cache", "llm", "llm_fallback")
+
+# entités qui rendent la question précise ("le cours de yoga", "demain") : le modèle générique n'y répond pas
+SPECIFIC_ENTITIES = ("activity", "location", "date", "jour", "heure", "minutes")
+
+
+class RoutingPolicy:
+    def __init__(self, cfg: Dict[str, Any] = None):
+        cfg = cfg or {}
+        self.enabled = cfg.get("enabled", True)
+        self.intents: Dict[str, Dict[str, Any]] = {}
+        for intent, rule in {**DEFAULT_POLICY, **cfg.get("intents", {})}.items():
+            if rule is None:  # "intent": null dans la config : toujours le LLM
+                continue
+            rule = dict(rule)
+            rule.setdefault("templates", DEFAULT_TEMPLATES.get(intent, []))
+            if rule["templates"]:
+                self.intents[intent] = rule
+
+    def fast_reply(self, intent: str, confidence: float, text: str, activity_names: List[str],
+                   entities: Dict[str, Any] = None) -> Optional[str]:
+        """Réponse modèle si l'intention est routée hors LLM, le NLU assez confiant et la question sans
+        activité, lieu ni date, sinon None."""
+        rule = self.intents.get(intent) if self.enabled else None
+        if rule is None or confidence < rule.get("min_confidence", 0.0):
+            return None
+        if any((entities or {}).get(key) for key in SPECIFIC_ENTITIES):
+            return None
+        if rule.get("max_words") and len(text.split()) > rule["max_words"]:
+            return None
+        activites = ", ".join(activity_names) if activity_names else "sports collectifs, natation, fitness"
+        return random.choice(rule["templates"]).format(activites=activites)
+
+
+class RoutingStats:
+    """Compteurs de routes par intention (partagés entre rechargements du DialogManager)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, intent: str, route: str) -> None:
+        with self._lock:
+            by_route = self.counts.setdefault(intent, {})
+            by_route[route] = by_route.get(route, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            totals = {route: sum(c.get(route, 0) for c in self.counts.values()) for route in ROUTES}
+            turns = sum(totals.values())
+            without_llm = totals["rule"] + totals["flow"] + totals["cache"]
+            return {
+                "turns": turns,
+                "routes": totals,
+                "without_llm_share": round(without_llm / turns, 4) if turns else 0.0,
+                "by_intent": {intent: dict(c) for intent, c in self.counts.items()},
+            }
+
+
+routing_stats = RoutingStats()
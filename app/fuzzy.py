@@ -0,0 +1,198 @@
+"""
+app/fuzzy.py
+Index de recherche approchée sur les lexiques (lieux, activités, mots de réveil) pour
+rattraper les entités mal transcrites par l'ASR ("salle bé", "natacion").
+
+Deux clés par entrée :
+ - la forme normalisée (minuscules, sans accents), indexée par bigrammes de caractères :
+   seules les formes de longueur compatible partageant assez de bigrammes sont comparées
+   (distance d'édition bornée, abandon dès que la borne est dépassée) ;
+ - une clé phonétique française simplifiée, rangée dans un dict (correspondance exacte).
+Une recherche renvoie l'entrée la plus proche avec sa distance d'édition, pour que le
+dialogue puisse demander confirmation plutôt qu'échouer.
+"""
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+WAKE_WORDS = ["pepper", "bonjour", "salut", "hello"]
+
+# Mots outils et mots courants du domaine ignorés pour les n-grammes candidats, sous leur forme
+# normalisée (sans accents : "a" pour "à", "ou" pour "où") :
+# sans eux "cours" passe pour "course", "centre" pour "entree"
+_STOPWORDS = {
+    "le", "la", "les", "l", "un", "une", "des", "du", "de", "d", "au", "aux", "a", "en",
+    "je", "tu", "il", "on", "nous", "vous", "me", "m", "est", "et", "ou", "pour", "vers",
+    "veux", "voudrais", "cherche", "aller", "faire", "trouve", "sont", "qui", "que", "quoi",
+    "ce", "cet", "cette", "ces", "c", "y", "ne", "pas", "se", "sa", "son", "mon", "ma", "mes", "votre", "vos",
+    "quel", "quels", "quelle", "quelles", "quand", "comment", "combien", "avec", "sans", "sur", "dans", "par", "entre",
+    "peux", "peut", "pouvez", "puis", "avez", "ai", "as", "ont", "etre", "avoir", "merci", "oui", "non", "ok",
+    "cours", "centre", "ouvert", "ouverte", "ouverts", "ouvre", "ferme", "proposes", "propose", "proposez",
+    "reserver", "reservation", "inscrire", "horaire", "horaires", "heure", "heures", "soir", "matin", "midi",
+    "jour", "jours", "semaine", "demain", "aujourd", "hui", "ici", "bien", "plus", "tout", "tous", "encore",
+}
+
+# Lettres prononcées ("bé" → b) : "salle bé" et "salle b" ont la même clé
+_LETTER_NAMES = {"be": "b", "ce": "c", "se": "c", "de": "d", "ef": "f", "effe": "f", "ge": "g", "je": "g"}
+
+_PHONETIC_RULES = [
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"qu"), "k"),
+    (re.compile(r"c(?=[eiy])"), "s"),
+    (re.compile(r"c"), "k"),
+    (re.compile(r"g(?=[eiy])"), "j"),
+    (re.compile(r"(?<=[aeiouy])s(?=[aeiouy])"), "z"),
+    (re.compile(r"t(?=ion)"), "s"),
+    (re.compile(r"eau|au"), "o"),
+    (re.compile(r"ai|ei"), "e"),
+    (re.compile(r"y"), "i"),
+    (re.compile(r"h"), ""),
+    (re.compile(r"(.)\1+"), r"\1"),
+]
+_SILENT_END = re.compile(r"(?<=\w)[estxd]$")
+_TOKEN = re.compile(r"[\w'-]+")
+
+
+def normalize(text: str) -> str:
+    s = unicodedata.normalize("NFD", (text or "").lower())
+    s = "".join(c for c in s if unicodedata.category(c) != "Mn")
+    s = s.replace("_", " ").replace("-", " ")
+    return " ".join(s.split())
+
+
+def phonetic_key(text: str) -> str:
+    words = []
+    for word in normalize(text).split():
+        word = _LETTER_NAMES.get(word, word)
+        for pattern, repl in _PHONETIC_RULES:
+            word = pattern.sub(repl, word)
+        while len(word) > 2 and _SILENT_END.search(word):
+            word = word[:-1]
+        words.append(word)
+    return " ".join(words)
+
+
+def levenshtein(a: str, b: str, max_distance: int = None) -> int:
+    """Distance d'édition ; si `max_distance` est donné, renvoie max_distance + 1 dès qu'elle est dépassée."""
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+def _bigrams(form: str) -> set:
+    padded = f" {form} "
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def max_distance_for(term: str) -> int:
+    """Tolérance selon la longueur : aucune sous 4 caractères, 1 jusqu'à 5 ("tenis" → "tennis"),
+    2 jusqu'à 10, 3 au-delà."""
+    n = len(term)
+    if n < 4:
+        return 0
+    if n <= 5:
+        return 1
+    return 2 if n <= 10 else 3
+
+
+class FuzzyIndex:
+    """Lexique (forme → (type, valeur canonique)) indexé par bigrammes et clé phonétique."""
+
+    def __init__(self, entries: Iterable[Tuple[str, str, str]] = ()):
+        self._entries: Dict[str, List[Tuple[str, str]]] = {}
+        self._phonetic: Dict[str, List[str]] = {}
+        self._grams: Dict[str, set] = {}
+        for surface, kind, canonical in entries:
+            self.add(surface, kind, canonical)
+
+    def add(self, surface: str, kind: str, canonical: str) -> None:
+        form = normalize(surface)
+        if not form:
+            return
+        targets = self._entries.setdefault(form, [])
+        if (kind, canonical) not in targets:
+            targets.append((kind, canonical))
+        forms = self._phonetic.setdefault(phonetic_key(form), [])
+        if form not in forms:
+            forms.append(form)
+        for gram in _bigrams(form):
+            self._grams.setdefault(gram, set()).add(form)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _candidates(self, form: str, max_distance: int) -> List[Tuple[int, str, bool]]:
+        """(distance, forme, accord phonétique) triés : distance croissante, phonétique d'abord."""
+        candidates = {}
+        for f in self._phonetic.get(phonetic_key(form), []):
+            d = levenshtein(form, f)
+            # forme courte : l'accord phonétique ne suffit pas ("court" / "course")
+            if d <= max_distance or len(form) > 5:
+                candidates[f] = (d, f, True)
+        # filtre par comptage : une opération d'édition détruit au plus 2 bigrammes
+        grams = _bigrams(form)
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for f in self._grams.get(gram, ()):
+                shared[f] = shared.get(f, 0) + 1
+        min_shared = max(1, len(grams) - 2 * max_distance)
+        for f, count in shared.items():
+            if f not in candidates and count >= min_shared and abs(len(f) - len(form)) <= max_distance:
+                d = levenshtein(form, f, max_distance)
+                if d <= max_distance:
+                    candidates[f] = (d, f, False)
+        return sorted(candidates.values(), key=lambda c: (c[0], not c[2]))
+
+    def _matches(self, form: str, kinds, max_distance: int = None) -> Dict[str, Dict[str, Any]]:
+        """Meilleure correspondance par type d'entrée."""
+        if max_distance is None:
+            max_distance = max_distance_for(form)
+        best: Dict[str, Dict[str, Any]] = {}
+        for distance, surface, phonetic in self._candidates(form, max_distance):
+            for kind, canonical in self._entries[surface]:
+                if (kinds is None or kind in kinds) and kind not in best:
+                    best[kind] = {"kind": kind, "match": canonical, "surface": surface,
+                                  "distance": distance, "phonetic": phonetic}
+        return best
+
+    def lookup(self, term: str, kinds: Iterable[str] = None, max_distance: int = None) -> Optional[Dict[str, Any]]:
+        """Meilleure entrée pour `term` : {kind, match, surface, distance, phonetic} ou None."""
+        form = normalize(term)
+        if not form:
+            return None
+        matches = self._matches(form, set(kinds) if kinds else None, max_distance)
+        if not matches:
+            return None
+        return min(matches.values(), key=lambda m: (m["distance"], not m["phonetic"]))
+
+    def find_in_text(self, text: str, kinds: Iterable[str] = None, max_ngram: int = 3) -> List[Dict[str, Any]]:
+        """
+        Cherche les n-grammes du texte (hors mots outils) dans l'index.
+        Garde, par type, la meilleure correspondance (plus petite distance, n-gramme le plus long).
+        """
+        kinds = set(kinds) if kinds else None
+        tokens = _TOKEN.findall(normalize(text))
+        best: Dict[str, Dict[str, Any]] = {}
+        for n in range(max_ngram, 0, -1):
+            for i in range(len(tokens) - n + 1):
+                gram = tokens[i:i + n]
+                if gram[0] in _STOPWORDS or gram[-1] in _STOPWORDS:
+                    continue
+                term = " ".join(gram)
+                for kind, found in self._matches(term, kinds).items():
+                    current = best.get(kind)
+                    if current is None or found["distance"] < current["distance"]:
+                        best[kind] = dict(found, input=term)
+        return list(best.values())
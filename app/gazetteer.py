@@ -0,0 +1,165 @@
+"""
+app/gazetteer.py
+Gazetteer d'entités construit à partir du catalogue Mongo (collections `salle` et `activite`,
+lues via le cache de app/catalog.py).
+
+Chaque nom du catalogue, ses alias (champ `aliases` des documents) et quelques variantes
+sont compilés une fois dans un PhraseMatcher spaCy (correspondance par hash de tokens :
+le coût ne dépend pas de la taille du catalogue). Un thread de fond recalcule une empreinte
+du catalogue et reconstruit le matcher quand elle change ; le nouveau matcher remplace
+l'ancien par une simple affectation, les requêtes en cours finissent sur l'ancien.
+"""
+import hashlib
+import json
+import threading
+import unicodedata
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from spacy.matcher import PhraseMatcher
+
+# Alias usuels, ajoutés quand l'activité correspondante existe dans le catalogue
+ACTIVITY_ALIASES = {
+    "natation": ["piscine", "nage", "nager"],
+    "musculation": ["muscu"],
+    "basket": ["basketball", "basket-ball"],
+    "football": ["foot"],
+    "futsal": ["foot en salle"],
+    "ping-pong": ["tennis de table"],
+}
+
+CatalogLoader = Callable[[], Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]
+
+
+def _strip_accents(s: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", s) if unicodedata.category(c) != "Mn")
+
+
+def _variants(name: str) -> List[str]:
+    """Formes reconnues pour un nom : minuscules, sans accents, tirets remplacés par des espaces."""
+    base = " ".join(name.lower().split())
+    out = {base, _strip_accents(base), base.replace("-", " "), base.replace("_", " ")}
+    return [v for v in out if v]
+
+
+def catalog_fingerprint(salles: Iterable[Dict[str, Any]], activites: Iterable[Dict[str, Any]]) -> str:
+    """Empreinte des champs utiles du catalogue (détecte ajouts, renommages, alias)."""
+    def key(doc):
+        return [doc.get("nom"), sorted(doc.get("aliases") or []), sorted(doc.get("activites_supportees") or [])]
+    payload = json.dumps([sorted(map(key, salles), key=str), sorted(map(key, activites), key=str)],
+                         default=str, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def load_catalog_from_cache() -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Salles et activités du cache partagé (app/catalog.py) : pas de requête Mongo par rafraîchissement."""
+    from app.catalog import catalog
+
+    snapshot = catalog.snapshot()
+    return snapshot.salles, snapshot.activites
+
+
+class _CompiledGazetteer:
+    """Matcher figé + table id de match → (label, nom canonique). Jamais modifié après construction."""
+
+    def __init__(self, nlp, salles, activites, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
+        self.canonical: Dict[int, Tuple[str, str]] = {}
+        # (label, nom canonique, formes reconnues) : réutilisé par l'index approché (app/fuzzy.py)
+        self.entries: List[Tuple[str, str, List[str]]] = []
+        for doc in activites:
+            name = doc.get("nom")
+            if name:
+                aliases = list(doc.get("aliases") or []) + ACTIVITY_ALIASES.get(name.lower(), [])
+                self._add(nlp, "SPORT", name, [name] + aliases)
+        for doc in salles:
+            name = doc.get("nom")
+            if name:
+                self._add(nlp, "LIEU", name, [name] + list(doc.get("aliases") or []))
+        self.size = len(self.canonical)
+
+    def _add(self, nlp, label: str, canonical: str, surfaces: List[str]) -> None:
+        key = f"{label}|{canonical}"
+        phrases = sorted({v for surface in surfaces for v in _variants(surface)})
+        # le vrai tokenizer : "ping-pong" est découpé comme dans les énoncés
+        self.matcher.add(key, list(nlp.tokenizer.pipe(phrases)))
+        self.canonical[nlp.vocab.strings[key]] = (label, canonical)
+        self.entries.append((label, canonical, phrases))
+
+
+class Gazetteer:
+    def __init__(self, nlp, loader: CatalogLoader = load_catalog_from_cache):
+        self.nlp = nlp
+        self.loader = loader
+        self._compiled: Optional[_CompiledGazetteer] = None
+        self._refresh_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.rebuilds = 0
+        self.last_error: Optional[str] = None
+        # appelés après chaque reconstruction (ex: vider le cache NLU)
+        self.on_rebuild: List[Callable[[], None]] = []
+
+    def build(self, salles, activites) -> _CompiledGazetteer:
+        return _CompiledGazetteer(self.nlp, salles, activites, catalog_fingerprint(salles, activites))
+
+    def refresh(self) -> bool:
+        """Relit le catalogue ; reconstruit et remplace le matcher si l'empreinte a changé."""
+        with self._refresh_lock:
+            try:
+                salles, activites = self.loader()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"[Gazetteer] Catalogue indisponible: {e}")
+                return False
+            self.last_error = None
+            current = self._compiled
+            if current is not None and current.fingerprint == catalog_fingerprint(salles, activites):
+                return False
+            compiled = self.build(salles, activites)
+            self._compiled = compiled  # swap atomique (affectation de référence)
+            self.rebuilds += 1
+            print(f"[Gazetteer] Reconstruit : {compiled.size} entrées")
+        for callback in self.on_rebuild:
+            callback()
+        return True
+
+    def start(self, interval_seconds: float = 300.0) -> None:
+        """Construit le gazetteer puis le rafraîchit en arrière-plan toutes les `interval_seconds`."""
+        if self._thread is not None:
+            return
+
+        def loop():
+            self.refresh()
+            while not self._stop.wait(interval_seconds):
+                self.refresh()
+
+        self._thread = threading.Thread(target=loop, name="gazetteer-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def find(self, doc) -> List[Tuple[str, int, int, str]]:
+        """Correspondances (label, début, fin, nom canonique) dans `doc`."""
+        compiled = self._compiled
+        if compiled is None:
+            return []
+        out = []
+        for match_id, start, end in compiled.matcher(doc):
+            label, canonical = compiled.canonical[match_id]
+            out.append((label, start, end, canonical))
+        return out
+
+    def entries(self) -> List[Tuple[str, str, List[str]]]:
+        compiled = self._compiled
+        return list(compiled.entries) if compiled else []
+
+    def stats(self) -> Dict[str, Any]:
+        compiled = self._compiled
+        return {
+            "entries": compiled.size if compiled else 0,
+            "fingerprint": compiled.fingerprint if compiled else None,
+            "rebuilds": self.rebuilds,
+            "last_error": self.last_error,
+        }
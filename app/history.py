@@ -0,0 +1,176 @@
+"""
+app/history.py
+Historique de dialogue sous budget de tokens.
+
+Chaque message stocké en session porte une estimation de sa taille (`tokens`). Quand système + résumé +
+historique dépassent `budget_tokens`, les plus anciens messages sont repliés dans un résumé courant
+(`session["history_summary"]`), mis à jour de façon incrémentale : seuls les messages sortants sont
+résumés, jamais tout l'historique. Les `keep_recent` derniers messages restent toujours mot pour mot.
+
+Configuration dans la config LLM (clé "history") :
+
+    "history": {"budget_tokens": 1500, "keep_recent": 4, "summary_tokens": 250, "summarizer": "extractive"}
+
+`summarizer` : `extractive` (première phrase de chaque message, sans appel réseau) ou `llm` (le backend
+du dialogue condense l'ancien résumé et les messages sortants ; repli sur `extractive` en cas d'échec).
+"""
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "budget_tokens": 1500,
+    "keep_recent": 4,
+    "summary_tokens": 250,
+    "summarizer": "extractive",
+}
+
+# surcoût d'un message (rôle, séparateurs) dans les formats chat
+MESSAGE_OVERHEAD = 4
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s")
+_ROLE_LABELS = {"user": "Visiteur", "assistant": "Robot"}
+
+SUMMARY_PROMPT = (
+    "Tu résumes une conversation entre un visiteur et le robot d'accueil d'une salle multisports. "
+    "Mets à jour le résumé existant avec les nouveaux échanges, en français, en {max_words} mots au plus. "
+    "Garde les demandes du visiteur, les informations données et ce qui reste en suspens."
+)
+
+Summarizer = Callable[[str, List[Dict[str, Any]], int], str]
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximation sans tokenizer : ~4 caractères par token (BPE sur du français)."""
+    return max(1, (len(text or "") + 3) // 4)
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    if "tokens" not in message:
+        message["tokens"] = estimate_tokens(message.get("content", ""))
+    return message["tokens"] + MESSAGE_OVERHEAD
+
+
+def _first_sentence(text: str, max_chars: int = 160) -> str:
+    sentence = _SENTENCE_END.split((text or "").strip(), 1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars].rstrip() + "…"
+
+
+def extractive_summary(previous: str, messages: List[Dict[str, Any]], max_tokens: int) -> str:
+    """Ancien résumé + une ligne par message sortant ; les lignes les plus anciennes tombent au-delà du budget."""
+    lines = previous.splitlines() if previous else []
+    for msg in messages:
+        lines.append("{} : {}".format(_ROLE_LABELS.get(msg.get("role"), msg.get("role")),
+                                      _first_sentence(msg.get("content", ""))))
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def llm_summarizer(llm) -> Summarizer:
+    """Résumé par le backend du dialogue (appel court, déclenché seulement quand des messages sortent)."""
+    def summarize(previous: str, messages: List[Dict[str, Any]], max_tokens: int) -> str:
+        exchanges = "\n".join("{} : {}".format(_ROLE_LABELS.get(m.get("role"), m.get("role")), m.get("content", ""))
+                              for m in messages)
+        request = "Résumé existant :\n{}\n\nNouveaux échanges :\n{}".format(previous or "(aucun)", exchanges)
+        text = llm.generate_chat(SUMMARY_PROMPT.format(max_words=max_tokens * 3 // 4),
+                                 [{"role": "user", "content": request}])
+        if not text or not text.strip():
+            raise ValueError("résumé vide")
+        return text.strip()
+    return summarize
+
+
+class HistoryStats:
+    """Taille des prompts envoyés au LLM et nombre de repliements (partagés entre rechargements)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.prompt_tokens_total = 0
+        self.prompt_tokens_max = 0
+        self.compactions = 0
+        self.folded_messages = 0
+        self.summarizer_failures = 0
+
+    def record_prompt(self, tokens: int) -> None:
+        with self._lock:
+            self.prompts += 1
+            self.prompt_tokens_total += tokens
+            self.prompt_tokens_max = max(self.prompt_tokens_max, tokens)
+
+    def record_compaction(self, folded: int, failed: bool) -> None:
+        with self._lock:
+            self.compactions += 1
+            self.folded_messages += folded
+            self.summarizer_failures += int(failed)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "prompts": self.prompts,
+                "prompt_tokens_mean": round(self.prompt_tokens_total / self.prompts, 1) if self.prompts else 0.0,
+                "prompt_tokens_max": self.prompt_tokens_max,
+                "compactions": self.compactions,
+                "folded_messages": self.folded_messages,
+                "summarizer_failures": self.summarizer_failures,
+            }
+
+
+history_stats = HistoryStats()
+
+
+class HistoryManager:
+    def __init__(self, cfg: Dict[str, Any] = None, summarizer: Optional[Summarizer] = None):
+        cfg = {**DEFAULT_CONFIG, **(cfg or {})}
+        self.budget_tokens = int(cfg["budget_tokens"])
+        self.keep_recent = max(1, int(cfg["keep_recent"]))
+        self.summary_tokens = int(cfg["summary_tokens"])
+        self.summarizer = summarizer or extractive_summary
+
+    def append(self, session: Dict[str, Any], role: str, content: str, system_prompt: str = "") -> None:
+        """Ajoute un message puis replie les plus anciens si le budget est dépassé."""
+        session.setdefault("history", []).append(
+            {"role": role, "content": content, "tokens": estimate_tokens(content)})
+        self.compact(session, system_prompt)
+
+    def prompt_tokens(self, session: Dict[str, Any], system_prompt: str = "") -> int:
+        summary = session.get("history_summary", {}).get("text", "")
+        tokens = estimate_tokens(system_prompt) + (estimate_tokens(summary) + MESSAGE_OVERHEAD if summary else 0)
+        return tokens + sum(message_tokens(m) for m in session.get("history", []))
+
+    def compact(self, session: Dict[str, Any], system_prompt: str = "") -> int:
+        """Replie les messages les plus anciens dans le résumé ; renvoie le nombre de messages repliés."""
+        history = session.get("history", [])
+        if self.prompt_tokens(session, system_prompt) <= self.budget_tokens or len(history) <= self.keep_recent:
+            return 0
+        # messages sortants : les plus anciens, jusqu'à ce que système + résumé plein + récents tiennent
+        room = self.budget_tokens - estimate_tokens(system_prompt) - self.summary_tokens - MESSAGE_OVERHEAD
+        kept = sum(message_tokens(m) for m in history)
+        n = 0
+        while n < len(history) - self.keep_recent and kept > room:
+            kept -= message_tokens(history[n])
+            n += 1
+        # un échange ne commence pas par une réponse du robot
+        while n < len(history) - self.keep_recent and history[n].get("role") == "assistant":
+            n += 1
+        folded, session["history"] = history[:n], history[n:]
+        summary = session.get("history_summary", {})
+        failed = False
+        try:
+            text = self.summarizer(summary.get("text", ""), folded, self.summary_tokens)
+        except Exception as e:
+            print("[History] Résumé LLM indisponible, repli extractif:", e)
+            failed = True
+            text = extractive_summary(summary.get("text", ""), folded, self.summary_tokens)
+        session["history_summary"] = {"text": text, "messages": summary.get("messages", 0) + n}
+        history_stats.record_compaction(n, failed)
+        return n
+
+    def prompt(self, session: Dict[str, Any], system_prompt: str) -> Tuple[str, List[Dict[str, str]]]:
+        """(prompt système + résumé courant, messages récents) à envoyer au LLM."""
+        history_stats.record_prompt(self.prompt_tokens(session, system_prompt))
+        summary = session.get("history_summary", {}).get("text", "")
+        if summary:
+            system_prompt = "{}\n\nRésumé du début de la conversation :\n{}".format(system_prompt, summary)
+        messages = [{"role": m["role"], "content": m["content"]} for m in session.get("history", [])]
+        return system_prompt, messages
@@ -7,175 +7,152 @@ LLM client wrapper with support for:
  - Google Gemini REST API (v1beta/models/*:generateContent)
 
 Configure which backend to use in configs/llm_config.json.
+generate_chat_stream() yields the answer as it is generated (SSE on every backend).
+agenerate_chat() / agenerate_chat_stream() are the asyncio versions: the caller awaits the generation
+without holding a thread. Every call goes through the pooled transport of app/llm_transport.py.
 """
 
-import requests
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, AsyncIterator, Callable, Iterator, Optional, Tuple
 import json
 import os
+
+import httpx
 from dotenv import load_dotenv
 
+from app.llm_transport import TransportSaturated, get_transport
+
 load_dotenv()
 llm_openai = "llm_openai_config.json"
 DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "configs", llm_openai)
 
+# (url, query params, JSON body, parser of the response / of one SSE event, label for errors)
+Request = Tuple[str, Optional[Dict[str, str]], Dict[str, Any], Callable[[Any], Optional[str]], str]
+
 
 class LLMError(Exception):
     pass
 
 
 class LLMClient:
-    def __init__(self, config_path: str = DEFAULT_CONFIG_PATH):
-        with open(config_path, "r", encoding="utf-8") as f:
-            cfg = json.load(f)
+    def __init__(self, config_path: str = DEFAULT_CONFIG_PATH, cfg: Dict[str, Any] = None):
+        # cfg : config déjà chargée (un backend de la liste "backends", cf. app/llm_router.py)
+        if cfg is None:
+            with open(config_path, "r", encoding="utf-8") as f:
+                cfg = json.load(f)
         # "fastchat", "hf_tgi", "openai", "gemini"
         self.backend = cfg.get("backend", "fastchat")
         self.endpoint = cfg.get("endpoint", "http://localhost:8000")
         self.model = cfg.get("model", "")
         self.timeout = cfg.get("timeout", 30)
         # optional headers (api keys, etc.). For Gemini, we pass the key in query param, but headers can still be used.
-        self.headers = cfg.get("headers", {})
-        
+        self.headers = dict(cfg.get("headers", {}))
+
         # optional: API key for Gemini (can be in headers or in this field)
         # PRIORITÉ : On regarde d'abord dans le fichier .env, sinon dans le JSON
+        # (backend Gemini seulement : la clé ne part pas vers les autres backends d'un routeur)
         env_key = os.getenv("GEMINI_API_KEY")
-        if env_key:
+        if env_key and self.backend == "gemini":
             self.api_key = env_key
             # Si ton backend Gemini utilise les headers, on met à jour aussi
             self.headers["x-goog-api-key"] = env_key
         else:
             self.api_key = cfg.get("api_key")
-    # ---------- Backends type chat-completions (OpenAI-like) ----------
-
-    def _DEBUG_call_chat_completions(self, messages):
-        import time
-        import requests
-        
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "stream": False,
-            "options": {
-                "temperature": 0.3
-            }
-        }
-        
-        # Correction : on utilise self.endpoint et on s'assure du chemin complet
-        # Si ton endpoint est déjà http://localhost:11434/v1, vérifie la concaténation
-        url = "{0}/chat/completions".format(self.endpoint.rstrip('/'))
-        
-        print("\n--- [DEBUG OLLAMA START] ---")
-        print("URL cible: {0}".format(url))
-        
-        start_time = time.time()
-        try:
-            r = requests.post(url, json=payload, headers=self.headers, timeout=self.timeout)
-            duration = time.time() - start_time
-            
-            print("Status Code: {0} | Time: {1:.2f}s".format(r.status_code, duration))
-            
-            if r.status_code != 200:
-                print("SERVER ERROR BODY: {0}".format(r.text))
-                return ""
+        # pool de connexions partagé (keep-alive, HTTP/2) et limite d'appels simultanés vers ce backend
+        self.transport = get_transport(self.backend, self.endpoint, self.timeout, cfg.get("transport"))
 
-            data = r.json()
-            # On essaie d'extraire le contenu selon le format standard OpenAI/Ollama
-            choices = data.get("choices", [])
-            if choices:
-                content = choices[0].get("message", {}).get("content", "")
-            else:
-                # Fallback si Ollama répond au format direct /api/chat au lieu de /v1
-                content = data.get("message", {}).get("content", "")
-                
-            print("Done Reason: {0}".format(data.get("choices", [{}])[0].get("finish_reason", "unknown")))
-            print("Content: '{0}'".format(content))
-            print("--- [DEBUG OLLAMA END] ---\n")
-            
-            return content
+    # ---------- Backends type chat-completions (OpenAI-like) ----------
 
-        except Exception as e:
-            print("!!! CRITICAL EXCEPTION: {0}".format(str(e)))
-            return ""
-        
-    def _call_chat_completions(self, messages: List[Dict[str, str]]) -> str:
+    def _chat_completions_payload(self, messages: List[Dict[str, str]], stream: bool) -> Dict[str, Any]:
         """
-        Call an endpoint /v1/chat/completions compatible with OpenAI format.
+        Body for an endpoint /chat/completions compatible with OpenAI format.
         Works for:
         - FastChat (self.backend == "fastchat")
         - OpenAI (self.backend == "openai")
+        - Ollama (endpoint http://localhost:11434/v1)
         """
-        url = self.endpoint.rstrip("/") + "/v1/chat/completions"
-        payload = {
+        return {
             "model": self.model,
             "messages": messages,
-            "stream": False,
-            "temperature": 0.2,
-            "max_tokens": 150
+            "stream": stream,
+            "options": {
+                "temperature": 0.3
+            }
         }
-        r = requests.post(url, json=payload, headers=self.headers, timeout=self.timeout)
-        if r.status_code != 200:
-            raise LLMError(f"Chat-completions call failed: {r.status_code} {r.text}")
-        data = r.json()
-        try:
-            return data["choices"][0]["message"]["content"]
-        except Exception as e:
-            raise LLMError(f"Unexpected chat-completions response format: {e} - {data}")
+
+    def _chat_completions_url(self) -> str:
+        # the endpoint already ends with /v1 (e.g. http://localhost:11434/v1)
+        return "{0}/chat/completions".format(self.endpoint.rstrip('/'))
+
+    @staticmethod
+    def _parse_chat_completions(data: Dict[str, Any]) -> str:
+        # On essaie d'extraire le contenu selon le format standard OpenAI/Ollama
+        choices = data.get("choices", [])
+        if choices:
+            return choices[0].get("message", {}).get("content", "")
+        # Fallback si Ollama répond au format direct /api/chat au lieu de /v1
+        if "message" in data:
+            return data["message"].get("content", "")
+        raise LLMError(f"Unexpected chat-completions response format: {data}")
+
+    @staticmethod
+    def _chat_completions_delta(event: Dict[str, Any]) -> Optional[str]:
+        choices = event.get("choices") or [{}]
+        return choices[0].get("delta", {}).get("content")
 
     # ---------- HuggingFace TGI /generate ----------
 
-    def _call_hf_tgi(self, prompt: str) -> str:
+    @staticmethod
+    def _hf_tgi_payload(prompt: str) -> Dict[str, Any]:
         """
-        Call HuggingFace Text-Generation-Inference /generate endpoint.
+        HuggingFace Text-Generation-Inference /generate (or /generate_stream) body.
         Endpoint example: http://localhost:8080
-        Payload example: {"inputs": prompt, "parameters": {"max_new_tokens": 512}}
         """
-        url = self.endpoint.rstrip("/") + "/generate"
-        payload = {
+        return {
             "inputs": prompt,
             "parameters": {
                 "max_new_tokens": 512,
                 "temperature": 0.2,
             },
         }
-        r = requests.post(url, json=payload, headers=self.headers, timeout=self.timeout)
-        if r.status_code != 200:
-            raise LLMError(f"HuggingFace TGI call failed: {r.status_code} {r.text}")
-        data = r.json()
-        try:
-            if isinstance(data, list):
-                return data[0].get("generated_text", "")
-            return data.get("generated_text", "")
-        except Exception as e:
-            raise LLMError(f"Unexpected HF-TGI response format: {e} - {data}")
+
+    @staticmethod
+    def _parse_hf_tgi(data: Any) -> str:
+        if isinstance(data, list):
+            return data[0].get("generated_text", "")
+        return data.get("generated_text", "")
+
+    @staticmethod
+    def _hf_tgi_token(event: Dict[str, Any]) -> Optional[str]:
+        if "error" in event:
+            raise LLMError(f"HuggingFace TGI stream error: {event['error']}")
+        token = event.get("token", {})
+        return None if token.get("special") else token.get("text")
 
     # ---------- Gemini REST API ----------
 
-    def _call_gemini(self, system_prompt: str, history: List[Dict[str, str]]) -> str:
+    def _gemini_url(self, method: str) -> str:
         """
-        Call Google Gemini API (REST).
+        Google Gemini API (REST).
 
         Expected config:
         - endpoint: "https://generativelanguage.googleapis.com"
         - model: e.g. "gemini-1.5-flash" or "gemini-1.5-pro"
-          (the model name will be used in URL: /v1beta/models/{model}:generateContent)
+          (the model name will be used in URL: /v1beta/models/{model}:{method})
         - api_key: your Gemini API key (string) in config, or in headers["x-goog-api-key"].
-
-        We convert (system + history) into 'contents' as required by Gemini.
         """
+        return f"{self.endpoint.rstrip('/')}/v1beta/models/{self.model}:{method}"
 
-        base_url = self.endpoint.rstrip("/")
-        model_name = self.model  # e.g., "gemini-1.5-flash"
-        url = f"{base_url}/v1beta/models/{model_name}:generateContent"
-
+    def _gemini_key(self) -> str:
         # Determine API key location
         api_key = self.api_key or self.headers.get("x-goog-api-key")
         if not api_key:
             raise LLMError("Gemini API key not provided. Set 'api_key' or 'headers.x-goog-api-key' in llm_config.json.")
+        return api_key
 
-        params = {"key": api_key}
-
-        # Build contents:
-        # We create one content with multiple parts for system + messages
+    def _gemini_body(self, system_prompt: str, history: List[Dict[str, str]]) -> Dict[str, Any]:
+        # We convert (system + history) into 'contents' as required by Gemini:
+        # one content with multiple parts for system + messages
         parts = []
         if system_prompt:
             parts.append({"text": f"SYSTEM: {system_prompt.strip()}"})
@@ -184,7 +161,7 @@ class LLMClient:
             content_text = msg.get("content", "").strip()
             parts.append({"text": f"{role.upper()}: {content_text}"})
 
-        body = {
+        return {
             "contents": [
                 {
                     "parts": parts
@@ -196,24 +173,98 @@ class LLMClient:
             }
         }
 
-        r = requests.post(url, params=params, json=body, headers=self.headers, timeout=self.timeout)
-        if r.status_code != 200:
-            raise LLMError(f"Gemini call failed: {r.status_code} {r.text}")
+    @staticmethod
+    def _parse_gemini(data: Dict[str, Any]) -> str:
+        # Typical Gemini response: candidates[0].content.parts[0].text
+        candidates = data.get("candidates", [])
+        if not candidates:
+            raise LLMError(f"No candidates in Gemini response: {data}")
+        parts_out = candidates[0].get("content", {}).get("parts", [])
+        if not parts_out:
+            raise LLMError(f"No parts in Gemini candidate: {data}")
+        return parts_out[0].get("text", "")
+
+    @staticmethod
+    def _gemini_delta(event: Dict[str, Any]) -> Optional[str]:
+        for candidate in event.get("candidates", [])[:1]:
+            return "".join(part.get("text", "") for part in candidate.get("content", {}).get("parts", []))
+        return None
 
-        data = r.json()
+    # ---------- Requests (shared by the sync and async paths) ----------
+
+    @staticmethod
+    def _chat_messages(system_prompt: str, history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        for msg in history:
+            messages.append({"role": msg["role"], "content": msg["content"]})
+        return messages
+
+    @staticmethod
+    def _tgi_prompt(system_prompt: str, history: List[Dict[str, str]]) -> str:
+        parts = []
+        if system_prompt:
+            parts.append("System: " + system_prompt.strip())
+        for msg in history:
+            role = msg["role"].capitalize()
+            parts.append(f"{role}: {msg['content'].strip()}")
+        parts.append("Assistant:")
+        return "\n".join(parts)
+
+    def _request(self, system_prompt: str, history: List[Dict[str, str]], stream: bool) -> Request:
+        """Build an LLM request from system prompt and history for the configured backend."""
+        # Backends type chat completions (messages[])
+        if self.backend in ("fastchat", "openai"):
+            payload = self._chat_completions_payload(self._chat_messages(system_prompt, history), stream)
+            parse = self._chat_completions_delta if stream else self._parse_chat_completions
+            return self._chat_completions_url(), None, payload, parse, "Chat-completions"
+        # Backend TGI (prompt concaténé)
+        elif self.backend == "hf_tgi":
+            url = self.endpoint.rstrip("/") + ("/generate_stream" if stream else "/generate")
+            parse = self._hf_tgi_token if stream else self._parse_hf_tgi
+            return url, None, self._hf_tgi_payload(self._tgi_prompt(system_prompt, history)), parse, "HuggingFace TGI"
+        # Backend Gemini (REST)
+        elif self.backend == "gemini":
+            params = {"key": self._gemini_key()}
+            if stream:
+                params["alt"] = "sse"
+            url = self._gemini_url("streamGenerateContent" if stream else "generateContent")
+            parse = self._gemini_delta if stream else self._parse_gemini
+            return url, params, self._gemini_body(system_prompt, history), parse, "Gemini"
+        else:
+            raise LLMError(f"Unsupported backend: {self.backend}")
+
+    def _log(self, what: str, status: int, start: float) -> None:
+        print("[LLM] {} {} | {} | {:.2f}s".format(what, self.model, status, time.perf_counter() - start))
+
+    @staticmethod
+    def _decode(r: httpx.Response, parse: Callable[[Any], Optional[str]], what: str) -> str:
+        if r.status_code != 200:
+            raise LLMError(f"{what} call failed: {r.status_code} {r.text}")
         try:
-            # Typical Gemini response: candidates[0].content.parts[0].text
-            candidates = data.get("candidates", [])
-            if not candidates:
-                raise LLMError(f"No candidates in Gemini response: {data}")
-            content = candidates[0].get("content", {})
-            parts_out = content.get("parts", [])
-            if not parts_out:
-                raise LLMError(f"No parts in Gemini candidate: {data}")
-            text = parts_out[0].get("text", "")
-            return text
+            data = r.json()
+        except ValueError as e:
+            raise LLMError(f"Unexpected {what} response (not JSON): {e} - {r.text[:200]}")
+        try:
+            return parse(data) or ""
+        except LLMError:
+            raise
         except Exception as e:
-            raise LLMError(f"Unexpected Gemini response format: {e} - {data}")
+            raise LLMError(f"Unexpected {what} response format: {e} - {data}")
+
+    @staticmethod
+    def _sse_event(line: str, parse: Callable[[Any], Optional[str]]) -> Tuple[bool, Optional[str]]:
+        """(fin du flux, texte) pour une ligne SSE ; seules les lignes `data:` portent un événement."""
+        if not line or not line.startswith("data:"):
+            return False, None
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return True, None
+        try:
+            return False, parse(json.loads(data))
+        except ValueError as e:
+            raise LLMError(f"Malformed SSE event: {e} - {data[:200]}")
 
     # ---------- Public API ----------
 
@@ -221,46 +272,59 @@ class LLMClient:
         """
         Build an LLM request from system prompt and history and return assistant text.
         """
-        # Backends type chat completions (messages[])
-        if self.backend in ("fastchat", "openai"):
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            for msg in history:
-                messages.append({"role": msg["role"], "content": msg["content"]})
-            
-            # --- DEBUG 1: CE QUE NOUS ENVOYONS ---
-            print(f"\n[LLM DEBUG] Prompt envoyé au backend {self.backend}:")
-            for m in messages:
-                print(f"  {m['role'].upper()}: {m['content'][:100]}...") # Tronqué pour lisibilité
-            
-            try:
-                # Appel effectif
-                response_text = self._DEBUG_call_chat_completions(messages)
-                
-                # --- DEBUG 2: CE QUE NOUS RECEVONS ---
-                print(f"[LLM DEBUG] Réponse brute reçue: '{response_text}'")
-                
-                return response_text
-            except Exception as e:
-                print(f"[LLM ERROR] Crash pendant l'appel LLM: {str(e)}")
-                raise
+        url, params, payload, parse, what = self._request(system_prompt, history, stream=False)
+        start = time.perf_counter()
+        try:
+            r = self.transport.post(url, params=params, json=payload, headers=self.headers)
+        except (httpx.HTTPError, TransportSaturated) as e:
+            raise LLMError(f"{what} call failed: {e!r}")
+        self._log(what, r.status_code, start)
+        return self._decode(r, parse, what)
 
-        # Backend TGI (prompt concaténé)
-        elif self.backend == "hf_tgi":
-            parts = []
-            if system_prompt:
-                parts.append("System: " + system_prompt.strip())
-            for msg in history:
-                role = msg["role"].capitalize()
-                parts.append(f"{role}: {msg['content'].strip()}")
-            parts.append("Assistant:")
-            prompt = "\n".join(parts)
-            return self._call_hf_tgi(prompt)
+    async def agenerate_chat(self, system_prompt: str, history: List[Dict[str, str]]) -> str:
+        """Same as generate_chat, awaited on the event loop (no thread held during the generation)."""
+        url, params, payload, parse, what = self._request(system_prompt, history, stream=False)
+        start = time.perf_counter()
+        try:
+            r = await self.transport.apost(url, params=params, json=payload, headers=self.headers)
+        except (httpx.HTTPError, TransportSaturated) as e:
+            raise LLMError(f"{what} call failed: {e!r}")
+        self._log(what, r.status_code, start)
+        return self._decode(r, parse, what)
 
-        # Backend Gemini (REST)
-        elif self.backend == "gemini":
-            return self._call_gemini(system_prompt, history)
+    def generate_chat_stream(self, system_prompt: str, history: List[Dict[str, str]]) -> Iterator[str]:
+        """
+        Same request as generate_chat, but yields text deltas as the backend produces them.
+        Raises LLMError (possibly after some deltas) on transport or backend errors.
+        """
+        url, params, payload, parse, what = self._request(system_prompt, history, stream=True)
+        try:
+            with self.transport.stream(url, params=params, json=payload, headers=self.headers) as r:
+                if r.status_code != 200:
+                    r.read()
+                    raise LLMError(f"{what} stream failed: {r.status_code} {r.text}")
+                for line in r.iter_lines():
+                    done, text = self._sse_event(line, parse)
+                    if done:
+                        return
+                    if text:
+                        yield text
+        except (httpx.HTTPError, TransportSaturated) as e:  # connexion coupée en cours de génération
+            raise LLMError(f"{what} stream interrupted: {e!r}")
 
-        else:
-            raise LLMError(f"Unsupported backend: {self.backend}")
\ No newline at end of file
+    async def agenerate_chat_stream(self, system_prompt: str, history: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """asyncio version of generate_chat_stream."""
+        url, params, payload, parse, what = self._request(system_prompt, history, stream=True)
+        try:
+            async with self.transport.astream(url, params=params, json=payload, headers=self.headers) as r:
+                if r.status_code != 200:
+                    await r.aread()
+                    raise LLMError(f"{what} stream failed: {r.status_code} {r.text}")
+                async for line in r.aiter_lines():
+                    done, text = self._sse_event(line, parse)
+                    if done:
+                        return
+                    if text:
+                        yield text
+        except (httpx.HTTPError, TransportSaturated) as e:
+            raise LLMError(f"{what} stream interrupted: {e!r}")
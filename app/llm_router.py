@@ -0,0 +1,500 @@
+"""
+app/llm_router.py
+Routage des appels LLM sur plusieurs backends (ex. Ollama local, TGI, Gemini) :
+
+ - ordre de priorité = ordre de la liste "backends" de la config LLM ;
+ - requête couverte (hedging) : si le backend principal n'a pas répondu après son p95 de latence
+   (temps total, ou délai avant le premier token pour un flux), la même requête part sur le suivant ;
+   la première réponse gagne, l'autre est annulée ;
+ - disjoncteur par backend : après `failure_threshold` échecs consécutifs il est écarté `reset_seconds`,
+   puis une seule requête d'essai décide de sa réouverture. Si tous sont ouverts, l'appel échoue tout
+   de suite (le dialogue passe aux RULES sans attendre le timeout). Un flux n'est jugé qu'à sa fin : coupé
+   après son premier fragment, il compte comme un échec ;
+ - bascule : un échec fait partir la requête sur le backend suivant.
+
+Configuration (config LLM ; sans "backends", la config actuelle forme l'unique backend) :
+
+    "backends": [
+        {"name": "ollama", "backend": "openai", "endpoint": "http://localhost:11434/v1", "model": "pepper-pro:latest"},
+        {"name": "gemini", "backend": "gemini", "endpoint": "https://generativelanguage.googleapis.com",
+         "model": "gemini-2.5-flash", "timeout": 30}
+    ],
+    "hedging": {"enabled": true, "min_samples": 10, "min_delay_ms": 250, "max_delay_ms": 10000, "default_delay_ms": 3000},
+    "circuit_breaker": {"failure_threshold": 3, "reset_seconds": 30}
+
+Santé et latences sont partagées entre rechargements du DialogManager (clé : nom, endpoint, modèle).
+Le flux synchrone (generate_chat_stream) bascule en cas d'échec mais n'est pas couvert : seuls les appels
+asyncio et generate_chat le sont.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.llm import DEFAULT_CONFIG_PATH, LLMClient, LLMError
+
+DEFAULT_HEDGING: Dict[str, Any] = {
+    "enabled": True,
+    "min_samples": 10,
+    "min_delay_ms": 250,
+    "max_delay_ms": 10000,
+    "default_delay_ms": 3000,
+}
+DEFAULT_BREAKER: Dict[str, Any] = {"failure_threshold": 3, "reset_seconds": 30}
+# réglages de la config principale repris par chaque backend qui ne les redéfinit pas
+SHARED_KEYS = ("timeout", "transport")
+LATENCY_WINDOW = 200
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 3, reset_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+        self.opens = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probe_in_flight:
+            self.probe_in_flight = True  # une seule requête d'essai à la fois
+            return True
+        return False
+
+    def success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self.probe_in_flight or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.probe_in_flight:
+                self.opens += 1
+            self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+
+    def release(self) -> None:
+        """Requête annulée (couverture perdue) : ni succès ni échec."""
+        self.probe_in_flight = False
+
+
+class BackendHealth:
+    """Disjoncteur, latences (p95) et compteurs d'un backend."""
+
+    def __init__(self, breaker_cfg: Dict[str, Any]):
+        self._lock = threading.Lock()
+        self.breaker = CircuitBreaker(int(breaker_cfg["failure_threshold"]), float(breaker_cfg["reset_seconds"]))
+        self.latencies: Dict[str, deque] = {"total": deque(maxlen=LATENCY_WINDOW),
+                                            "first_token": deque(maxlen=LATENCY_WINDOW)}
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.skipped = 0
+        self.last_error: Optional[str] = None
+
+    def configure(self, breaker_cfg: Dict[str, Any]) -> None:
+        with self._lock:
+            self.breaker.failure_threshold = int(breaker_cfg["failure_threshold"])
+            self.breaker.reset_seconds = float(breaker_cfg["reset_seconds"])
+
+    def allow(self) -> bool:
+        with self._lock:
+            allowed = self.breaker.allow()
+            self.skipped += int(not allowed)
+            return allowed
+
+    def start(self, hedge: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            self.hedges += int(hedge)
+
+    def success(self, kind: str, latency_s: float, settle: bool = True) -> None:
+        """Latence mesurée ; `settle=False` pour un premier fragment : le flux n'est jugé qu'à sa fin (settle)."""
+        with self._lock:
+            self.latencies[kind].append(latency_s)
+            if settle:
+                self._settle()
+
+    def settle(self) -> None:
+        with self._lock:
+            self._settle()
+
+    def _settle(self) -> None:
+        self.successes += 1
+        self.breaker.success()
+
+    def won(self, hedge: bool) -> None:
+        with self._lock:
+            self.hedge_wins += int(hedge)
+
+    def failure(self, error: Exception) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)[:200]
+            self.breaker.failure()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled += 1
+            self.breaker.release()
+
+    def hedge_delay(self, kind: str, cfg: Dict[str, Any]) -> float:
+        """Délai avant couverture : p95 observé, borné ; valeur par défaut tant que l'échantillon est maigre."""
+        with self._lock:
+            samples = list(self.latencies[kind])
+        if len(samples) < cfg["min_samples"]:
+            return cfg["default_delay_ms"] / 1000.0
+        return min(max(percentile(samples, 0.95), cfg["min_delay_ms"] / 1000.0), cfg["max_delay_ms"] / 1000.0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {
+                "circuit": self.breaker.state,
+                "circuit_opens": self.breaker.opens,
+                "consecutive_failures": self.breaker.failures,
+                "requests": self.requests,
+                "successes": self.successes,
+                "failures": self.failures,
+                "cancelled": self.cancelled,
+                "skipped_open": self.skipped,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "last_error": self.last_error,
+            }
+            for kind, values in self.latencies.items():
+                if values:
+                    out[f"{kind}_ms_p50"] = round(percentile(list(values), 0.5) * 1000.0, 1)
+                    out[f"{kind}_ms_p95"] = round(percentile(list(values), 0.95) * 1000.0, 1)
+            return out
+
+
+class RouterStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"calls": 0, "hedged": 0, "failovers": 0, "all_failed": 0, "all_open": 0}
+
+    def add(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counts[name] += n
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+
+_health: Dict[Tuple[str, str, str], BackendHealth] = {}
+_health_lock = threading.Lock()
+router_counts = RouterStats()
+
+
+def get_health(key: Tuple[str, str, str], breaker_cfg: Dict[str, Any]) -> BackendHealth:
+    with _health_lock:
+        health = _health.get(key)
+        if health is None:
+            health = _health[key] = BackendHealth(breaker_cfg)
+        else:
+            health.configure(breaker_cfg)
+        return health
+
+
+def router_stats() -> Dict[str, Any]:
+    with _health_lock:
+        backends = {key[0]: health.stats() for key, health in _health.items()}
+    return dict(router_counts.stats(), backends=backends)
+
+
+class Member:
+    def __init__(self, name: str, client: LLMClient, health: BackendHealth):
+        self.name = name
+        self.client = client
+        self.health = health
+
+
+class LLMRouter:
+    """Même interface que LLMClient (generate_chat, agenerate_chat, flux), sur plusieurs backends."""
+
+    def __init__(self, members: List[Member], hedging: Dict[str, Any] = None):
+        self.members = members
+        self.hedging = {**DEFAULT_HEDGING, **(hedging or {})}
+        # appels couverts en mode synchrone : le perdant finit en arrière-plan (son issue reste comptée
+        # par _timed dans son disjoncteur)
+        self._executor = ThreadPoolExecutor(max_workers=max(2, 2 * len(members)), thread_name_prefix="llm-hedge")
+
+    @classmethod
+    def from_config(cls, config_path: str = DEFAULT_CONFIG_PATH) -> "LLMRouter":
+        with open(config_path, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+        breaker_cfg = {**DEFAULT_BREAKER, **(cfg.get("circuit_breaker") or {})}
+        specs = cfg.get("backends") or [cfg]
+        members = []
+        for spec in specs:
+            spec = dict({k: cfg[k] for k in SHARED_KEYS if k in cfg}, **spec)
+            client = LLMClient(cfg=spec)
+            name = spec.get("name") or client.backend
+            members.append(Member(name, client, get_health((name, client.endpoint, client.model), breaker_cfg)))
+        return cls(members, cfg.get("hedging"))
+
+    @property
+    def backend(self) -> str:
+        return self.members[0].client.backend
+
+    def close(self) -> None:
+        """Appelé par le registre quand un rechargement remplace le DialogManager : libère les threads de
+        couverture (les appels en cours finissent, ceux qui arrivent encore partent sans couverture)."""
+        self._executor.shutdown(wait=False)
+
+    def _submit(self, member: Member, call: Callable[[LLMClient], Any], kind: str) -> Future:
+        try:
+            return self._executor.submit(self._timed, member, call, kind)
+        except RuntimeError:
+            # routeur fermé par un rechargement pendant le tour : appel dans le thread courant
+            future: Future = Future()
+            try:
+                future.set_result(self._timed(member, call, kind))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+    def _next_member(self, cursor: int) -> Tuple[int, Optional[Member]]:
+        """Premier backend admis par son disjoncteur à partir de `cursor`. Le disjoncteur n'est consulté
+        qu'au moment d'envoyer la requête : un backend en essai (half_open) ne donne son unique requête
+        d'essai qu'à un appel qui part vraiment."""
+        for i in range(cursor, len(self.members)):
+            if self.members[i].health.allow():
+                return i + 1, self.members[i]
+        return len(self.members), None
+
+    def _all_open(self) -> LLMError:
+        router_counts.add("all_open")
+        return LLMError("Tous les backends LLM sont écartés (disjoncteurs ouverts): "
+                        + ", ".join(m.name for m in self.members))
+
+    def _hedge_delay(self, pending: Dict[Any, Tuple[Member, bool]], kind: str, has_next: bool) -> Optional[float]:
+        """Une seule requête en vol et un backend en réserve : couverture après le p95 de son backend."""
+        if not (has_next and self.hedging["enabled"] and len(pending) == 1):
+            return None
+        (member, _), = pending.values()
+        return member.health.hedge_delay(kind, self.hedging)
+
+    @staticmethod
+    def _all_failed(errors: List[str]) -> LLMError:
+        router_counts.add("all_failed")
+        return LLMError("Tous les backends LLM ont échoué: " + " | ".join(errors))
+
+    # ---------- synchrone ----------
+
+    def _timed(self, member: Member, call: Callable[[LLMClient], Any], kind: str) -> Any:
+        start = time.perf_counter()
+        try:
+            result = call(member.client)
+        except Exception as e:
+            # toute issue est comptée, sinon une requête d'essai (half_open) resterait en vol
+            member.health.failure(e)
+            raise
+        member.health.success(kind, time.perf_counter() - start)
+        return result
+
+    def _hedged(self, call: Callable[[LLMClient], Any], kind: str = "total") -> Any:
+        router_counts.add("calls")
+        pending: Dict[Future, Tuple[Member, bool]] = {}
+        errors: List[str] = []
+        cursor = 0
+
+        def launch(hedge: bool) -> bool:
+            nonlocal cursor
+            cursor, member = self._next_member(cursor)
+            if member is None:
+                return False
+            member.health.start(hedge)
+            pending[self._submit(member, call, kind)] = (member, hedge)
+            return True
+
+        if not launch(False):
+            raise self._all_open()
+        while pending:
+            delay = self._hedge_delay(pending, kind, cursor < len(self.members))
+            done, _ = wait(list(pending), timeout=delay, return_when=FIRST_COMPLETED)
+            if not done:
+                # la requête en cours dépasse le p95 de son backend : même requête sur le suivant
+                if launch(True):
+                    router_counts.add("hedged")
+                continue
+            for future in done:
+                member, hedge = pending.pop(future)
+                try:
+                    result = future.result()
+                except LLMError as e:
+                    errors.append(f"{member.name}: {e}")
+                    continue
+                member.health.won(hedge)
+                return result
+            if not pending and launch(False):
+                router_counts.add("failovers")
+        raise self._all_failed(errors)
+
+    def generate_chat(self, system_prompt: str, history: List[Dict[str, str]]) -> str:
+        return self._hedged(lambda client: client.generate_chat(system_prompt, history))
+
+    def generate_chat_stream(self, system_prompt: str, history: List[Dict[str, str]]) -> Iterator[str]:
+        """Bascule sur le backend suivant si le flux échoue avant son premier fragment."""
+        router_counts.add("calls")
+        errors: List[str] = []
+        cursor = 0
+        while True:
+            cursor, member = self._next_member(cursor)
+            if member is None:
+                break
+            if errors:
+                router_counts.add("failovers")
+            member.health.start(False)
+            start = time.perf_counter()
+            started = False
+            try:
+                for delta in member.client.generate_chat_stream(system_prompt, history):
+                    if not started:
+                        started = True
+                        member.health.success("first_token", time.perf_counter() - start, settle=False)
+                    yield delta
+            except LLMError as e:
+                # compté même après le premier fragment : un backend qui coupe ses flux finit écarté
+                member.health.failure(e)
+                if started:
+                    raise  # déjà en partie transmis : pas de reprise sur un autre backend
+                errors.append(f"{member.name}: {e}")
+                continue
+            except BaseException:
+                # flux refermé par l'appelant (GeneratorExit) ou interrompu : ni succès ni échec, l'essai est rendu
+                member.health.cancel()
+                raise
+            if not started:
+                member.health.success("first_token", time.perf_counter() - start, settle=False)
+            member.health.settle()
+            return
+        raise self._all_failed(errors) if errors else self._all_open()
+
+    # ---------- asyncio ----------
+
+    async def _atimed(self, member: Member, call: Callable[[LLMClient], Any], kind: str, settle: bool) -> Any:
+        start = time.perf_counter()
+        try:
+            result = await call(member.client)
+        except Exception as e:
+            member.health.failure(e)
+            raise
+        member.health.success(kind, time.perf_counter() - start, settle)
+        return result
+
+    async def _ahedged(self, call: Callable[[LLMClient], Any], kind: str = "total",
+                       discard: Callable[[Any], Any] = None, settle: bool = True) -> Any:
+        """`settle=False` : le gagnant n'est jugé par son disjoncteur qu'ensuite (fin du flux) ; un résultat
+        écarté par `discard` rend son éventuel essai."""
+        router_counts.add("calls")
+        pending: Dict[asyncio.Task, Tuple[Member, bool]] = {}
+        errors: List[str] = []
+        cursor = 0
+
+        def launch(hedge: bool) -> bool:
+            nonlocal cursor
+            cursor, member = self._next_member(cursor)
+            if member is None:
+                return False
+            member.health.start(hedge)
+            task = asyncio.ensure_future(self._atimed(member, call, kind, settle))
+            # annulée (couverture perdue), même avant d'avoir démarré : l'éventuel essai est rendu
+            task.add_done_callback(lambda t, m=member: m.health.cancel() if t.cancelled() else None)
+            pending[task] = (member, hedge)
+            return True
+
+        if not launch(False):
+            raise self._all_open()
+        try:
+            while pending:
+                delay = self._hedge_delay(pending, kind, cursor < len(self.members))
+                done, _ = await asyncio.wait(list(pending), timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # la requête en cours dépasse le p95 de son backend : même requête sur le suivant
+                    if launch(True):
+                        router_counts.add("hedged")
+                    continue
+                winner = None
+                for task in done:
+                    member, hedge = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except LLMError as e:
+                        errors.append(f"{member.name}: {e}")
+                        continue
+                    if winner is None:
+                        winner = (result,)
+                        member.health.won(hedge)
+                    elif discard is not None:
+                        await discard(result)  # deux réponses dans le même tour de boucle
+                        if not settle:
+                            member.health.cancel()
+                if winner is not None:
+                    return winner[0]
+                if not pending and launch(False):
+                    router_counts.add("failovers")
+            raise self._all_failed(errors)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def agenerate_chat(self, system_prompt: str, history: List[Dict[str, str]]) -> str:
+        return await self._ahedged(lambda client: client.agenerate_chat(system_prompt, history))
+
+    async def agenerate_chat_stream(self, system_prompt: str, history: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Couverture sur le premier fragment : le flux qui parle le premier est gardé, l'autre est fermé."""
+
+        async def first_delta(client: LLMClient) -> Tuple[LLMClient, AsyncIterator[str], Optional[str]]:
+            stream = client.agenerate_chat_stream(system_prompt, history)
+            try:
+                return client, stream, await stream.__anext__()
+            except StopAsyncIteration:
+                return client, stream, None
+            except BaseException:
+                await stream.aclose()
+                raise
+
+        async def close(opened: Tuple[LLMClient, AsyncIterator[str], Optional[str]]) -> None:
+            await opened[1].aclose()
+
+        client, stream, first = await self._ahedged(first_delta, kind="first_token", discard=close, settle=False)
+        member = next(m for m in self.members if m.client is client)
+        try:
+            if first is not None:
+                yield first
+                async for delta in stream:
+                    yield delta
+        except LLMError as e:
+            # coupé après le premier fragment : compté, un backend qui coupe ses flux finit écarté
+            member.health.failure(e)
+            raise
+        except BaseException:
+            member.health.cancel()  # flux refermé par l'appelant : ni succès ni échec
+            raise
+        else:
+            member.health.settle()
+        finally:
+            await stream.aclose()
@@ -0,0 +1,221 @@
+"""
+app/llm_transport.py
+Transport HTTP des backends LLM : un pool de connexions httpx par backend (keep-alive, HTTP/2 si le
+paquet `h2` est installé), partagé par toutes les instances de LLMClient du processus — un rechargement
+du DialogManager ne rouvre ni connexion ni session TLS.
+
+Chaque transport borne le nombre d'appels simultanés vers son backend (`max_concurrency`, compté à part
+pour les appels synchrones et pour ceux de la boucle asyncio) : au-delà, l'appel attend une place au plus
+`pool_timeout` secondes puis échoue en LLMError, au lieu d'empiler des générations que le backend
+servirait de toute façon en série (Ollama sur un seul GPU).
+
+Configuration dans la config LLM (clé "transport", toutes optionnelles) :
+
+    "transport": {"max_concurrency": 4, "max_keepalive": 8, "keepalive_expiry": 60,
+                  "connect_timeout": 5, "pool_timeout": 10, "http2": true}
+
+`timeout` (clé existante) reste le délai de lecture d'une réponse.
+"""
+import asyncio
+import importlib.util
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "max_concurrency": 4,
+    "max_keepalive": 8,
+    "keepalive_expiry": 60,
+    "connect_timeout": 5,
+    "pool_timeout": 10,
+    "http2": True,
+}
+
+
+class TransportSaturated(Exception):
+    """Plus de place pour un appel vers ce backend avant `pool_timeout`."""
+
+
+class LLMTransport:
+    def __init__(self, name: str, timeout: float, cfg: Dict[str, Any] = None):
+        cfg = {**DEFAULT_CONFIG, **(cfg or {})}
+        self.name = name
+        self.max_concurrency = int(cfg["max_concurrency"])
+        self.pool_timeout = float(cfg["pool_timeout"])
+        self.http2 = bool(cfg["http2"]) and HTTP2_AVAILABLE
+        self._timeout = httpx.Timeout(timeout, connect=float(cfg["connect_timeout"]), pool=self.pool_timeout)
+        self._limits = httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=int(cfg["max_keepalive"]),
+                                    keepalive_expiry=float(cfg["keepalive_expiry"]))
+        self._client = httpx.Client(timeout=self._timeout, limits=self._limits, http2=self.http2)
+        # un AsyncClient et un sémaphore par boucle asyncio (ils ne se partagent pas entre boucles)
+        self._async: Dict[int, Tuple[httpx.AsyncClient, asyncio.Semaphore]] = {}
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.saturated = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.wait_ms_total = 0.0
+        self.http_versions: Dict[str, int] = {}
+
+    # ---------- comptage ----------
+
+    def _enter(self, wait_ms: float) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.wait_ms_total += wait_ms
+
+    def _leave(self, response: Optional[httpx.Response], failed: bool) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.errors += int(failed)
+            if response is not None:
+                self.http_versions[response.http_version] = self.http_versions.get(response.http_version, 0) + 1
+
+    def _saturated(self) -> TransportSaturated:
+        with self._lock:
+            self.saturated += 1
+        return TransportSaturated(f"{self.name}: {self.max_concurrency} appels en cours, pas de place "
+                                  f"après {self.pool_timeout:.0f} s")
+
+    # ---------- synchrone (threads du serveur) ----------
+
+    @contextmanager
+    def _slot(self):
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            raise self._saturated()
+        try:
+            self._enter((time.perf_counter() - start) * 1000.0)
+            yield
+        finally:
+            self._slots.release()
+
+    def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        with self._slot():
+            response = None
+            try:
+                response = self._client.post(url, **kwargs)
+                return response
+            finally:
+                self._leave(response, failed=response is None or response.status_code >= 500)
+
+    @contextmanager
+    def stream(self, url: str, **kwargs: Any):
+        with self._slot():
+            response = None
+            try:
+                with self._client.stream("POST", url, **kwargs) as response:
+                    yield response
+            finally:
+                self._leave(response, failed=response is None or response.status_code >= 500)
+
+    # ---------- asynchrone (endpoints async, sans thread bloqué pendant la génération) ----------
+
+    def _async_client(self) -> Tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        loop_id = id(asyncio.get_running_loop())
+        with self._lock:
+            entry = self._async.get(loop_id)
+            if entry is None:
+                entry = (httpx.AsyncClient(timeout=self._timeout, limits=self._limits, http2=self.http2),
+                         asyncio.Semaphore(self.max_concurrency))
+                self._async[loop_id] = entry
+            return entry
+
+    @asynccontextmanager
+    async def _aslot(self):
+        client, semaphore = self._async_client()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.pool_timeout)
+        except asyncio.TimeoutError:
+            raise self._saturated()
+        try:
+            self._enter((time.perf_counter() - start) * 1000.0)
+            yield client
+        finally:
+            semaphore.release()
+
+    async def apost(self, url: str, **kwargs: Any) -> httpx.Response:
+        async with self._aslot() as client:
+            response = None
+            try:
+                response = await client.post(url, **kwargs)
+                return response
+            finally:
+                self._leave(response, failed=response is None or response.status_code >= 500)
+
+    @asynccontextmanager
+    async def astream(self, url: str, **kwargs: Any):
+        async with self._aslot() as client:
+            response = None
+            try:
+                async with client.stream("POST", url, **kwargs) as response:
+                    yield response
+            finally:
+                self._leave(response, failed=response is None or response.status_code >= 500)
+
+    # ---------- cycle de vie ----------
+
+    def close(self) -> None:
+        self._client.close()
+        with self._lock:
+            clients, self._async = list(self._async.values()), {}
+        for client, _ in clients:
+            try:
+                asyncio.get_running_loop().create_task(client.aclose())
+            except RuntimeError:  # pas de boucle en cours (arrêt) : les sockets partent avec le processus
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "saturated": self.saturated,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "max_concurrency": self.max_concurrency,
+                "slot_wait_ms_mean": round(self.wait_ms_total / self.requests, 3) if self.requests else 0.0,
+                "http2": self.http2,
+                "http_versions": dict(self.http_versions),
+            }
+
+
+# (backend, endpoint) → (réglages, transport)
+_transports: Dict[Tuple[str, str], Tuple[Tuple, LLMTransport]] = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(name: str, endpoint: str, timeout: float, cfg: Dict[str, Any] = None) -> LLMTransport:
+    """Transport partagé pour (backend, endpoint) ; recréé seulement si ses réglages changent.
+    L'ancien n'est pas fermé : les requêtes en cours de l'ancien DialogManager y finissent."""
+    key = (name, endpoint.rstrip("/"))
+    settings = (timeout, tuple(sorted((cfg or {}).items())))
+    with _transports_lock:
+        entry = _transports.get(key)
+        if entry is None or entry[0] != settings:
+            entry = _transports[key] = (settings, LLMTransport(" ".join(key), timeout, cfg))
+        return entry[1]
+
+
+def close_transports() -> None:
+    with _transports_lock:
+        transports = [transport for _, transport in _transports.values()]
+        _transports.clear()
+    for transport in transports:
+        transport.close()
+
+
+def transport_stats() -> Dict[str, Any]:
+    with _transports_lock:
+        return {transport.name: transport.stats() for _, transport in _transports.values()}
@@ -1,13 +1,32 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Header, Query
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import uvicorn
 import shutil
 import os
+import asyncio
+import json
+import time
 
 from app.nlu import NLU
+from app.nlu_engines import INTENTS_JSON_PATH, clear_shared_models, model_meta_paths
+from app.nlu_train import NLU_CONFIG_PATH, INTENT_PATTERNS_PATH, load_nlu_config
+from app.DB_access import close_client, pool_stats
+from app.catalog import catalog
+from app.availability import OPENING_HOURS, SLOT_MINUTES, availability
+from app.booking_schema import SlotTaken, resolve_date
+from app.tools import parse_heure_to_minutes
 from app.dialog_manager import DialogManager
-from app.sessions import SessionStore
+from app.dialog_routing import routing_stats
+from app.response_cache import response_cache
+from app.history import history_stats
+from app.streaming import ReplyStream, stream_stats
+from app.llm_router import router_stats
+from app.llm_transport import close_transports, transport_stats
+from app.registry import ComponentRegistry
+from app.repositories import create_session_store
 from app.speech import ASRModule
 
 from app.face import verify_endpoint, VerifyResponse
@@ -16,10 +35,46 @@ from app.navigation import InstructionGenerator
 
 app = FastAPI(title="Serveur de dialogue - Robot d'accueil")
 
-nlu = NLU()
-sessions = SessionStore()
-dialog = DialogManager(sessions)
-asr  = ASRModule(model_size="medium")
+CONFIGS_DIR = os.path.join(os.path.dirname(__file__), "..", "configs")
+ASR_CONFIG_PATH = os.path.join(CONFIGS_DIR, "asr_config.json")
+LLM_CONFIG_PATH = os.path.join(CONFIGS_DIR, "llm_openai_config.json")
+
+
+def build_nlu():
+    clear_shared_models()  # relit intent_model / entity_model et les exemples de intents.json
+    return NLU()
+
+
+def build_asr():
+    try:
+        with open(ASR_CONFIG_PATH, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+    except (OSError, ValueError):
+        cfg = {}
+    return ASRModule(**cfg)
+
+
+# store de sessions SESSION_BACKEND (mémoire par défaut), données DATA_BACKEND (app/repositories.py)
+sessions = create_session_store()
+# Catalogue salle / activite en mémoire, tenu à jour par change stream (ou TTL)
+catalog.start()
+# NLU, ASR et dialogue (config LLM) rechargeables à chaud : POST /v1/admin/reload ou modification des fichiers
+registry = ComponentRegistry()
+registry.register("nlu", build_nlu,
+                  watch=[NLU_CONFIG_PATH, INTENT_PATTERNS_PATH, INTENTS_JSON_PATH] + model_meta_paths(load_nlu_config()))
+registry.register("dialog", lambda: DialogManager(sessions, LLM_CONFIG_PATH), watch=[LLM_CONFIG_PATH])
+registry.register("asr", build_asr, watch=[ASR_CONFIG_PATH])
+_watch_seconds = float(os.getenv("RELOAD_WATCH_SECONDS", "2"))
+if _watch_seconds > 0:
+    registry.start_watcher(_watch_seconds)
+
+@app.on_event("shutdown")
+def shutdown():
+    catalog.stop()
+    registry.stop()
+    close_client()
+    close_transports()
+
 class ParseRequest(BaseModel):
     text: str
     lang: Optional[str] = "fr"
@@ -29,6 +84,13 @@ class ParseResponse(BaseModel):
     intent: str
     confidence: float
     entities: Dict[str, Any]
+    versions: Dict[str, Optional[str]] = {}
+
+class ParseBatchRequest(BaseModel):
+    texts: List[str]
+    lang: Optional[str] = "fr"
+    batch_size: int = 64
+    n_process: int = 1
 
 class RespondRequest(BaseModel):
     text: str
@@ -39,6 +101,11 @@ class RespondResponse(BaseModel):
     text: str
     actions: Dict[str, Any]
     session_id: str
+    versions: Dict[str, Optional[str]] = {}
+
+class ReloadRequest(BaseModel):
+    components: Optional[List[str]] = None  # tous si absent
+    wait: bool = False
 
 class Creneau(BaseModel):
     jour: str
@@ -71,12 +138,14 @@ async def transcribe_audio(file: UploadFile = File(...)):
             print("[WARNING] Fichier reçu extrêmement petit, risque de corruption.")
 
         #Transcription via Faster-Whisper (GPU)
+        asr, asr_version = registry.acquire("asr")
         result = asr.process_audio(temp_path)
 
         if "error" in result:
             print(f"[ERROR] Erreur retournée par asr.process_audio: {result['error']}")
             raise HTTPException(status_code=500, detail=result["error"])
 
+        result["versions"] = {"asr": asr_version}
         return result
 
     except Exception as e:
@@ -96,35 +165,159 @@ def verify(image: UploadFile = File(...)):
 
 @app.post("/v1/parse", response_model=ParseResponse)
 def parse(req: ParseRequest):
+    nlu, nlu_version = registry.acquire("nlu")
     # result = nlu.parse(req.text, req.lang)
     result = nlu.parse(req.text)
-    return ParseResponse(intent=result["intent"], confidence=result["confidence"], entities=result["entities"])
+    return ParseResponse(intent=result["intent"], confidence=result["confidence"], entities=result["entities"],
+                         versions={"nlu": nlu_version})
+@app.post("/v1/parse_batch")
+def parse_batch(req: ParseBatchRequest):
+    """ Parse une liste d'énoncés via nlp.pipe et renvoie du NDJSON (une ligne par énoncé + une ligne de stats) """
+    if req.batch_size < 1 or req.n_process < 1:
+        raise HTTPException(status_code=400, detail="batch_size et n_process doivent être >= 1")
+    nlu, nlu_version = registry.acquire("nlu")
+
+    def generate():
+        start = time.perf_counter()
+        count = 0
+        for i, result in enumerate(nlu.parse_batch(req.texts, batch_size=req.batch_size, n_process=req.n_process)):
+            count += 1
+            yield json.dumps({"index": i, **result}, ensure_ascii=False) + "\n"
+        elapsed = time.perf_counter() - start
+        stats = {
+            "done": True,
+            "count": count,
+            "elapsed_s": round(elapsed, 4),
+            "throughput_per_s": round(count / elapsed, 1) if elapsed > 0 else None,
+            "batch_size": req.batch_size,
+            "n_process": req.n_process,
+            "versions": {"nlu": nlu_version},
+        }
+        yield json.dumps(stats) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
 @app.post("/v1/parse_all_inents", response_model=Dict[str, Any])
 def parse_all_intents(req: ParseRequest):
-    result = nlu.parse_intents_confidences(req.text)
+    result = registry.get("nlu").parse_intents_confidences(req.text)
     return result
 
+async def _dialog_turn(session_id: str, parse_result: Dict[str, Any], dialog: DialogManager,
+                       stream: ReplyStream = None):
+    """ Un tour = une lecture de la session et au plus une écriture (voir SessionTurn), faites dans un thread """
+    async with sessions.turn(session_id) as turn:
+        # "unknown" compris : questions libres (tarifs, équipements...) servies par le cache ou le LLM
+        # la génération LLM est attendue sans occuper de thread du serveur
+        return await dialog.ahandle(session_id, parse_result, turn=turn, stream=stream)
+
 @app.post("/v1/respond", response_model=RespondResponse)
-def respond(req: RespondRequest):
+async def respond(req: RespondRequest):
     # ensure session
     print(f"[DEBUG] Session ID recue du client: {req.session_id}")
-    session_id = req.session_id or sessions.create_session()
+    session_id = req.session_id or await run_in_threadpool(sessions.create_session)
     print(f"[DEBUG] Session ID utilisee: {session_id}")
+    nlu, nlu_version = registry.acquire("nlu")
+    dialog, dialog_version = registry.acquire("dialog")
+    versions = {"nlu": nlu_version, "dialog": dialog_version}
     # parse_result = nlu.parse(req.text, req.lang)
-    parse_result = nlu.parse(req.text)
-
-    # Vérifier si une réservation (slot filling) est en cours
-    session_data = sessions.get(session_id)
-    booking_in_progress = "booking_slots" in session_data
-    if parse_result["intent"] == "unknown" and not booking_in_progress:
-        response_text = "Désolé, je n'ai pas compris votre demande. Pouvez-vous reformuler ?"
-        return RespondResponse(text=response_text, actions={}, session_id=session_id)
-    
+    # spaCy : calcul CPU, hors de la boucle asyncio
+    parse_result = await run_in_threadpool(nlu.parse, req.text)
     try:
-        response_text, actions = dialog.handle(session_id, parse_result)
+        response_text, actions = await _dialog_turn(session_id, parse_result, dialog)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    return RespondResponse(text=response_text, actions=actions, session_id=session_id)
+    return RespondResponse(text=response_text, actions=actions, session_id=session_id, versions=versions)
+
+@app.post("/v1/respond/stream")
+async def respond_stream(req: RespondRequest):
+    """ Comme /v1/respond, en NDJSON : actions, puis une ligne par phrase dès qu'elle est générée, puis "done" """
+    session_id = req.session_id or await run_in_threadpool(sessions.create_session)
+    nlu, nlu_version = registry.acquire("nlu")
+    dialog, dialog_version = registry.acquire("dialog")
+    versions = {"nlu": nlu_version, "dialog": dialog_version}
+    parse_result = await run_in_threadpool(nlu.parse, req.text)
+    events: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue()
+    stream = ReplyStream(events.put_nowait)
+
+    # le tour tourne dans sa propre tâche : les phrases sont envoyées pendant que le LLM génère la suite
+    async def run_turn():
+        try:
+            response_text, actions = await _dialog_turn(session_id, parse_result, dialog, stream)
+            stream.finish(response_text, actions, session_id=session_id, versions=versions)
+        except Exception as e:
+            stream.fail(str(e))
+        finally:
+            events.put_nowait(None)
+
+    turn_task = asyncio.create_task(run_turn())
+
+    async def generate():
+        while True:
+            event = await events.get()
+            if event is None:
+                await turn_task
+                return
+            yield json.dumps(event, ensure_ascii=False, default=str) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.get("/v1/metrics")
+def metrics():
+    """ Compteurs internes (cache NLU, ...) """
+    return {
+        "nlu_cache": registry.get("nlu").cache.stats(),
+        "session_store": sessions.ops.stats(),
+        "catalog": catalog.stats(),
+        "availability": availability.stats(),
+        "mongo_pool": pool_stats(),
+        "dialog_routing": routing_stats.stats(),
+        "llm_response_cache": response_cache.stats(),
+        "llm_history": history_stats.stats(),
+        "respond_stream": stream_stats.stats(),
+        "llm_transport": transport_stats(),
+        "llm_backends": router_stats(),
+        "components": registry.stats(),
+    }
+
+def _check_admin_token(token: Optional[str]) -> None:
+    expected = os.getenv("ADMIN_TOKEN")
+    if expected and token != expected:
+        raise HTTPException(status_code=403, detail="jeton d'administration invalide")
+
+@app.post("/v1/admin/reload")
+def admin_reload(req: ReloadRequest, x_admin_token: Optional[str] = Header(None)):
+    """ Reconstruit les composants en arrière-plan ; les requêtes en cours finissent sur l'ancienne version """
+    _check_admin_token(x_admin_token)
+    known = registry.versions()
+    names = req.components or list(known)
+    unknown = [name for name in names if name not in known]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"composants inconnus: {', '.join(unknown)} (choix: {', '.join(known)})")
+    scheduled = {name: registry.reload(name, wait=req.wait) for name in names}
+    return {"scheduled": scheduled, "versions": registry.versions()}
+
+@app.get("/v1/admin/versions")
+def admin_versions(x_admin_token: Optional[str] = Header(None)):
+    _check_admin_token(x_admin_token)
+    return registry.stats()
+
+@app.get("/v1/availability")
+def availability_endpoint(activite: str, jour: str, heure: Optional[str] = None,
+                          duree: int = Query(60, ge=SLOT_MINUTES, le=OPENING_HOURS[1] - OPENING_HOURS[0]),
+                          limit: int = Query(3, ge=1, le=50)):
+    """ Salles et créneaux libres d'une activité pour un jour ; créneaux les plus proches si `heure` est donnée """
+    snapshot = catalog.snapshot()
+    salles = snapshot.salles_for_activity(activite)
+    if not salles:
+        raise HTTPException(status_code=404, detail=f"aucune salle pour l'activité '{activite}'")
+    if resolve_date(jour) is None:
+        raise HTTPException(status_code=422, detail=f"jour invalide: '{jour}'")
+    minutes = parse_heure_to_minutes(heure) if heure else None
+    if heure and minutes is None:
+        raise HTTPException(status_code=422, detail=f"heure invalide: '{heure}'")
+    result = availability.search(salles, jour, minutes, duree, limit)
+    result["activite"] = activite
+    return result
 
 @app.get("/v1/session/{session_id}/reset")
 def reset_session(session_id: str):
@@ -136,8 +329,12 @@ def reset_session(session_id: str):
 @app.post("/v1/reserver_salle")
 def reserver_salle_endpoint(req: ReservationRequest):
     try:
-        reservation_id = reserver_salle(req.model_dump())
+        reservation_id = reserver_salle(req.dict())
         return {"status": "success", "reservation_id": str(reservation_id)}
+    except SlotTaken as e:
+        raise HTTPException(status_code=409, detail=f"créneau déjà réservé: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -65,7 +65,15 @@ class IndoorMap:
 
     def resolve_destination(self, destination_key):
         """Résout une clé normalisée en nom de nœud du graphe. Retourne None si inconnu."""
-        return DESTINATION_KEY_TO_NODE.get(destination_key)
+        node = DESTINATION_KEY_TO_NODE.get(destination_key)
+        if node is None and destination_key:
+            # Noms venant du catalogue (gazetteer) : "salle_e" → nœud "Salle E" s'il existe
+            node = self._node_by_key.get(destination_key)
+        return node
+
+    @property
+    def _node_by_key(self):
+        return {n.lower().replace(" ", "_"): n for n in self.graph.nodes}
 
 
 class InstructionGenerator:
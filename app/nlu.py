@@ -1,6 +1,19 @@
-from typing import Dict, Any
+import copy
+import re
+from typing import Dict, Any, Iterable, Iterator
 
-from app.nlu_train import traiter_requete as matcher_parse
+from app import nlu_train
+from app.cache import LRUCache
+from app.fuzzy import WAKE_WORDS, FuzzyIndex
+from app.navigation import DESTINATION_KEY_TO_NODE
+from app.nlu_engines import create_engine
+from app.nlu_train import load_nlu_config
+from app.temporal import extract_temporal
+
+_TRAILING_PUNCT = re.compile(r"[\s?!.,;:…]+$")
+
+# Lieux trop vagues pour guider : l'index approché peut proposer mieux ("salle bé" → salle_b)
+_GENERIC_LOCATIONS = {"salle", "terrain", "court"}
 
 
 class NLU:
@@ -16,9 +29,77 @@ class NLU:
         "inconnu": "unknown",
     }
 
-    def __init__(self, **kwargs):
-        # Pas de modèle à charger, tout vient de nlu_train.py
-        pass
+    _DIRECT_DESTINATIONS = {
+        "salle a": "salle_a",
+        "salle b": "salle_b",
+        "salle c": "salle_c",
+        "salle d": "salle_d",
+        "salle natation": "natation",
+        "salle de natation": "natation",
+    }
+
+    def __init__(self, engine: str = None, cache_size: int = None, **kwargs):
+        cfg = load_nlu_config()
+        cfg.update(kwargs)
+        # Moteur NLU (voir app/nlu_engines.py) : "regex" par défaut
+        engine = engine or cfg.get("engine", "regex")
+        try:
+            self.engine = create_engine(engine, cfg)
+        except Exception as e:
+            if engine == "regex":
+                raise
+            print(f"[NLU] Moteur '{engine}' indisponible ({e}), repli sur 'regex'")
+            self.engine = create_engine("regex", cfg)
+        if cache_size is None:
+            cache_size = cfg.get("cache_size", 1024)
+        # LRU des résultats de parse, clé = texte normalisé
+        self.cache = LRUCache(maxsize=cache_size)
+        # Gazetteer du catalogue : reconstruit en arrière-plan, invalide le cache à chaque changement
+        # Index approché (lieux, activités, mots de réveil) pour les entités mal transcrites
+        self.fuzzy = self._build_fuzzy_index()
+        refresh = cfg.get("gazetteer_refresh_seconds", 300)
+        if refresh and refresh > 0:
+            nlu_train.gazetteer.on_rebuild.append(self._on_catalog_change)
+            nlu_train.gazetteer.start(refresh)
+
+    def _build_fuzzy_index(self) -> FuzzyIndex:
+        index = FuzzyIndex()
+        for key in DESTINATION_KEY_TO_NODE:
+            index.add(key, "location", key)
+        for surface, key in self._DIRECT_DESTINATIONS.items():
+            index.add(surface, "location", key)
+        for pattern in nlu_train.sports_patterns:
+            for word in pattern[0]["LOWER"]["IN"]:
+                index.add(word, "activity", word)
+        for label, canonical, surfaces in nlu_train.gazetteer.entries():
+            kind = "activity" if label == "SPORT" else "location"
+            value = canonical if kind == "activity" else self._normalize_destination_key(canonical)
+            for surface in surfaces:
+                index.add(surface, kind, value)
+        for word in WAKE_WORDS:
+            index.add(word, "wake_word", word)
+        return index
+
+    def close(self) -> None:
+        """Détache l'instance du gazetteer partagé (remplacée lors d'un rechargement à chaud)."""
+        try:
+            nlu_train.gazetteer.on_rebuild.remove(self._on_catalog_change)
+        except ValueError:
+            pass
+
+    def _on_catalog_change(self) -> None:
+        self.fuzzy = self._build_fuzzy_index()  # remplacement atomique de la référence
+        self.clear_cache()
+
+    @staticmethod
+    def _normalize_text(text: str) -> str:
+        """Clé de cache : minuscules, espaces compactés, ponctuation finale retirée."""
+        s = " ".join((text or "").lower().split())
+        return _TRAILING_PUNCT.sub("", s)
+
+    def clear_cache(self) -> None:
+        """À appeler quand les patterns ou les modèles sont rechargés."""
+        self.cache.clear()
 
     def _normalize_destination_key(self, raw: str) -> str:
         """Normalize a destination string to a key usable by the tablet map."""
@@ -30,14 +111,7 @@ class NLU:
         s = s.lower().strip()
         s = " ".join(s.split())
 
-        direct = {
-            "salle a": "salle_a",
-            "salle b": "salle_b",
-            "salle c": "salle_c",
-            "salle d": "salle_d",
-            "salle natation": "natation",
-            "salle de natation": "natation",
-        }
+        direct = self._DIRECT_DESTINATIONS
         if s in direct:
             return direct[s]
 
@@ -45,13 +119,60 @@ class NLU:
         return s
 
     def parse(self, text: str, lang: str = "fr") -> Dict[str, Any]:
-        text_in = (text or "").strip().lower()
+        text_in = self._normalize_text(text)
         if not text_in:
             return {"intent": "unknown", "confidence": 0.0, "entities": {}, "raw_text": text}
 
-        # Tout passe par nlu_train.py
-        result = matcher_parse(text_in)
-
+        cached = self.cache.get(text_in)
+        if cached is None:
+            cached = self._format_result(self.engine.parse(text_in), None)
+            self._add_fuzzy_entities(cached["entities"], text_in)
+            self.cache.put(text_in, cached)
+        # copie : le DialogManager ne doit pas pouvoir modifier l'entrée du cache
+        result = copy.deepcopy(cached)
+        result["raw_text"] = text
+        # Date/heure résolues à chaque appel ("demain" dépend du jour courant, hors cache)
+        self._add_temporal_slots(result["entities"], text_in)
+        return result
+
+    def _add_fuzzy_entities(self, entities: Dict[str, Any], text: str) -> None:
+        """
+        Complète les entités absentes (ou trop vagues) par l'index approché.
+        Chaque correspondance inexacte est listée dans entities["fuzzy"] avec sa distance,
+        pour que le dialogue demande confirmation.
+        """
+        locations = entities.get("location", [])
+        need_location = not locations or all(loc in _GENERIC_LOCATIONS for loc in locations)
+        need_activity = not entities.get("activity")
+        kinds = ["wake_word"] + (["location"] if need_location else []) + (["activity"] if need_activity else [])
+        fuzzy = []
+        for found in self.fuzzy.find_in_text(text, kinds):
+            key = found["kind"]
+            entities[key] = [found["match"]]
+            if found["distance"] > 0:
+                fuzzy.append({k: found[k] for k in ("kind", "input", "match", "distance")})
+        if fuzzy:
+            entities["fuzzy"] = fuzzy
+
+    @staticmethod
+    def _add_temporal_slots(entities: Dict[str, Any], text: str) -> None:
+        """Slots normalisés de app/temporal.py : jour, date (ISO), heure ("HH:MM"), minutes (int)."""
+        for key, value in extract_temporal(text).items():
+            entities[key] = [value]
+
+    def parse_batch(self, texts: Iterable[str], batch_size: int = 64, n_process: int = 1) -> Iterator[Dict[str, Any]]:
+        """Parse plusieurs énoncés avec nlp.pipe ; renvoie les résultats dans l'ordre d'entrée."""
+        texts = list(texts)
+        normalized = (self._normalize_text(t) for t in texts)
+        results = self.engine.parse_batch(normalized, batch_size=batch_size, n_process=n_process)
+        for text, result in zip(texts, results):
+            formatted = self._format_result(result, text)
+            self._add_fuzzy_entities(formatted["entities"], self._normalize_text(text))
+            self._add_temporal_slots(formatted["entities"], self._normalize_text(text))
+            yield formatted
+
+    def _format_result(self, result: Dict[str, Any], text: str) -> Dict[str, Any]:
+        """Convertit la sortie d'un moteur (format nlu_train : intent FR, entites) au format de l'API."""
         # Intent : mapper vers les noms utilisés par le DialogManager
         raw_intent = result.get("intent", "inconnu")
         intent = self._INTENT_MAP.get(raw_intent, raw_intent)
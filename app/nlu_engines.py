@@ -0,0 +1,359 @@
+"""
+app/nlu_engines.py
+Registre des moteurs NLU sélectionnables par configuration (configs/nlu_config.json, clé "engine") :
+ - "regex"   : classifieur à patterns + Matcher de nlu_train.py (historique)
+ - "trained" : modèles spaCy entraînés (textcat de intent_model + NER de entity_model)
+ - "hybrid"  : regex d'abord, textcat en secours, entités du Matcher complétées par le NER
+ - "centroid": similarité cosinus avec les centroïdes d'exemples (vecteurs de fr_core_news_md) ;
+               sert aussi de secours rapide au moteur regex ("centroid_fallback")
+
+Tous les moteurs renvoient le format de nlu_train.traiter_requete :
+    {"intent": str, "confidence": float, "entites": {"sports", "lieux", "temps", "nombres"}}
+Les modèles spaCy sont chargés une seule fois par chemin et partagés entre moteurs.
+"""
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+import spacy
+
+from app import nlu_train
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_INTENT_MODEL = "app/intent_model"
+DEFAULT_ENTITY_MODEL = "app/entity_model"
+INTENTS_JSON_PATH = os.path.join(ROOT_DIR, "configs", "intents.json")
+
+# Labels NER de entity_model → clés d'entités de nlu_train
+_NER_LABEL_TO_KEY = {"ACTIVITY": "sports", "LOCATION": "lieux"}
+
+_models: Dict[str, Any] = {}
+_models_lock = threading.Lock()
+
+
+def load_shared_model(path: str):
+    """Charge un pipeline spaCy depuis `path` (relatif à la racine du dépôt) une seule fois."""
+    full_path = path if os.path.isabs(path) else os.path.join(ROOT_DIR, path)
+    full_path = os.path.normpath(full_path)
+    with _models_lock:
+        model = _models.get(full_path)
+        if model is None:
+            print(f"[NLU] Chargement du modèle partagé {full_path}")
+            model = spacy.load(full_path)
+            _models[full_path] = model
+        return model
+
+
+def model_meta_paths(cfg: Dict[str, Any]) -> List[str]:
+    """meta.json des modèles entraînés de la config (réécrits à chaque packaging : fichiers à surveiller)."""
+    paths = [cfg.get("intent_model_path", DEFAULT_INTENT_MODEL), cfg.get("entity_model_path", DEFAULT_ENTITY_MODEL)]
+    return [os.path.join(p if os.path.isabs(p) else os.path.join(ROOT_DIR, p), "meta.json") for p in paths]
+
+
+def clear_shared_models() -> None:
+    """Oublie les modèles chargés et le classifieur à centroïdes (le prochain usage relira le disque,
+    intents.json compris). Les moteurs déjà construits gardent leurs références jusqu'à leur remplacement."""
+    global _centroid_classifier
+    with _models_lock:
+        _models.clear()
+    with _centroid_lock:
+        _centroid_classifier = None
+
+
+ENGINES: Dict[str, Callable[..., "NLUEngine"]] = {}
+
+
+def register_engine(name: str):
+    """Décorateur : enregistre une classe de moteur sous `name`."""
+    def decorator(cls):
+        cls.name = name
+        ENGINES[name] = cls
+        return cls
+    return decorator
+
+
+def create_engine(name: str, cfg: Dict[str, Any] = None) -> "NLUEngine":
+    if name not in ENGINES:
+        raise ValueError(f"Moteur NLU inconnu: {name} (choix: {', '.join(ENGINES)})")
+    return ENGINES[name](cfg or {})
+
+
+def _empty_entities() -> Dict[str, List[str]]:
+    return {"sports": [], "lieux": [], "temps": [], "nombres": []}
+
+
+class NLUEngine:
+    name = "base"
+
+    def __init__(self, cfg: Dict[str, Any]):
+        self.cfg = cfg
+
+    def parse(self, text: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def parse_batch(self, texts: Iterable[str], batch_size: int = 64, n_process: int = 1) -> Iterator[Dict[str, Any]]:
+        for text in texts:
+            yield self.parse(text)
+
+
+def load_intent_examples(intents_json_path: str = INTENTS_JSON_PATH) -> List[Tuple[str, str]]:
+    """Exemples étiquetés (texte, intent API) de configs/intents.py et configs/intents.json."""
+    from configs.intents import RAW_TRAIN_DATA
+
+    examples = [(text.lower(), label) for text, label in RAW_TRAIN_DATA]
+    try:
+        with open(intents_json_path, "r", encoding="utf-8") as f:
+            intents = json.load(f)
+    except (OSError, ValueError):
+        intents = {}
+    for key, spec in intents.items():
+        # la clé de la salutation est vide dans intents.json : on passe par la description
+        label = key.strip() or _DESCRIPTION_TO_INTENT.get(spec.get("description", ""), "")
+        if not label or label == "unknown":
+            continue
+        for text in spec.get("examples", []):
+            if (text.lower(), label) not in examples:
+                examples.append((text.lower(), label))
+    return examples
+
+
+_DESCRIPTION_TO_INTENT = {"salutation": "greeting"}
+
+
+def load_reject_examples(intents_json_path: str = INTENTS_JSON_PATH) -> List[str]:
+    """Exemples de "unknown" dans configs/intents.json : acquiescements ("merci", "oui") et phrases hors
+    domaine, qu'aucune intention ne doit capter."""
+    try:
+        with open(intents_json_path, "r", encoding="utf-8") as f:
+            intents = json.load(f)
+    except (OSError, ValueError):
+        return []
+    return [text.lower() for text in intents.get("unknown", {}).get("examples", [])]
+
+
+class CentroidClassifier:
+    """
+    Une ligne par intention : moyenne normalisée des embeddings de ses exemples.
+    Le score d'un texte est un seul produit matrice-vecteur (cosinus avec tous les centroïdes),
+    converti en probabilités par un softmax dont la température est calibrée sur les exemples.
+    Les exemples de rejet sont gardés un par un (pas de centroïde) : un texte plus proche de l'un d'eux
+    que du meilleur centroïde, d'au moins `reject_margin` (cosinus), reste "inconnu" ("merci" est aussi
+    proche de "bonjour" que "salut").
+    """
+
+    _TEMPERATURES = np.geomspace(0.005, 1.0, 40)
+
+    def __init__(self, nlp, examples: List[Tuple[str, str]], reject_examples: Iterable[str] = (),
+                 reject_margin: float = 0.15):
+        self.nlp = nlp
+        self.reject_margin = reject_margin
+        self.labels = sorted({label for _, label in examples})
+        label_idx = {label: i for i, label in enumerate(self.labels)}
+        X = np.vstack([self.embed(text) for text, _ in examples])
+        y = np.array([label_idx[label] for _, label in examples])
+        centroids = np.vstack([X[y == i].mean(axis=0) for i in range(len(self.labels))])
+        self.centroids = self._normalize(centroids)
+        self.temperature = self._calibrate(X @ self.centroids.T, y)
+        rejects = [v for v in (self.embed(text) for text in reject_examples) if v.any()]
+        self.rejects = np.vstack(rejects) if rejects else None
+
+    @staticmethod
+    def _normalize(m: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(m, axis=-1, keepdims=True)
+        return m / np.where(norms == 0, 1.0, norms)
+
+    def embed(self, text: str) -> np.ndarray:
+        """Moyenne des vecteurs des mots pleins (tokenizer seul, pas de pipeline)."""
+        doc = self.nlp.make_doc(text)
+        tokens = [t for t in doc if t.has_vector and not t.is_stop and not t.is_punct]
+        if not tokens:
+            tokens = [t for t in doc if t.has_vector]
+        if not tokens:
+            return np.zeros(self.nlp.vocab.vectors_length, dtype="float32")
+        return self._normalize(np.mean([t.vector for t in tokens], axis=0))
+
+    def _softmax(self, sims: np.ndarray, temperature: float) -> np.ndarray:
+        z = sims / temperature
+        z = z - z.max(axis=-1, keepdims=True)
+        e = np.exp(z)
+        return e / e.sum(axis=-1, keepdims=True)
+
+    def _calibrate(self, sims: np.ndarray, y: np.ndarray) -> float:
+        """Température minimisant la log-vraisemblance négative sur les exemples."""
+        best_t, best_nll = 1.0, float("inf")
+        for t in self._TEMPERATURES:
+            p = self._softmax(sims, t)[np.arange(len(y)), y]
+            nll = -np.log(np.clip(p, 1e-12, None)).mean()
+            if nll < best_nll:
+                best_t, best_nll = float(t), nll
+        return best_t
+
+    def scores(self, text: str) -> Dict[str, float]:
+        v = self.embed(text)
+        if not v.any():
+            return {}
+        probs = self._softmax(self.centroids @ v, self.temperature)
+        return {label: float(p) for label, p in zip(self.labels, probs)}
+
+    def classify(self, text: str) -> Dict[str, Any]:
+        v = self.embed(text)
+        if not v.any():
+            return {"intent": "inconnu", "confidence": 0.0, "similarity": 0.0}
+        sims = self.centroids @ v
+        probs = self._softmax(sims, self.temperature)
+        best = int(np.argmax(probs))
+        if self.rejects is not None and float((self.rejects @ v).max()) >= sims[best] + self.reject_margin:
+            return {"intent": "inconnu", "confidence": 0.0, "similarity": float(sims[best])}
+        return {"intent": self.labels[best], "confidence": float(probs[best]), "similarity": float(sims[best])}
+
+
+_centroid_classifier = None
+_centroid_lock = threading.Lock()
+
+
+def get_centroid_classifier() -> CentroidClassifier:
+    """Classifieur partagé, construit au premier usage sur le vocabulaire de nlu_train.nlp."""
+    global _centroid_classifier
+    with _centroid_lock:
+        if _centroid_classifier is None:
+            _centroid_classifier = CentroidClassifier(nlu_train.nlp, load_intent_examples(), load_reject_examples())
+        return _centroid_classifier
+
+
+@register_engine("centroid")
+class CentroidEngine(NLUEngine):
+    """Intention par centroïdes de vecteurs ; entités extraites par le Matcher de nlu_train."""
+
+    def __init__(self, cfg: Dict[str, Any]):
+        super().__init__(cfg)
+        self.classifier = get_centroid_classifier()
+        self.threshold = cfg.get("centroid_threshold", 0.6)
+        # cosinus minimal avec le centroïde retenu : écarte les phrases hors domaine
+        self.min_similarity = cfg.get("centroid_min_similarity", 0.4)
+
+    def apply(self, text: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Remplace l'intention de `result` par celle des centroïdes si assez confiante."""
+        guess = self.classifier.classify(text)
+        if guess["confidence"] >= self.threshold and guess["similarity"] >= self.min_similarity:
+            result = dict(result, intent=guess["intent"], confidence=guess["confidence"])
+        else:
+            result = dict(result, intent="inconnu", confidence=0.0)
+        return result
+
+    def parse(self, text: str) -> Dict[str, Any]:
+        return self.apply(text, nlu_train.traiter_requete(text))
+
+    def parse_batch(self, texts, batch_size=64, n_process=1):
+        texts = list(texts)
+        for text, result in zip(texts, nlu_train.traiter_requetes(texts, batch_size=batch_size, n_process=n_process)):
+            yield self.apply(text, result)
+
+
+@register_engine("regex")
+class RegexEngine(NLUEngine):
+    def __init__(self, cfg: Dict[str, Any]):
+        super().__init__(cfg)
+        # patterns compilés propres à cette instance : un rechargement construit un nouveau moteur
+        # sans modifier celui qu'utilisent les requêtes en cours
+        self.patterns = nlu_train.compile_patterns(
+            nlu_train.load_intent_patterns(cfg.get("intent_patterns_path", nlu_train.INTENT_PATTERNS_PATH))
+        )
+        # secours statistique quand les patterns ne reconnaissent rien
+        self.fallback = CentroidEngine(cfg) if cfg.get("centroid_fallback") else None
+
+    def _with_fallback(self, text: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        if self.fallback is not None and result["intent"] == "inconnu":
+            return self.fallback.apply(text, result)
+        return result
+
+    def parse(self, text: str) -> Dict[str, Any]:
+        return self._with_fallback(text, nlu_train.traiter_requete(text, self.patterns))
+
+    def parse_batch(self, texts, batch_size=64, n_process=1):
+        if self.fallback is None:
+            return nlu_train.traiter_requetes(texts, batch_size=batch_size, n_process=n_process, patterns=self.patterns)
+        texts = list(texts)
+        results = nlu_train.traiter_requetes(texts, batch_size=batch_size, n_process=n_process, patterns=self.patterns)
+        return (self._with_fallback(text, result) for text, result in zip(texts, results))
+
+
+@register_engine("trained")
+class TrainedEngine(NLUEngine):
+    """textcat de intent_model pour l'intention, NER de entity_model pour les entités."""
+
+    def __init__(self, cfg: Dict[str, Any]):
+        super().__init__(cfg)
+        self.intent_nlp = load_shared_model(cfg.get("intent_model_path", DEFAULT_INTENT_MODEL))
+        self.entity_nlp = load_shared_model(cfg.get("entity_model_path", DEFAULT_ENTITY_MODEL))
+        if "textcat" not in self.intent_nlp.pipe_names:
+            raise ValueError("Le modèle d'intentions ne contient pas de composant textcat")
+
+    def classify(self, intent_doc) -> Dict[str, Any]:
+        cats = intent_doc.cats
+        if not cats:
+            return {"intent": "inconnu", "confidence": 0.0}
+        best = max(cats, key=cats.get)
+        return {"intent": best, "confidence": float(cats[best])}
+
+    def extract(self, entity_doc) -> Dict[str, List[str]]:
+        entites = _empty_entities()
+        for ent in entity_doc.ents:
+            key = _NER_LABEL_TO_KEY.get(ent.label_)
+            if key and ent.text not in entites[key]:
+                entites[key].append(ent.text)
+        entites["nombres"] = [token.text for token in entity_doc if token.like_num]
+        return entites
+
+    def parse(self, text: str) -> Dict[str, Any]:
+        result = self.classify(self.intent_nlp(text))
+        result["entites"] = self.extract(self.entity_nlp(text))
+        return result
+
+    def parse_batch(self, texts, batch_size=64, n_process=1):
+        texts = list(texts)
+        intent_docs = self.intent_nlp.pipe(texts, batch_size=batch_size, n_process=n_process)
+        entity_docs = self.entity_nlp.pipe(texts, batch_size=batch_size, n_process=n_process)
+        for intent_doc, entity_doc in zip(intent_docs, entity_docs):
+            result = self.classify(intent_doc)
+            result["entites"] = self.extract(entity_doc)
+            yield result
+
+
+@register_engine("hybrid")
+class HybridEngine(NLUEngine):
+    """
+    Regex en priorité (précis sur les formulations connues) ; si elle renvoie "inconnu",
+    l'intention du textcat est retenue au-delà de `hybrid_threshold`.
+    Les entités absentes du Matcher sont complétées par celles du NER.
+    """
+
+    def __init__(self, cfg: Dict[str, Any]):
+        super().__init__(cfg)
+        self.regex = RegexEngine(cfg)
+        self.trained = TrainedEngine(cfg)
+        self.threshold = cfg.get("hybrid_threshold", 0.5)
+
+    def _merge(self, regex_result: Dict[str, Any], trained_result: Dict[str, Any]) -> Dict[str, Any]:
+        result = dict(regex_result)
+        if regex_result["intent"] == "inconnu" and trained_result["confidence"] >= self.threshold:
+            result["intent"] = trained_result["intent"]
+            result["confidence"] = trained_result["confidence"]
+        entites = {k: list(v) for k, v in regex_result["entites"].items()}
+        for key in ("sports", "lieux"):
+            # le NER ne comble que ce que le Matcher n'a pas trouvé
+            if not entites[key]:
+                entites[key] = list(trained_result["entites"][key])
+        result["entites"] = entites
+        return result
+
+    def parse(self, text: str) -> Dict[str, Any]:
+        return self._merge(self.regex.parse(text), self.trained.parse(text))
+
+    def parse_batch(self, texts, batch_size=64, n_process=1):
+        texts = list(texts)
+        regex_results = self.regex.parse_batch(texts, batch_size=batch_size, n_process=n_process)
+        trained_results = self.trained.parse_batch(texts, batch_size=batch_size, n_process=n_process)
+        for regex_result, trained_result in zip(regex_results, trained_results):
+            yield self._merge(regex_result, trained_result)
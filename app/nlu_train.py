@@ -1,10 +1,55 @@
 import spacy
 from spacy.tokens import Doc
 from spacy.matcher import Matcher
+import json
+import os
 import re
 
+from app.catalog import catalog
+from app.gazetteer import Gazetteer
+
+NLU_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "configs", "nlu_config.json")
+# Surcharge optionnelle des patterns d'intention (rechargeable à chaud, voir app/registry.py)
+INTENT_PATTERNS_PATH = os.path.join(os.path.dirname(__file__), "..", "configs", "intent_patterns.json")
+SPACY_MODEL = "fr_core_news_md"
+
+# Profils de pipeline : composants de fr_core_news_md exclus au chargement.
+# Le code n'utilise que le tokenizer, like_num, les entités DATE/TIME et le Matcher.
+# Le NER de fr_core_news_md n'a que LOC/MISC/ORG/PER (pas de DATE/TIME) et possède
+# son propre tok2vec : il peut être gardé seul sans le reste du pipeline.
+PIPELINE_PROFILES = {
+    "full": [],
+    "ner": ["tok2vec", "morphologizer", "parser", "attribute_ruler", "lemmatizer", "senter"],
+    "minimal": ["tok2vec", "morphologizer", "parser", "attribute_ruler", "lemmatizer", "senter", "ner"],
+}
+DEFAULT_PIPELINE_PROFILE = "minimal"
+
+
+def load_nlu_config(path: str = NLU_CONFIG_PATH) -> dict:
+    """Charge configs/nlu_config.json (dict vide si absent ou invalide)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_pipeline(profile: str = None, model: str = SPACY_MODEL):
+    """
+    Charge le modèle spaCy en excluant les composants inutiles selon le profil.
+    Priorité : argument > variable d'env NLU_PIPELINE_PROFILE > nlu_config.json > "minimal".
+    """
+    cfg = load_nlu_config()
+    profile = profile or os.getenv("NLU_PIPELINE_PROFILE") or cfg.get("pipeline_profile") or DEFAULT_PIPELINE_PROFILE
+    if profile not in PIPELINE_PROFILES:
+        raise ValueError(f"Profil de pipeline inconnu: {profile} (choix: {', '.join(PIPELINE_PROFILES)})")
+    exclude = PIPELINE_PROFILES[profile]
+    print(f"[NLU] Chargement de {model} (profil '{profile}', exclus: {exclude or 'aucun'})")
+    return spacy.load(model, exclude=exclude)
+
+
 # Charger le modèle français
-nlp = spacy.load("fr_core_news_md")
+nlp = load_pipeline()
 
 # Enregistrer les attributs personnalisés
 if not Doc.has_extension("intent"):
@@ -62,22 +107,43 @@ INTENT_PATTERNS = {
     ],
 }
 
+def load_intent_patterns(path: str = INTENT_PATTERNS_PATH) -> dict:
+    """
+    INTENT_PATTERNS, remplacés intention par intention par le fichier JSON `path`
+    ({"intention": ["regex", ...]}) s'il existe. Un fichier invalide est ignoré.
+    """
+    patterns = dict(INTENT_PATTERNS)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            patterns.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"[NLU] Patterns d'intention ignorés ({path}): {e}")
+    return patterns
+
+
+def compile_patterns(patterns: dict) -> dict:
+    return {
+        intent: [re.compile(pattern, re.IGNORECASE) for pattern in intent_patterns]
+        for intent, intent_patterns in patterns.items()
+    }
+
+
 # Compilez les patterns regex
-compiled_patterns = {
-    intent: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
-    for intent, patterns in INTENT_PATTERNS.items()
-}
+compiled_patterns = compile_patterns(load_intent_patterns())
 
 @spacy.Language.component("intent_classifier")
-def intent_classifier(doc):
-    """Classifie l'intention de l'utilisateur"""
+def intent_classifier(doc, patterns=None):
+    """Classifie l'intention de l'utilisateur (`patterns` : jeu compilé propre à un moteur, via component_cfg)"""
+    patterns = patterns or compiled_patterns
     text = doc.text.lower()
     scores = {}
     
     # Calculer un score pour chaque intention
-    for intent, patterns in compiled_patterns.items():
+    for intent, intent_patterns in patterns.items():
         score = 0
-        for pattern in patterns:
+        for pattern in intent_patterns:
             if pattern.search(text):
                 score += 1
         scores[intent] = score
@@ -85,7 +151,7 @@ def intent_classifier(doc):
     # Sélectionner l'intention avec le score le plus élevé
     if max(scores.values()) > 0:
         doc._.intent = max(scores, key=scores.get)
-        doc._.confidence = scores[doc._.intent] / len(compiled_patterns[doc._.intent])
+        doc._.confidence = scores[doc._.intent] / len(patterns[doc._.intent])
     else:
         doc._.intent = "inconnu"
         doc._.confidence = 0.0
@@ -136,25 +202,33 @@ lieux_patterns = [
 
 matcher.add("LIEU", lieux_patterns)
 
+# Gazetteer construit depuis les collections `salle` / `activite` (voir app/gazetteer.py, app/catalog.py).
+# Vide tant que NLU ne l'a pas démarré : les patterns ci-dessus servent alors seuls.
+gazetteer = Gazetteer(nlp)
+# reconstruit dès que le cache du catalogue change (change stream / TTL), sans attendre sa propre période
+catalog.on_change.append(gazetteer.refresh)
+
 def extraire_entites(doc):
     """Extrait toutes les entités pertinentes"""
-    matches = matcher(doc)
+    # (label, début, fin, nom canonique du catalogue ou None)
+    matches = [(nlp.vocab.strings[match_id], start, end, None) for match_id, start, end in matcher(doc)]
+    matches += gazetteer.find(doc)
     
     sports = []
     lieux = []
     
     # Filtrer les matches pour garder le plus long quand il y a chevauchement
+    # (à longueur égale, le nom canonique du catalogue l'emporte)
     filtered = []
-    matches_sorted = sorted(matches, key=lambda m: (m[1], -(m[2] - m[1])))
+    matches_sorted = sorted(matches, key=lambda m: (m[1], -(m[2] - m[1]), m[3] is None))
     last_end = -1
-    for match_id, start, end in matches_sorted:
+    for label, start, end, canonical in matches_sorted:
         if start >= last_end:
-            filtered.append((match_id, start, end))
+            filtered.append((label, start, end, canonical))
             last_end = end
 
-    for match_id, start, end in filtered:
-        label = nlp.vocab.strings[match_id]
-        entity_text = doc[start:end].text
+    for label, start, end, canonical in filtered:
+        entity_text = canonical or doc[start:end].text
         
         if label == "SPORT":
             sports.append(entity_text)
@@ -178,12 +252,20 @@ def extraire_entites(doc):
         }
     }
 
-def traiter_requete(texte):
+def _component_cfg(patterns):
+    return {"intent_classifier": {"patterns": patterns}} if patterns else None
+
+def traiter_requete(texte, patterns=None):
     """Fonction principale de traitement NLU"""
-    doc = nlp(texte)
+    doc = nlp(texte, component_cfg=_component_cfg(patterns))
     resultat = extraire_entites(doc)
     return resultat
 
+def traiter_requetes(textes, batch_size=64, n_process=1, patterns=None):
+    """Version batch de traiter_requete via nlp.pipe (générateur, ordre conservé)."""
+    for doc in nlp.pipe(textes, batch_size=batch_size, n_process=n_process, component_cfg=_component_cfg(patterns)):
+        yield extraire_entites(doc)
+
 # ==============================
 # TESTS (uniquement si exécuté directement)
 # ==============================
@@ -1,8 +1,4 @@
-import random
-from pathlib import Path
-
-import spacy
-from spacy.training.example import Example
+from spacy.tokens import Span
 
 # More varied training data
 TRAIN_DATA_ENTITIES = [
@@ -60,70 +56,52 @@ ACTIVITIES = ["yoga", "fitness", "basket", "basketball", "tennis", "futsal", "na
 LOCATIONS = ["salle A", "salle de sport", "vestiaire", "terrain", "accueil", "secrétariat"]
 
 
-def train(output_dir: str = "entity_model", n_iter: int = 40, seed: int = 42):
-    random.seed(seed)
-    nlp = spacy.blank("fr")
-
-    # ÉTAPE 1 : Ajouter le NER en PREMIER
-    ner = nlp.add_pipe("ner")
-    for _, annotations in TRAIN_DATA_ENTITIES:
-        for _, _, label in annotations["entities"]:
-            ner.add_label(label)
-
-    # ÉTAPE 2 : Initialiser et entraîner le NER
-    optimizer = nlp.initialize()
-
-    print("🔄 Entraînement du NER...")
-    for i in range(n_iter):
-        random.shuffle(TRAIN_DATA_ENTITIES)
-        losses = {}
-        for text, annotations in TRAIN_DATA_ENTITIES:
-            doc = nlp.make_doc(text)
-            example = Example.from_dict(doc, annotations)
-            nlp.update([example], sgd=optimizer, losses=losses)
-
-        # Afficher la progression tous les 10 itérations
-        if (i + 1) % 10 == 0:
-            test_doc = nlp("je cherche la salle A")
-            ents = [(e.text, e.label_) for e in test_doc.ents]
-            print(f"Iteration {i+1}/{n_iter} - Loss: {losses['ner']:.4f} - Test ents: {ents}")
-
-    # ÉTAPE 3 : Ajouter l'entity_ruler APRÈS l'entraînement, en mode complémentaire
-    print("\n📋 Ajout de l'Entity Ruler...")
-    ruler = nlp.add_pipe("entity_ruler", config={"overwrite_ents": False})
-
-    patterns = []
-    for a in ACTIVITIES:
-        patterns.append({"label": "ACTIVITY", "pattern": a})
-    for l in LOCATIONS:
-        patterns.append({"label": "LOCATION", "pattern": l})
-    ruler.add_patterns(patterns)
-
-    # ÉTAPE 4 : Vérification finale
-    print("\n✅ Vérification du pipeline final:")
-    print("Pipes:", nlp.pipe_names)
-    print("EntityRuler patterns:", len(ruler.patterns))
-
-    # Tests de sanité
-    test_cases = [
-        "où est le secrétariat",
-        "je veux faire du football",
-        "réserver un cours de yoga",
-        "je cherche salle A",
-        "je cherche la salle natation",
-    ]
-
-    print("\n🧪 Tests:")
-    for test_text in test_cases:
-        doc = nlp(test_text)
-        ents = [(e.text, e.label_) for e in doc.ents]
-        print(f"  '{test_text}' → {ents}")
-
-    # ÉTAPE 5 : Sauvegarder le modèle complet
-    nlp.to_disk(Path(output_dir))
-    print(f"\n💾 Modèle entities sauvegardé dans {output_dir}")
-    print(f"   - NER entraîné pour apprendre des patterns")
-    print(f"   - Entity Ruler ajouté pour couvrir les cas connus")
+# Déterminants / prépositions retirés en bordure d'entité ("a" n'y est pas : "salle A")
+_BORDER_WORDS = {"le", "la", "les", "l'", "un", "une", "des", "du", "de", "d'", "au", "aux", "à", "en"}
+
+
+def aligned_entity_spans(doc, entities):
+    """
+    Spans spaCy des annotations (début, fin, label) recalées sur les tokens.
+    Plusieurs offsets de TRAIN_DATA_ENTITIES sont décalés de quelques caractères (" footbal", "u terr") :
+    on cherche d'abord le même intervalle décalé de ±3 qui tombe exactement sur des tokens, sinon on
+    étend aux tokens touchés puis on retire les mots outils en bordure ("au terrain" → "terrain").
+    """
+    spans = []
+    for start, end, label in entities:
+        span = None
+        for shift in (0, 1, -1, 2, -2, 3, -3):
+            if start + shift < 0 or end + shift > len(doc.text):
+                continue
+            candidate = doc.char_span(start + shift, end + shift, label=label)
+            if candidate is not None and candidate[0].lower_ not in _BORDER_WORDS:
+                span = candidate
+                break
+        if span is not None:
+            spans.append(span)
+            continue
+        span = doc.char_span(start, min(end, len(doc.text)), label=label, alignment_mode="expand")
+        if span is None:
+            continue
+        s, e = span.start, span.end
+        while e - s > 1 and (doc[s].lower_ in _BORDER_WORDS or doc[s].is_punct):
+            s += 1
+        while e - s > 1 and (doc[e - 1].lower_ in _BORDER_WORDS or doc[e - 1].is_punct):
+            e -= 1
+        spans.append(Span(doc, s, e, label=label))
+    return spans
+
+
+def train(output_dir: str = "entity_model", n_iter: int = 40, seed: int = 42, full: bool = False):
+    """
+    Entraîne le NER dans `output_dir` via app/nlu_training.py : corpus DocBin en cache,
+    reprise du modèle existant si seuls des exemples ont été ajoutés, arrêt anticipé.
+    """
+    from app.nlu_training import train_model
+
+    summary = train_model("entities", output_dir, full=full, max_epochs=n_iter, seed=seed)
+    print(f"💾 Modèle entities ({summary['mode']}) sauvegardé dans {output_dir}: {summary}")
+    return summary
 
 
 if __name__ == "__main__":
@@ -0,0 +1,311 @@
+"""
+app/nlu_training.py
+Entraînement incrémental et mis en cache des modèles spaCy du NLU.
+
+ - intents  : textcat (TextCatBOW, classes exclusives) sur RAW_TRAIN_DATA + configs/intents.json
+ - entities : NER ACTIVITY / LOCATION sur TRAIN_DATA_ENTITIES, puis entity_ruler complémentaire
+
+Les exemples sont sérialisés une fois dans un DocBin (corpus/<kind>.spacy, indexé par l'empreinte
+de chaque exemple) : seuls les exemples nouveaux sont retokenisés. Le modèle écrit `training.json`
+(empreintes des exemples vus, labels, scores). Au lancement suivant :
+ - rien de nouveau                → rien à faire ;
+ - seulement des ajouts           → reprise du modèle courant (resume_training) sur les nouveaux
+                                    exemples + un échantillon des anciens (évite l'oubli) ;
+ - exemples retirés / labels modifiés, ou --full → entraînement depuis zéro.
+
+Un jeu de validation (1 exemple sur 5, choisi par empreinte : stable d'un lancement à l'autre)
+sert à l'arrêt anticipé ; les meilleurs poids sont conservés. Le modèle est écrit dans un dossier
+temporaire puis échangé avec l'ancien : le registre de app/registry.py voit meta.json changer et
+recharge le NLU à chaud.
+
+Usage :
+    python -m app.nlu_training                     # intents + entities, chemins de nlu_config.json
+    python -m app.nlu_training entities --full
+    python -m app.nlu_training intents --output /tmp/intent_model --max-epochs 30
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import spacy
+from spacy.tokens import DocBin
+from spacy.training.example import Example
+from spacy.util import minibatch
+
+from app.nlu_engines import DEFAULT_ENTITY_MODEL, DEFAULT_INTENT_MODEL, ROOT_DIR, load_intent_examples
+from app.nlu_train import load_nlu_config
+
+CORPUS_DIR = os.path.join(ROOT_DIR, "corpus")
+TRAINING_MANIFEST = "training.json"
+KINDS = ("intents", "entities")
+
+_TEXTCAT_CONFIG = {
+    "threshold": 0.0,
+    "model": {
+        "@architectures": "spacy.TextCatBOW.v3",
+        "exclusive_classes": True,
+        "ngram_size": 2,
+        "no_output_layer": False,
+    },
+}
+
+
+def example_hash(text: str, annotation: Any) -> str:
+    return hashlib.sha1(json.dumps([text, annotation], ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def is_dev(key: str) -> bool:
+    """Validation = 1 exemple sur 5, déterminé par l'empreinte."""
+    return int(key[:8], 16) % 5 == 0
+
+
+def labeled_data(kind: str) -> List[Tuple[str, Any]]:
+    """(texte, annotation) : label d'intention, ou liste (début, fin, label) d'entités."""
+    if kind == "intents":
+        return load_intent_examples()
+    from app.nlu_train_entites import TRAIN_DATA_ENTITIES
+
+    return [(text, [list(e) for e in annotations["entities"]]) for text, annotations in TRAIN_DATA_ENTITIES]
+
+
+def _make_doc(nlp, kind: str, text: str, annotation: Any, labels: List[str]):
+    doc = nlp.make_doc(text)
+    if kind == "intents":
+        doc.cats = {label: float(label == annotation) for label in labels}
+    else:
+        from app.nlu_train_entites import aligned_entity_spans
+
+        doc.ents = spacy.util.filter_spans(aligned_entity_spans(doc, annotation))
+    return doc
+
+
+def load_corpus(kind: str, corpus_dir: str = CORPUS_DIR) -> Dict[str, Any]:
+    """
+    Docs annotés de `kind`, indexés par empreinte. Réutilise le DocBin en cache ; seuls
+    les exemples absents du cache sont convertis, puis le cache est réécrit.
+    Renvoie {"docs": {empreinte: Doc}, "labels": [...], "converted": n}.
+    """
+    data = labeled_data(kind)
+    if kind == "intents":
+        labels = sorted({label for _, label in data})
+    else:
+        labels = sorted({e[2] for _, ents in data for e in ents})
+    nlp = spacy.blank("fr")
+    keys = [example_hash(text, annotation) for text, annotation in data]
+
+    bin_path = os.path.join(corpus_dir, f"{kind}.spacy")
+    index_path = os.path.join(corpus_dir, f"{kind}.json")
+    cached: Dict[str, Any] = {}
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("labels") == labels:
+            docs = DocBin().from_disk(bin_path).get_docs(nlp.vocab)
+            cached = dict(zip(index["keys"], docs))
+    except (OSError, ValueError, KeyError):
+        cached = {}
+
+    docs = {}
+    converted = 0
+    for key, (text, annotation) in zip(keys, data):
+        doc = cached.get(key)
+        if doc is None:
+            doc = _make_doc(nlp, kind, text, annotation, labels)
+            converted += 1
+        docs[key] = doc
+
+    if converted or set(cached) != set(docs):
+        os.makedirs(corpus_dir, exist_ok=True)
+        store = DocBin(store_user_data=False)
+        for doc in docs.values():
+            store.add(doc)
+        store.to_disk(bin_path)
+        with open(index_path, "w", encoding="utf-8") as f:
+            json.dump({"labels": labels, "keys": list(docs)}, f)
+    return {"docs": docs, "labels": labels, "converted": converted}
+
+
+def read_manifest(model_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(model_path, TRAINING_MANIFEST), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _blank_model(kind: str, labels: List[str]):
+    nlp = spacy.blank("fr")
+    pipe = nlp.add_pipe("textcat", config=_TEXTCAT_CONFIG) if kind == "intents" else nlp.add_pipe("ner")
+    for label in labels:
+        pipe.add_label(label)
+    return nlp
+
+
+def _score(nlp, kind: str, dev: List[Example]) -> Tuple[float, float]:
+    """
+    (critère d'arrêt, F1) sur la validation. Pour le textcat, le critère est la moyenne F1 / AUC :
+    avec une vingtaine d'exemples la F1 seule fait des plateaux, l'AUC suit la progression du modèle.
+    """
+    scores = nlp.evaluate(dev)
+    if kind == "intents":
+        f1 = float(scores.get("cats_score") or 0.0)
+        return (f1 + float(scores.get("cats_macro_auc") or 0.0)) / 2, f1
+    f1 = float(scores.get("ents_f") or 0.0)
+    return f1, f1
+
+
+def _add_entity_ruler(nlp) -> None:
+    from app.nlu_train_entites import ACTIVITIES, LOCATIONS
+
+    if "entity_ruler" in nlp.pipe_names:
+        return
+    ruler = nlp.add_pipe("entity_ruler", config={"overwrite_ents": False})
+    ruler.add_patterns([{"label": "ACTIVITY", "pattern": a} for a in ACTIVITIES]
+                       + [{"label": "LOCATION", "pattern": l} for l in LOCATIONS])
+
+
+def _package(nlp, model_path: str, manifest: Dict[str, Any]) -> None:
+    """Écrit le modèle à côté puis remplace l'ancien dossier (deux renommages)."""
+    model_path = os.path.normpath(model_path)
+    tmp_path, old_path = model_path + ".tmp", model_path + ".old"
+    for path in (tmp_path, old_path):
+        shutil.rmtree(path, ignore_errors=True)
+    nlp.to_disk(tmp_path)
+    with open(os.path.join(tmp_path, TRAINING_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    if os.path.exists(model_path):
+        os.rename(model_path, old_path)
+    os.rename(tmp_path, model_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def train_model(kind: str, model_path: str, full: bool = False, max_epochs: int = 40, patience: int = 5,
+                rehearsal: int = 4, seed: int = 42, corpus_dir: str = CORPUS_DIR) -> Dict[str, Any]:
+    """Entraîne (ou met à jour) le modèle `kind` dans `model_path` ; renvoie un résumé."""
+    if kind not in KINDS:
+        raise ValueError(f"Type de modèle inconnu: {kind} (choix: {', '.join(KINDS)})")
+    t0 = time.perf_counter()
+    random.seed(seed)
+    corpus = load_corpus(kind, corpus_dir)
+    docs, labels = corpus["docs"], corpus["labels"]
+    pipe_name = "textcat" if kind == "intents" else "ner"
+
+    manifest = read_manifest(model_path)
+    seen = set(manifest["examples"]) if manifest else set()
+    new_keys = [key for key in docs if key not in seen]
+    incremental = (
+        not full
+        and manifest is not None
+        and manifest.get("labels") == labels
+        and seen <= set(docs)
+    )
+    if incremental and not new_keys:
+        return {"kind": kind, "mode": "up-to-date", "model": model_path, "seconds": round(time.perf_counter() - t0, 2)}
+
+    if incremental:
+        nlp = spacy.load(model_path)
+        optimizer = nlp.resume_training()
+        train_keys = [key for key in new_keys if not is_dev(key)]
+        old_train = [key for key in docs if key in seen and not is_dev(key)]
+    else:
+        nlp = _blank_model(kind, labels)
+        train_keys = [key for key in docs if not is_dev(key)]
+        old_train = []
+    dev = [Example(nlp.make_doc(docs[key].text), docs[key]) for key in docs if is_dev(key)]
+
+    def example(key):
+        return Example(nlp.make_doc(docs[key].text), docs[key])
+
+    if not incremental:
+        optimizer = nlp.initialize(lambda: [example(key) for key in train_keys])
+
+    best_score, best_f1, best_bytes, best_epoch, stale = -1.0, None, None, 0, 0
+    epochs = 0
+    with nlp.select_pipes(enable=[pipe_name]):
+        for epoch in range(1, max_epochs + 1):
+            epochs = epoch
+            keys = list(train_keys)
+            if old_train:
+                # répétition d'anciens exemples : le modèle n'oublie pas ce qu'il savait
+                keys += random.sample(old_train, min(len(old_train), rehearsal * max(1, len(train_keys))))
+            random.shuffle(keys)
+            losses: Dict[str, float] = {}
+            for batch in minibatch([example(key) for key in keys], size=8):
+                nlp.update(batch, sgd=optimizer, drop=0.1, losses=losses)
+            if not dev:
+                continue
+            score, f1 = _score(nlp, kind, dev)
+            if score > best_score:
+                best_score, best_f1, best_bytes, best_epoch, stale = score, f1, nlp.get_pipe(pipe_name).to_bytes(), epoch, 0
+            else:
+                stale += 1
+                if stale >= patience:
+                    break
+    if best_bytes is not None:
+        nlp.get_pipe(pipe_name).from_bytes(best_bytes)
+    if kind == "entities":
+        _add_entity_ruler(nlp)
+
+    summary = {
+        "kind": kind,
+        "mode": "incremental" if incremental else "full",
+        "model": model_path,
+        "examples": len(docs),
+        "trained_on": len(train_keys),
+        "new_examples": len(new_keys),
+        "converted_docs": corpus["converted"],
+        "dev_examples": len(dev),
+        "epochs": epochs,
+        "best_epoch": best_epoch,
+        "dev_f1": round(best_f1, 4) if best_f1 is not None else None,
+    }
+    _package(nlp, model_path, {
+        "labels": labels,
+        "examples": sorted(docs),
+        "trained_at": time.time(),
+        "summary": summary,
+    })
+    summary["seconds"] = round(time.perf_counter() - t0, 2)
+    return summary
+
+
+def _resolve(path: str) -> str:
+    return path if os.path.isabs(path) else os.path.join(ROOT_DIR, path)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("kinds", nargs="*", help="intents, entities (défaut : les deux)")
+    parser.add_argument("--output", help="dossier du modèle (un seul type ; défaut : nlu_config.json)")
+    parser.add_argument("--full", action="store_true", help="ignore le modèle courant et repart de zéro")
+    parser.add_argument("--max-epochs", type=int, default=40)
+    parser.add_argument("--patience", type=int, default=5, help="époques sans progrès avant arrêt")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    args.kinds = args.kinds or list(KINDS)
+    unknown = [kind for kind in args.kinds if kind not in KINDS]
+    if unknown:
+        parser.error(f"type(s) inconnu(s): {', '.join(unknown)} (choix: {', '.join(KINDS)})")
+
+    cfg = load_nlu_config()
+    paths = {
+        "intents": cfg.get("intent_model_path", DEFAULT_INTENT_MODEL),
+        "entities": cfg.get("entity_model_path", DEFAULT_ENTITY_MODEL),
+    }
+    if args.output:
+        if len(args.kinds) != 1:
+            parser.error("--output demande un seul type de modèle")
+        paths[args.kinds[0]] = args.output
+    for kind in args.kinds:
+        summary = train_model(kind, _resolve(paths[kind]), full=args.full, max_epochs=args.max_epochs,
+                              patience=args.patience, seed=args.seed)
+        print(json.dumps(summary, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
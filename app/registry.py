@@ -0,0 +1,169 @@
+"""
+app/registry.py
+Registre de composants rechargeables à chaud (NLU, ASR, dialogue/LLM).
+
+Chaque composant est construit par une fabrique. Un rechargement (endpoint admin ou
+modification d'un fichier surveillé) reconstruit le composant dans un thread de fond ;
+une fois prêt, il remplace l'ancien par une simple affectation de référence. Les requêtes
+en cours gardent la référence qu'elles ont obtenue par `acquire()` et finissent sur l'ancienne
+version. Un échec de construction laisse la version courante en place.
+
+Chaque version porte un identifiant "v<n>-<empreinte des fichiers surveillés>", renvoyé
+dans les réponses de l'API.
+"""
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+def files_signature(paths: Iterable[str]) -> Tuple[Tuple[str, Optional[float]], ...]:
+    """(chemin, mtime) des fichiers surveillés ; mtime None si le fichier n'existe pas."""
+    out = []
+    for path in paths:
+        try:
+            out.append((path, os.path.getmtime(path)))
+        except OSError:
+            out.append((path, None))
+    return tuple(out)
+
+
+def files_digest(paths: Iterable[str]) -> str:
+    """Empreinte courte du contenu des fichiers surveillés (absents compris)."""
+    h = hashlib.sha1()
+    for path in paths:
+        h.update(path.encode("utf-8"))
+        try:
+            with open(path, "rb") as f:
+                h.update(f.read())
+        except OSError:
+            h.update(b"\0")
+    return h.hexdigest()[:8]
+
+
+class _Slot:
+    def __init__(self, name: str, factory: Callable[[], Any], watch: List[str]):
+        self.name = name
+        self.factory = factory
+        self.watch = watch
+        # (composant, version) affectés ensemble : une requête ne voit jamais un mélange des deux
+        self.current: Tuple[Any, Optional[str]] = (None, None)
+        self.loaded_at: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self.generation = 0
+        self.signature = files_signature(watch)
+        self.reloading = False
+        self.last_error: Optional[str] = None
+        self.lock = threading.Lock()
+
+
+class ComponentRegistry:
+    def __init__(self):
+        self._slots: Dict[str, _Slot] = {}
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def register(self, name: str, factory: Callable[[], Any], watch: Iterable[str] = (), lazy: bool = False) -> None:
+        """Enregistre un composant et le construit immédiatement (sauf `lazy`)."""
+        slot = _Slot(name, factory, [os.path.abspath(p) for p in watch])
+        self._slots[name] = slot
+        if not lazy:
+            self._build(slot)
+
+    def acquire(self, name: str) -> Tuple[Any, Optional[str]]:
+        """(composant, version) courants, à garder en variable locale le temps d'une requête."""
+        slot = self._slots[name]
+        if slot.current[0] is None:
+            self._build(slot)
+        return slot.current
+
+    def get(self, name: str) -> Any:
+        return self.acquire(name)[0]
+
+    def version(self, name: str) -> Optional[str]:
+        return self._slots[name].current[1]
+
+    def versions(self) -> Dict[str, Optional[str]]:
+        return {name: slot.current[1] for name, slot in self._slots.items()}
+
+    def _build(self, slot: _Slot) -> bool:
+        with slot.lock:
+            slot.reloading = True
+            # mémorisée même en cas d'échec : le watcher ne réessaie qu'à la prochaine modification
+            slot.signature = files_signature(slot.watch)
+            start = time.perf_counter()
+            try:
+                component = slot.factory()
+            except Exception as e:
+                slot.last_error = str(e)
+                print(f"[Registry] Échec du chargement de '{slot.name}' ({slot.current[1]} conservée): {e}")
+                return False
+            finally:
+                slot.reloading = False
+            previous = slot.current[0]
+            slot.generation += 1
+            version = f"v{slot.generation}-{files_digest(slot.watch)}"
+            slot.load_seconds = round(time.perf_counter() - start, 3)
+            slot.loaded_at = time.time()
+            slot.last_error = None
+            slot.current = (component, version)  # swap atomique (affectation de référence)
+        print(f"[Registry] '{slot.name}' {version} prêt en {slot.load_seconds}s")
+        close = getattr(previous, "close", None)
+        if callable(close):
+            close()
+        return True
+
+    def reload(self, name: str, wait: bool = False) -> bool:
+        """
+        Reconstruit `name` en arrière-plan (ou de façon synchrone si `wait`).
+        Renvoie False si un rechargement de ce composant est déjà en cours.
+        """
+        slot = self._slots[name]
+        if slot.reloading:
+            return False
+        if wait:
+            return self._build(slot)
+        slot.reloading = True
+        threading.Thread(target=self._build, args=(slot,), name=f"reload-{name}", daemon=True).start()
+        return True
+
+    def check_files(self) -> List[str]:
+        """Recharge les composants dont un fichier surveillé a changé ; renvoie leurs noms."""
+        changed = []
+        for name, slot in self._slots.items():
+            if slot.watch and not slot.reloading and files_signature(slot.watch) != slot.signature:
+                changed.append(name)
+                self.reload(name)
+        return changed
+
+    def start_watcher(self, interval_seconds: float = 2.0) -> None:
+        """Surveille les fichiers (mtime) toutes les `interval_seconds` dans un thread de fond."""
+        if self._watcher is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.check_files()
+                except Exception as e:
+                    print(f"[Registry] Surveillance des fichiers: {e}")
+
+        self._watcher = threading.Thread(target=loop, name="registry-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "version": slot.current[1],
+                "loaded_at": slot.loaded_at,
+                "load_seconds": slot.load_seconds,
+                "reloading": slot.reloading,
+                "last_error": slot.last_error,
+                "watch": slot.watch,
+            }
+            for name, slot in self._slots.items()
+        }
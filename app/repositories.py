@@ -0,0 +1,415 @@
+"""
+app/repositories.py
+Couche d'accès aux données : catalogue (salles, activités), réservations, utilisateurs, sessions.
+
+Trois backends, choisis par la variable d'environnement DATA_BACKEND :
+ - `mongo`  (défaut) : Atlas via le client partagé de app/DB_access.py ;
+ - `sqlite` : fichier local DATA_SQLITE_PATH (data/kiosk.db), mode WAL, index sur les créneaux ;
+   une borne isolée répond sans réseau, en dessous de la milliseconde ;
+ - `memory` : dictionnaires en mémoire (tests, benchmarks).
+Les backends locaux démarrent vides, ou avec le contenu de DATA_SEED_PATH (JSON étendu produit par
+`python -m scripts.sync_local_data`, qui copie aussi Atlas vers un fichier SQLite).
+
+Les documents gardent la forme Mongo (ObjectId compris, sérialisés en JSON étendu dans SQLite) :
+le catalogue, l'index de disponibilité et le dialogue ne dépendent pas du backend.
+Le store de sessions reste choisi par SESSION_BACKEND (`memory` par défaut, `mongo`, `sqlite`).
+"""
+import copy
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId, json_util
+
+from app.booking_schema import SlotTaken, book_slot, ensure_indexes, slot_locks
+from app.sessions import SessionStore, SessionTurn, StoreOpsCounter
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_SQLITE_PATH = os.path.join(ROOT_DIR, "data", "kiosk.db")
+COLLECTIONS = ("salle", "activite", "utilisateurs", "reservations")
+
+Document = Dict[str, Any]
+
+
+def load_seed(path: str) -> Dict[str, List[Document]]:
+    """Collections d'un fichier JSON étendu {"salle": [...], "activite": [...], ...}."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json_util.loads(f.read())
+
+
+def dump_seed(path: str, data: Dict[str, List[Document]]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json_util.dumps(data, indent=1, ensure_ascii=False))
+
+
+# --- Interfaces ---
+
+class CatalogRepository:
+    def load(self) -> Tuple[List[Document], List[Document]]:
+        """(salles, activités) complets."""
+        raise NotImplementedError
+
+
+class ReservationRepository:
+    def all(self) -> List[Document]:
+        raise NotImplementedError
+
+    def upcoming(self, since: str) -> List[Document]:
+        """Réservations du jour `since` (date ISO) et après ; les anciennes sans `date` (non migrées) sont gardées."""
+        return [doc for doc in self.all() if doc.get("date") is None or doc["date"] >= since]
+
+    def book(self, reservation: Document) -> Any:
+        """Enregistre atomiquement `reservation` (reservation_document) ; lève SlotTaken si le créneau est pris."""
+        raise NotImplementedError
+
+    def ensure_schema(self) -> None:
+        pass
+
+
+class UserRepository:
+    def with_photo(self) -> List[Document]:
+        """Utilisateurs {_id, photo, nom, prenom} pour la vérification faciale."""
+        raise NotImplementedError
+
+
+class Repositories:
+    """Dépôts d'un backend + fabrique du store de sessions."""
+
+    def __init__(self, name: str, catalog: CatalogRepository, reservations: ReservationRepository,
+                 users: UserRepository, session_store: Callable[[int], Any]):
+        self.name = name
+        self.catalog = catalog
+        self.reservations = reservations
+        self.users = users
+        self._session_store = session_store
+
+    def create_session_store(self, ttl_seconds: int = 3600):
+        return self._session_store(ttl_seconds)
+
+
+BACKENDS: Dict[str, Callable[[], Repositories]] = {}
+
+
+def register_backend(name: str):
+    """Décorateur : enregistre une fabrique de dépôts sous `name`."""
+    def decorator(factory):
+        BACKENDS[name] = factory
+        return factory
+    return decorator
+
+
+# --- Mongo ---
+
+class MongoCatalogRepository(CatalogRepository):
+    def load(self):
+        from app.catalog import load_catalog_from_mongo
+
+        return load_catalog_from_mongo()
+
+
+class MongoReservationRepository(ReservationRepository):
+    def __init__(self):
+        from app.DB_access import DatabaseMongo
+
+        self.db = DatabaseMongo()
+
+    def all(self):
+        # _id conservé : son horodatage date les anciennes réservations ("demain") non migrées
+        projection = {"salle": 1, "date": 1, "start": 1, "end": 1, "jour": 1, "heure_debut": 1, "heure_fin": 1}
+        return list(self.db.get_collection("reservations").find({}, projection))
+
+    def upcoming(self, since):
+        # index (salle, date, start, end) inutilisable sans salle : le filtre reste côté serveur
+        query = {"$or": [{"date": {"$gte": since}}, {"date": {"$exists": False}}]}
+        projection = {"salle": 1, "date": 1, "start": 1, "end": 1, "jour": 1, "heure_debut": 1, "heure_fin": 1}
+        return list(self.db.get_collection("reservations").find(query, projection))
+
+    def book(self, reservation):
+        return book_slot(self.db, reservation)
+
+    def ensure_schema(self):
+        ensure_indexes(self.db)
+
+
+class MongoUserRepository(UserRepository):
+    def with_photo(self):
+        from app.DB_access import get_database
+
+        return list(get_database()["utilisateurs"].find({}, {"photo": 1, "nom": 1, "prenom": 1}))
+
+
+@register_backend("mongo")
+def mongo_repositories() -> Repositories:
+    def sessions(ttl_seconds):
+        from app.sessions_db import SessionStoreMongo
+
+        return SessionStoreMongo(ttl_seconds)
+
+    return Repositories("mongo", MongoCatalogRepository(), MongoReservationRepository(), MongoUserRepository(), sessions)
+
+
+# --- Mémoire ---
+
+class MemoryData:
+    """Collections en mémoire partagées par les dépôts du backend `memory`."""
+
+    def __init__(self, seed: Dict[str, List[Document]] = None):
+        self.lock = threading.Lock()
+        self.collections: Dict[str, List[Document]] = {name: list((seed or {}).get(name, [])) for name in COLLECTIONS}
+        self.slots: Dict[Tuple[str, str, int], Any] = {}
+        for doc in self.collections["reservations"]:
+            if {"date", "start", "end"} <= doc.keys():
+                for lock in slot_locks(doc["salle"], doc["date"], doc["start"], doc["end"], doc.get("_id")):
+                    self.slots.setdefault((str(lock["salle"]), lock["date"], lock["slot"]), lock["reservation"])
+
+
+class MemoryCatalogRepository(CatalogRepository):
+    def __init__(self, data: MemoryData):
+        self.data = data
+
+    def load(self):
+        return list(self.data.collections["salle"]), list(self.data.collections["activite"])
+
+
+class MemoryReservationRepository(ReservationRepository):
+    def __init__(self, data: MemoryData):
+        self.data = data
+
+    def all(self):
+        return list(self.data.collections["reservations"])
+
+    def book(self, reservation):
+        reservation.setdefault("_id", ObjectId())
+        keys = [(str(lock["salle"]), lock["date"], lock["slot"])
+                for lock in slot_locks(reservation["salle"], reservation["date"], reservation["start"],
+                                       reservation["end"], reservation["_id"])]
+        with self.data.lock:
+            if any(key in self.data.slots for key in keys):
+                raise SlotTaken(f"{reservation['salle']} {reservation['date']} {reservation['start']}-{reservation['end']}")
+            for key in keys:
+                self.data.slots[key] = reservation["_id"]
+            self.data.collections["reservations"].append(copy.deepcopy(reservation))
+        return reservation["_id"]
+
+
+class MemoryUserRepository(UserRepository):
+    def __init__(self, data: MemoryData):
+        self.data = data
+
+    def with_photo(self):
+        return [doc for doc in self.data.collections["utilisateurs"] if doc.get("photo")]
+
+
+@register_backend("memory")
+def memory_repositories(seed: Dict[str, List[Document]] = None) -> Repositories:
+    if seed is None and os.getenv("DATA_SEED_PATH"):
+        seed = load_seed(os.getenv("DATA_SEED_PATH"))
+    data = MemoryData(seed)
+    return Repositories("memory", MemoryCatalogRepository(data), MemoryReservationRepository(data),
+                        MemoryUserRepository(data), lambda ttl: SessionStore(ttl))
+
+
+# --- SQLite ---
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS salle (id TEXT PRIMARY KEY, doc TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS activite (id TEXT PRIMARY KEY, doc TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS utilisateurs (id TEXT PRIMARY KEY, doc TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS reservations (
+    id TEXT PRIMARY KEY, salle TEXT NOT NULL, date TEXT, start_min INTEGER, end_min INTEGER, doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reservations_salle_date_start_end ON reservations (salle, date, start_min, end_min);
+CREATE TABLE IF NOT EXISTS reservation_slots (
+    salle TEXT NOT NULL, date TEXT NOT NULL, slot INTEGER NOT NULL, reservation TEXT NOT NULL,
+    PRIMARY KEY (salle, date, slot)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, last_touched REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS sessions_last_touched ON sessions (last_touched);
+"""
+
+
+class SQLiteDatabase:
+    """Fichier SQLite en mode WAL ; une connexion par thread (lecteurs concurrents, un écrivain à la fois)."""
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("DATA_SQLITE_PATH", DEFAULT_SQLITE_PATH)
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._local = threading.local()
+        self.connection().executescript(_SQLITE_SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def documents(self, table: str) -> List[Document]:
+        return [json_util.loads(row[0]) for row in self.connection().execute(f"SELECT doc FROM {table}")]
+
+    def import_documents(self, data: Dict[str, List[Document]]) -> None:
+        """Remplace le contenu des collections présentes dans `data` (copie depuis Atlas ou un fichier)."""
+        conn = self.connection()
+        with conn:
+            for table in ("salle", "activite", "utilisateurs"):
+                if table in data:
+                    conn.execute(f"DELETE FROM {table}")
+                    conn.executemany(f"INSERT INTO {table} (id, doc) VALUES (?, ?)",
+                                     [(str(doc.get("_id", uuid.uuid4())), json_util.dumps(doc)) for doc in data[table]])
+            if "reservations" in data:
+                conn.execute("DELETE FROM reservations")
+                conn.execute("DELETE FROM reservation_slots")
+                for doc in data["reservations"]:
+                    doc = dict(doc, _id=doc.get("_id", ObjectId()))
+                    _insert_reservation(conn, doc, ignore_conflicts=True)
+
+
+def _insert_reservation(conn: sqlite3.Connection, doc: Document, ignore_conflicts: bool = False) -> None:
+    if {"date", "start", "end"} <= doc.keys():
+        verb = "INSERT OR IGNORE" if ignore_conflicts else "INSERT"
+        conn.executemany(f"{verb} INTO reservation_slots (salle, date, slot, reservation) VALUES (?, ?, ?, ?)",
+                         [(str(lock["salle"]), lock["date"], lock["slot"], str(lock["reservation"]))
+                          for lock in slot_locks(doc["salle"], doc["date"], doc["start"], doc["end"], doc["_id"])])
+    conn.execute("INSERT INTO reservations (id, salle, date, start_min, end_min, doc) VALUES (?, ?, ?, ?, ?, ?)",
+                 (str(doc["_id"]), str(doc["salle"]), doc.get("date"), doc.get("start"), doc.get("end"),
+                  json_util.dumps(doc)))
+
+
+class SQLiteCatalogRepository(CatalogRepository):
+    def __init__(self, database: SQLiteDatabase):
+        self.database = database
+
+    def load(self):
+        return self.database.documents("salle"), self.database.documents("activite")
+
+
+class SQLiteReservationRepository(ReservationRepository):
+    def __init__(self, database: SQLiteDatabase):
+        self.database = database
+
+    def all(self):
+        return self.database.documents("reservations")
+
+    def upcoming(self, since):
+        rows = self.database.connection().execute(
+            "SELECT doc FROM reservations WHERE date IS NULL OR date >= ?", (since,))
+        return [json_util.loads(row[0]) for row in rows]
+
+    def book(self, reservation):
+        reservation.setdefault("_id", ObjectId())
+        conn = self.database.connection()
+        try:
+            # transaction : verrous (clé primaire) et réservation écrits ensemble, ou pas du tout
+            with conn:
+                _insert_reservation(conn, reservation)
+        except sqlite3.IntegrityError:
+            raise SlotTaken(f"{reservation['salle']} {reservation['date']} {reservation['start']}-{reservation['end']}")
+        return reservation["_id"]
+
+
+class SQLiteUserRepository(UserRepository):
+    def __init__(self, database: SQLiteDatabase):
+        self.database = database
+
+    def with_photo(self):
+        return [doc for doc in self.database.documents("utilisateurs") if doc.get("photo")]
+
+
+class SessionStoreSQLite:
+    """Store de sessions dans le fichier SQLite (mêmes opérations que SessionStore / SessionStoreMongo)."""
+
+    def __init__(self, database: SQLiteDatabase, ttl_seconds: int = 3600):
+        self.database = database
+        self.ttl = ttl_seconds
+        self.ops = StoreOpsCounter()
+
+    def turn(self, session_id: str) -> SessionTurn:
+        return SessionTurn(self, session_id)
+
+    @staticmethod
+    def _new() -> Dict[str, Any]:
+        return {"created_at": time.time(), "last_intent": None, "fallbacks": 0}
+
+    def _write(self, session_id: str, data: Dict[str, Any]) -> None:
+        conn = self.database.connection()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO sessions (id, data, last_touched) VALUES (?, ?, ?)",
+                         (session_id, json_util.dumps(data), time.time()))
+
+    def create_session(self) -> str:
+        self.ops.count("create")
+        sid = str(uuid.uuid4())
+        self._write(sid, self._new())
+        return sid
+
+    def get(self, session_id: str) -> Dict[str, Any]:
+        self.ops.count("get")
+        row = self.database.connection().execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        data = json_util.loads(row[0]) if row else self._new()
+        self._write(session_id, data)
+        return data
+
+    def update(self, session_id: str, data: Dict[str, Any], removed: Iterable[str] = ()) -> None:
+        self.ops.count("update")
+        self._write(session_id, data)
+
+    def reset(self, session_id: str) -> bool:
+        self.ops.count("reset")
+        conn = self.database.connection()
+        with conn:
+            cursor = conn.execute("UPDATE sessions SET data = ?, last_touched = ? WHERE id = ?",
+                                  (json_util.dumps(self._new()), time.time(), session_id))
+        return cursor.rowcount > 0
+
+    def cleanup(self):
+        conn = self.database.connection()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE last_touched < ?", (time.time() - self.ttl,))
+
+
+@register_backend("sqlite")
+def sqlite_repositories(path: str = None) -> Repositories:
+    database = SQLiteDatabase(path)
+    if os.getenv("DATA_SEED_PATH") and not database.documents("salle"):
+        database.import_documents(load_seed(os.getenv("DATA_SEED_PATH")))
+    return Repositories("sqlite", SQLiteCatalogRepository(database), SQLiteReservationRepository(database),
+                        SQLiteUserRepository(database), lambda ttl: SessionStoreSQLite(database, ttl))
+
+
+# --- Instance du processus ---
+
+_repositories: Optional[Repositories] = None
+_repositories_lock = threading.Lock()
+
+
+def create_repositories(name: str = None) -> Repositories:
+    name = name or os.getenv("DATA_BACKEND", "mongo")
+    if name not in BACKENDS:
+        raise ValueError(f"Backend de données inconnu: {name} (choix: {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
+
+
+def get_repositories() -> Repositories:
+    """Dépôts du backend DATA_BACKEND, créés au premier usage."""
+    global _repositories
+    if _repositories is None:
+        with _repositories_lock:
+            if _repositories is None:
+                _repositories = create_repositories()
+    return _repositories
+
+
+def create_session_store(ttl_seconds: int = 3600):
+    """Store de sessions SESSION_BACKEND (`memory` par défaut), indépendant du backend des données."""
+    name = os.getenv("SESSION_BACKEND", "memory")
+    if name == "memory":
+        return SessionStore(ttl_seconds)
+    repositories = get_repositories() if get_repositories().name == name else create_repositories(name)
+    return repositories.create_session_store(ttl_seconds)
@@ -1,23 +1,33 @@
-from app.DB_access import DatabaseMongo
+from app.availability import availability
+from app.booking_schema import SlotTaken, reservation_document, resolve_date
+from app.catalog import catalog
+from app.repositories import get_repositories
+from app.temporal import heure_to_minutes
 
 
 def reserver_salle(infos_reservation):
-    db = DatabaseMongo()
-    reservations_collection = db.get_collection("reservation")
-    salle_collection = db.get_collection("salle")
-    salle_doc = salle_collection.find_one({"nom": infos_reservation.get("salle")})
-    infos_reservation = {
-        "utilisateur_id": infos_reservation.get("utilisateur_id"),
-        "salle": salle_doc.get("_id"),
-        "creneau": {
-            "jour": infos_reservation.get("creneau", {}).get("jour"),
-            "heure_debut": infos_reservation.get("creneau", {}).get("heure_debut"),
-            "heure_fin": infos_reservation.get("creneau", {}).get("heure_fin"),
-        }
-    }
-    # Insérer les informations de réservation dans la collection
-    result = reservations_collection.insert_one(infos_reservation)
-    
-    db.close()
-    return result.inserted_id
+    """
+    Réserve une salle pour un utilisateur (backend DATA_BACKEND, insertion atomique du créneau).
+    Lève ValueError si la salle ou le créneau est invalide, SlotTaken si le créneau est pris
+    (réservation existante ou créneau hebdomadaire du planning des activités).
+    """
+    salle_doc = catalog.snapshot().salle(infos_reservation.get("salle") or "")
+    if not salle_doc:
+        raise ValueError("Salle inconnue: {}".format(infos_reservation.get("salle")))
+    creneau = infos_reservation.get("creneau", {})
+    jour = creneau.get("jour")
+    debut = heure_to_minutes(creneau.get("heure_debut"))
+    fin = heure_to_minutes(creneau.get("heure_fin"))
+    if debut is None or fin is None or fin <= debut:
+        raise ValueError("Créneau invalide: {}".format(creneau))
 
+    date = resolve_date(jour) or jour
+    # l'index unique ne couvre que les réservations : le planning hebdomadaire est vérifié dans l'index en mémoire
+    if availability.is_booked(salle_doc["_id"], date, debut, fin):
+        raise SlotTaken(f"{salle_doc['nom']} {date} {debut}-{fin}")
+    reservation = reservation_document(salle_doc["_id"], "", jour, date, debut, fin)
+    reservation["utilisateur_id"] = infos_reservation.get("utilisateur_id")
+    # une seule insertion : la réservation et ses quarts d'heure (index unique, conflit → SlotTaken)
+    reservation_id = get_repositories().reservations.book(reservation)
+    availability.add(salle_doc["_id"], reservation["date"], debut, fin)
+    return reservation_id
@@ -0,0 +1,111 @@
+"""
+app/response_cache.py
+Cache des réponses LLM aux questions fréquentes ("c'est quoi les tarifs", "vous êtes ouverts dimanche").
+
+Clé = (intention, texte normalisé, empreinte du contexte, date résolue). L'empreinte couvre ce qui change
+la réponse sans changer la question : prompt système, backend / modèle LLM et version du catalogue ; la date
+ISO extraite par le NLU sépare "vous êtes ouverts demain ?" d'un jour à l'autre. Un tour n'est mis en cache
+que si ni l'historique ni le jour courant ne peuvent changer la réponse : intention de la liste `intents`,
+question d'au moins `min_words` mots, sans reprise du contexte ("et pour celle-là ?", "ça coûte combien ?")
+ni moment relatif que le NLU ne résout pas en date ("ce soir", "ce week-end", "en ce moment").
+
+Configuration dans la config LLM (clé "response_cache") :
+
+    "response_cache": {"enabled": true, "maxsize": 512, "ttl_seconds": 3600,
+                       "intents": ["unknown", "ask_hours"], "min_words": 3}
+
+Le cache est partagé entre rechargements du DialogManager ; il est vidé quand le prompt ou la config
+LLM changent (configure() avec une autre empreinte).
+"""
+import hashlib
+import json
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from app.cache import LRUCache
+
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "enabled": True,
+    "maxsize": 512,
+    "ttl_seconds": 3600,
+    # "unknown" : questions libres (tarifs, équipements...) qui partent au LLM
+    "intents": ["unknown", "ask_hours", "who_are_you"],
+    "min_words": 3,
+}
+
+_TRAILING_PUNCT = re.compile(r"[\s?!.…,;:]+$")
+# reprises du contexte : la réponse dépend des tours précédents
+_CONTEXTUAL = re.compile(
+    r"\b(ça|ca|cela|ceci|celle|celles|celui|ceux|là|aussi|pareil|même chose|le même|la même)\b|^(et|mais|alors|sinon)\b",
+    re.IGNORECASE,
+)
+# moments relatifs sans date résolue : la réponse dépend du jour (ou de l'heure) où la question est posée
+_RELATIVE_TIME = re.compile(
+    r"\b(ce soir|ce matin|cet après-midi|cette semaine|ce week-?end|maintenant|en ce moment|tout à l'heure|tout de suite)\b",
+    re.IGNORECASE,
+)
+
+
+def normalize_question(text: str) -> str:
+    """Minuscules, espaces compactés, ponctuation finale retirée (comme la clé du cache NLU)."""
+    s = " ".join((text or "").lower().split())
+    return _TRAILING_PUNCT.sub("", s)
+
+
+def context_fingerprint(**parts: Any) -> str:
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, cfg: Dict[str, Any] = None):
+        self._lock = threading.Lock()
+        self.context = ""
+        self.skipped = 0
+        self.configure(cfg)
+
+    def configure(self, cfg: Dict[str, Any] = None, context: str = "") -> None:
+        """(Re)configure le cache ; une nouvelle empreinte (prompt / config LLM) vide les entrées."""
+        cfg = {**DEFAULT_CONFIG, **(cfg or {})}
+        with self._lock:
+            self.enabled = bool(cfg["enabled"])
+            self.intents = set(cfg["intents"])
+            self.min_words = int(cfg["min_words"])
+            cache = getattr(self, "cache", None)
+            if cache is None or cache.maxsize != cfg["maxsize"] or cache.ttl != cfg["ttl_seconds"]:
+                self.cache = LRUCache(maxsize=cfg["maxsize"], ttl_seconds=cfg["ttl_seconds"])
+            elif context != self.context and len(cache):
+                cache.clear()
+            self.context = context
+
+    def cacheable(self, intent: str, text: str) -> bool:
+        """Vrai si la réponse ne dépend que de la question (et du contexte de l'empreinte)."""
+        question = normalize_question(text)
+        ok = (self.enabled and intent in self.intents and len(question.split()) >= self.min_words
+              and not _CONTEXTUAL.search(question) and not _RELATIVE_TIME.search(question))
+        if not ok:
+            with self._lock:
+                self.skipped += 1
+        return ok
+
+    def key(self, intent: str, text: str, catalog_fingerprint: str = None, date: str = None) -> tuple:
+        """`date` : date ISO résolue de la question ("demain" → "2026-10-20"), None si elle n'en cite pas."""
+        return intent, normalize_question(text), self.context, catalog_fingerprint, date
+
+    def get(self, key: tuple) -> Optional[str]:
+        return self.cache.get(key)
+
+    def put(self, key: tuple, answer: str) -> None:
+        if answer and answer.strip():
+            self.cache.put(key, answer)
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.cache.stats(), enabled=self.enabled, skipped=self.skipped,
+                    intents=sorted(self.intents), context=self.context[:12])
+
+
+response_cache = ResponseCache()
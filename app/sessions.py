@@ -1,6 +1,113 @@
+import asyncio
+import copy
+import threading
 import uuid
 import time
-from typing import Dict, Any
+from contextvars import ContextVar, Token
+from typing import Dict, Any, Iterable, List, Optional
+
+# opérations du tour en cours : une liste partagée (mutable) plutôt qu'un entier, pour que les
+# threads lancés par asyncio.to_thread / run_in_threadpool (contexte copié) comptent dans le même tour
+_turn_ops: ContextVar[Optional[List[int]]] = ContextVar("session_turn_ops", default=None)
+
+
+class StoreOpsCounter:
+    """
+    Compte les opérations d'un store de sessions (total par type, et par tour de dialogue).
+    Le compte par tour suit le contexte (contextvars) : des tours asyncio entrelacés sur la boucle ne se
+    mélangent pas, et les opérations faites dans un thread du tour y sont comptées.
+    """
+
+    def __init__(self):
+        self.totals: Dict[str, int] = {}
+        self.turns = 0
+        self.turn_ops = 0
+        self.max_turn_ops = 0
+        self._lock = threading.Lock()
+
+    def count(self, op: str) -> None:
+        with self._lock:
+            self.totals[op] = self.totals.get(op, 0) + 1
+        ops = _turn_ops.get()
+        if ops is not None:
+            ops[0] += 1
+
+    def begin_turn(self) -> Token:
+        return _turn_ops.set([0])
+
+    def end_turn(self, token: Token) -> int:
+        ops = _turn_ops.get()[0]
+        _turn_ops.reset(token)
+        with self._lock:
+            self.turns += 1
+            self.turn_ops += ops
+            self.max_turn_ops = max(self.max_turn_ops, ops)
+        return ops
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ops": dict(self.totals),
+                "turns": self.turns,
+                "ops_per_turn": round(self.turn_ops / self.turns, 2) if self.turns else None,
+                "max_ops_per_turn": self.max_turn_ops,
+            }
+
+
+class SessionTurn:
+    """
+    Unité de travail d'un tour de dialogue : la session est lue une fois, modifiée en mémoire
+    (`turn.data`), puis écrite une seule fois à la sortie du bloc `with`, seulement si elle a changé
+    (clés modifiées écrites, clés supprimées retirées).
+    `async with` fait la lecture et l'écriture dans un thread : le store (Mongo) ne bloque pas la boucle.
+    """
+
+    def __init__(self, store, session_id: str):
+        self.store = store
+        self.session_id = session_id
+        self.data: Dict[str, Any] = {}
+        self._original: Dict[str, Any] = {}
+        self._token: Optional[Token] = None
+
+    def _load(self) -> None:
+        self.data = self.store.get(self.session_id)
+        self._original = copy.deepcopy(self.data)
+
+    def __enter__(self) -> "SessionTurn":
+        self._token = self.store.ops.begin_turn()
+        self._load()
+        return self
+
+    def flush(self) -> None:
+        changed = {k: v for k, v in self.data.items() if k not in self._original or self._original[k] != v}
+        removed = [k for k in self._original if k not in self.data]
+        if changed or removed:
+            self.store.update(self.session_id, self.data, removed=removed)
+            self._original = copy.deepcopy(self.data)
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # écrit aussi en cas d'erreur : le message utilisateur reste dans l'historique
+        try:
+            self.flush()
+        finally:
+            self.store.ops.end_turn(self._token)
+
+    async def __aenter__(self) -> "SessionTurn":
+        # le compteur est posé dans le contexte de la tâche, avant le passage dans le thread
+        self._token = self.store.ops.begin_turn()
+        try:
+            await asyncio.to_thread(self._load)
+        except BaseException:
+            self.store.ops.end_turn(self._token)
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        try:
+            await asyncio.to_thread(self.flush)
+        finally:
+            self.store.ops.end_turn(self._token)
+
 
 # Simple in-memory session store with TTL. For production, utiliser Redis or DB.
 class SessionStore:
@@ -8,25 +115,33 @@ class SessionStore:
         self.ttl = ttl_seconds
         self._store: Dict[str, Dict[str, Any]] = {}
         self._meta: Dict[str, float] = {}
+        self.ops = StoreOpsCounter()
+
+    def turn(self, session_id: str) -> SessionTurn:
+        return SessionTurn(self, session_id)
 
     def create_session(self) -> str:
+        self.ops.count("create")
         sid = str(uuid.uuid4())
         self._store[sid] = {"created_at": time.time(), "last_intent": None, "fallbacks": 0}
         self._meta[sid] = time.time()
         return sid
 
     def get(self, session_id: str) -> Dict[str, Any]:
+        self.ops.count("get")
         if session_id not in self._store:
             # create one to be permissive
             self._store[session_id] = {"created_at": time.time(), "last_intent": None, "fallbacks": 0}
         self._meta[session_id] = time.time()
         return self._store[session_id]
 
-    def update(self, session_id: str, data: Dict[str, Any]) -> None:
+    def update(self, session_id: str, data: Dict[str, Any], removed: Iterable[str] = ()) -> None:
+        self.ops.count("update")
         self._store[session_id] = data
         self._meta[session_id] = time.time()
 
     def reset(self, session_id: str) -> bool:
+        self.ops.count("reset")
         if session_id in self._store:
             self._store[session_id] = {"created_at": time.time(), "last_intent": None, "fallbacks": 0}
             self._meta[session_id] = time.time()
@@ -38,4 +153,4 @@ class SessionStore:
         for sid, touched in list(self._meta.items()):
             if now - touched > self.ttl:
                 del self._meta[sid]
-                del self._store[sid]
\ No newline at end of file
+                del self._store[sid]
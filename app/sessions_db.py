@@ -2,13 +2,16 @@ from pymongo import MongoClient, ASCENDING
 from pymongo.errors import PyMongoError
 import time
 import uuid
+from typing import Iterable
 from .DB_access import DatabaseMongo
+from .sessions import SessionTurn, StoreOpsCounter
 
 class SessionStoreMongo:
     def __init__(self, ttl_seconds=3600):
         self.db = DatabaseMongo()
         self.collection = self.db.get_collection("sessions")
         self.ttl = ttl_seconds
+        self.ops = StoreOpsCounter()
         
         # Index TTL sur le champ 'last_touched' pour nettoyage automatique
         # Mongo supprime automatiquement les documents dont 'last_touched' est trop vieux
@@ -17,7 +20,11 @@ class SessionStoreMongo:
             expireAfterSeconds=self.ttl
         )
 
+    def turn(self, session_id: str) -> SessionTurn:
+        return SessionTurn(self, session_id)
+
     def create_session(self) -> str:
+        self.ops.count("create")
         sid = str(uuid.uuid4())
         now = time.time()
         session_doc = {
@@ -35,6 +42,7 @@ class SessionStoreMongo:
         return sid
 
     def get(self, session_id: str) -> dict:
+        self.ops.count("get")
         now = time.time()
         session = self.collection.find_one_and_update(
             {"_id": session_id},
@@ -45,6 +53,7 @@ class SessionStoreMongo:
         # Si la session n'existait pas, upsert=True la crée sans les champs par défaut, on corrige ça:
         if not session:
             # Création explicite avec champs par défaut
+            self.ops.count("create")
             self.collection.update_one(
                 {"_id": session_id},
                 {"$set": {
@@ -58,16 +67,24 @@ class SessionStoreMongo:
             session = self.collection.find_one({"_id": session_id})
         return session
 
-    def update(self, session_id: str, data: dict) -> bool:
+    def update(self, session_id: str, data: dict, removed: Iterable[str] = ()) -> bool:
+        """Une seule écriture : $set des champs, $unset des champs supprimés pendant le tour."""
+        self.ops.count("update")
         data["last_touched"] = time.time()
+        fields = {k: v for k, v in data.items() if k != "_id"}
+        operation = {"$set": fields}
+        removed = [k for k in removed if k not in fields]
+        if removed:
+            operation["$unset"] = {k: "" for k in removed}
         result = self.collection.update_one(
             {"_id": session_id},
-            {"$set": data},
+            operation,
             upsert=True
         )
         return result.modified_count > 0 or result.upserted_id is not None
 
     def reset(self, session_id: str) -> bool:
+        self.ops.count("reset")
         now = time.time()
         result = self.collection.update_one(
             {"_id": session_id},
@@ -0,0 +1,139 @@
+"""
+app/streaming.py
+Réponses en flux pour /v1/respond/stream : le texte du LLM est découpé en phrases dès qu'elles sont
+complètes, pour que le robot commence à parler pendant que la suite est générée.
+
+Événements NDJSON (une ligne JSON chacun, dans cet ordre) :
+    {"type": "actions", "actions": {...}}              avant la première phrase (dès qu'elles sont connues)
+    {"type": "sentence", "index": 0, "text": "..."}    une par phrase
+    {"type": "done", "text": "...", "actions": {...}, "session_id": "...", "versions": {...}}
+    {"type": "error", "detail": "..."}                 à la place de "done" si le tour échoue
+"""
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+# une phrase trop courte ("Oui.", "M.") est regroupée avec la suivante
+MIN_SENTENCE_CHARS = int(os.getenv("STREAM_MIN_SENTENCE_CHARS", "24"))
+_SENTENCE_END = re.compile(r"[.!?…]+[\"»)\]]*\s+|\n+")
+
+
+class SentenceChunker:
+    """Regroupe des fragments de texte (tokens du LLM) en phrases d'au moins `min_chars` caractères."""
+
+    def __init__(self, min_chars: int = MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self.buffer = ""
+        self.sentences: List[str] = []
+
+    def feed(self, delta: str) -> List[str]:
+        """Phrases complétées par ce fragment (souvent aucune)."""
+        self.buffer += delta
+        ready, start = [], 0
+        for m in _SENTENCE_END.finditer(self.buffer):
+            if m.end() - start >= self.min_chars:
+                sentence = self.buffer[start:m.end()].strip()
+                if sentence:
+                    ready.append(sentence)
+                start = m.end()
+        self.buffer = self.buffer[start:]
+        self.sentences.extend(ready)
+        return ready
+
+    def flush(self) -> List[str]:
+        """Fin de la génération : le reste du tampon forme la dernière phrase."""
+        rest, self.buffer = self.buffer.strip(), ""
+        if rest:
+            self.sentences.append(rest)
+            return [rest]
+        return []
+
+
+def sentence_chunks(deltas: Iterable[str], min_chars: int = MIN_SENTENCE_CHARS) -> Iterator[str]:
+    chunker = SentenceChunker(min_chars)
+    for delta in deltas:
+        yield from chunker.feed(delta)
+    yield from chunker.flush()
+
+
+def split_sentences(text: str, min_chars: int = MIN_SENTENCE_CHARS) -> List[str]:
+    return list(sentence_chunks([text or ""], min_chars))
+
+
+class StreamStats:
+    """Délai avant la première phrase (ce que le visiteur attend avant que le robot parle)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.streams = 0
+        self.sentences = 0
+        self.errors = 0
+        self.first_sentence_ms_total = 0.0
+        self.first_sentence_ms_max = 0.0
+        self.total_ms_total = 0.0
+
+    def record(self, sentences: int, first_sentence_ms: Optional[float], total_ms: float, error: bool) -> None:
+        with self._lock:
+            self.streams += 1
+            self.sentences += sentences
+            self.errors += int(error)
+            self.total_ms_total += total_ms
+            if first_sentence_ms is not None:
+                self.first_sentence_ms_total += first_sentence_ms
+                self.first_sentence_ms_max = max(self.first_sentence_ms_max, first_sentence_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.streams
+            return {
+                "streams": n,
+                "sentences": self.sentences,
+                "errors": self.errors,
+                "first_sentence_ms_mean": round(self.first_sentence_ms_total / n, 1) if n else 0.0,
+                "first_sentence_ms_max": round(self.first_sentence_ms_max, 1),
+                "total_ms_mean": round(self.total_ms_total / n, 1) if n else 0.0,
+            }
+
+
+stream_stats = StreamStats()
+
+
+class ReplyStream:
+    """Émetteur d'événements d'un tour : le DialogManager y pousse actions et phrases au fil de la génération."""
+
+    def __init__(self, emit: Callable[[Dict[str, Any]], None]):
+        self.emit = emit
+        self.started = time.perf_counter()
+        self.first_sentence_ms: Optional[float] = None
+        self.sentences = 0
+        self.actions_sent = False
+
+    def actions(self, actions: Dict[str, Any]) -> None:
+        if not self.actions_sent:
+            self.actions_sent = True
+            self.emit({"type": "actions", "actions": actions})
+
+    def sentence(self, text: str) -> None:
+        if self.first_sentence_ms is None:
+            self.first_sentence_ms = (time.perf_counter() - self.started) * 1000.0
+        self.emit({"type": "sentence", "index": self.sentences, "text": text})
+        self.sentences += 1
+
+    def finish(self, text: str, actions: Dict[str, Any], **extra: Any) -> None:
+        """Fin du tour ; une réponse produite d'un bloc (règle, cache, flux) est découpée ici."""
+        if not self.sentences:
+            self.actions(actions)
+            for sentence in split_sentences(text):
+                self.sentence(sentence)
+        self.emit(dict({"type": "done", "text": text, "actions": actions}, **extra))
+        self._record(error=False)
+
+    def fail(self, detail: str) -> None:
+        self.emit({"type": "error", "detail": detail})
+        self._record(error=True)
+
+    def _record(self, error: bool) -> None:
+        stream_stats.record(self.sentences, self.first_sentence_ms,
+                            (time.perf_counter() - self.started) * 1000.0, error)
@@ -0,0 +1,158 @@
+"""
+app/temporal.py
+Grammaire date/heure française précompilée, exécutée une fois par énoncé dans NLU.parse.
+
+Produit des slots normalisés :
+ - jour    : texte tel que prononcé ("demain", "lundi", "12 mars")
+ - date    : date ISO résolue ("2026-10-20")
+ - heure   : "HH:MM"
+ - minutes : minutes depuis minuit (int)
+"""
+import datetime
+import re
+from typing import Any, Dict, Optional, Tuple
+
+MOIS = ["janvier", "février", "mars", "avril", "mai", "juin", "juillet",
+        "août", "septembre", "octobre", "novembre", "décembre"]
+JOURS = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
+
+_MOIS_IDX = {m: i + 1 for i, m in enumerate(MOIS)}
+_MOIS_IDX.update({"fevrier": 2, "aout": 8, "decembre": 12})
+_JOURS_IDX = {j: i for i, j in enumerate(JOURS)}
+_RELATIFS = {"aujourd'hui": 0, "aujourdhui": 0, "demain": 1, "après-demain": 2, "après demain": 2,
+             "apres-demain": 2, "apres demain": 2}
+
+_MOIS_RE = "|".join(sorted(_MOIS_IDX, key=len, reverse=True))
+
+# Dates, par ordre de priorité
+_DATE_MOIS = re.compile(r"\b(\d{1,2})(?:er)?\s+(" + _MOIS_RE + r")(?:\s+(\d{4}))?\b", re.IGNORECASE)
+_DATE_NUM = re.compile(r"\b(\d{1,2})[/\-](\d{1,2})(?:[/\-](\d{2,4}))?\b")
+_DATE_JOUR = re.compile(r"\b(" + "|".join(JOURS) + r")\b", re.IGNORECASE)
+_DATE_REL = re.compile(r"\b(apr[eè]s[- ]demain|demain|aujourd'?hui)\b", re.IGNORECASE)
+
+# Heures, par ordre de priorité
+_HEURE_PATTERNS = [
+    re.compile(r"\b(\d{1,2})\s*:\s*(\d{2})\b"),             # 10:00, 18:30
+    re.compile(r"\b(\d{1,2})\s*[hH]\s*(\d{1,2})\b"),        # 19h30, 19H00
+    re.compile(r"\b(\d{1,2})\s*heures?(?:\s+(\d{1,2})\b)?", re.IGNORECASE),  # 18 heures, 18 heures 30
+    re.compile(r"\b(\d{1,2})\s*[hH](?![a-zA-Z\d])"),        # 19h (sans minutes)
+    re.compile(r"\bà\s+(\d{1,2})\b(?!\s*[/\-])"),            # à 19
+]
+_MIDI_MINUIT = re.compile(r"\b(midi|minuit)\b", re.IGNORECASE)
+_NOMBRE = re.compile(r"(\d{1,2})")
+
+
+def _resolve_year(day: int, month: int, today: datetime.date) -> Optional[datetime.date]:
+    """Date sans année : cette année, ou l'an prochain si elle est déjà passée."""
+    for year in (today.year, today.year + 1):
+        try:
+            d = datetime.date(year, month, day)
+        except ValueError:
+            return None
+        if d >= today:
+            return d
+    return d
+
+
+def parse_date(text: str, today: datetime.date = None) -> Optional[Tuple[str, str, Tuple[int, int]]]:
+    """Renvoie (texte, date ISO, span) de la première date trouvée, ou None."""
+    today = today or datetime.date.today()
+
+    m = _DATE_MOIS.search(text)
+    if m:
+        day, month = int(m.group(1)), _MOIS_IDX[m.group(2).lower()]
+        if m.group(3):
+            try:
+                d = datetime.date(int(m.group(3)), month, day)
+            except ValueError:
+                d = None
+        else:
+            d = _resolve_year(day, month, today)
+        if d:
+            return m.group(0), d.isoformat(), m.span()
+
+    m = _DATE_NUM.search(text)
+    if m:
+        day, month = int(m.group(1)), int(m.group(2))
+        d = None
+        if 1 <= month <= 12:
+            if m.group(3):
+                year = int(m.group(3))
+                year = year + 2000 if year < 100 else year
+                try:
+                    d = datetime.date(year, month, day)
+                except ValueError:
+                    d = None
+            else:
+                d = _resolve_year(day, month, today)
+        if d:
+            return m.group(0), d.isoformat(), m.span()
+
+    m = _DATE_REL.search(text)
+    if m:
+        key = m.group(1).lower()
+        offset = _RELATIFS.get(key, _RELATIFS.get(key.replace("'", ""), 0))
+        return m.group(0), (today + datetime.timedelta(days=offset)).isoformat(), m.span()
+
+    m = _DATE_JOUR.search(text)
+    if m:
+        # prochain jour de ce nom (aujourd'hui compris)
+        delta = (_JOURS_IDX[m.group(1).lower()] - today.weekday()) % 7
+        return m.group(0), (today + datetime.timedelta(days=delta)).isoformat(), m.span()
+
+    return None
+
+
+def parse_time(text: str) -> Optional[Tuple[str, int]]:
+    """Renvoie (texte, minutes depuis minuit) de la première heure trouvée, ou None."""
+    for pattern in _HEURE_PATTERNS:
+        for m in pattern.finditer(text):
+            h = int(m.group(1))
+            mins = int(m.group(2)) if m.lastindex and m.lastindex >= 2 and m.group(2) else 0
+            if h < 24 and mins < 60:
+                return m.group(0), h * 60 + mins
+    m = _MIDI_MINUIT.search(text)
+    if m:
+        return m.group(0), 12 * 60 if m.group(1).lower() == "midi" else 0
+    return None
+
+
+def heure_to_minutes(heure_str: str) -> Optional[int]:
+    """'19h', '19h30', '18:00', 'à 19', '19' → minutes depuis minuit (None si impossible)."""
+    if not heure_str:
+        return None
+    heure_str = heure_str.strip().lower()
+    found = parse_time(heure_str)
+    if found:
+        return found[1]
+    if any(pattern.search(heure_str) for pattern in _HEURE_PATTERNS):
+        return None  # heure écrite mais hors bornes ("25h", "19h75")
+    m = _NOMBRE.search(heure_str)
+    if m and int(m.group(1)) < 24:
+        return int(m.group(1)) * 60
+    return None
+
+
+def minutes_to_heure(minutes: int) -> Optional[str]:
+    if minutes is None:
+        return None
+    return "{:02d}:{:02d}".format(minutes // 60, minutes % 60)
+
+
+def extract_temporal(text: str, today: datetime.date = None) -> Dict[str, Any]:
+    """Slots temporels normalisés d'un énoncé : jour, date, heure, minutes (clés présentes si trouvées)."""
+    slots: Dict[str, Any] = {}
+    if not text:
+        return slots
+    date = parse_date(text, today)
+    if date:
+        surface, iso, (start, end) = date
+        slots["jour"] = surface
+        slots["date"] = iso
+        # masque la date pour que "le 12/03 à 18h" ne donne pas 12h
+        text = text[:start] + " " * (end - start) + text[end:]
+    time = parse_time(text)
+    if time:
+        slots["minutes"] = time[1]
+        slots["heure"] = minutes_to_heure(time[1])
+    return slots
@@ -23,6 +23,9 @@ PEPPER_PORT = 9559
 SERVER_URL = "http://localhost:8001"
 ASR_URL = SERVER_URL + "/v1/asr"
 RESPOND_URL = SERVER_URL + "/v1/respond"
+RESPOND_STREAM_URL = SERVER_URL + "/v1/respond/stream"
+# Réponse en flux : le robot prononce la première phrase pendant que le LLM génère la suite
+STREAM_RESPONSES = True
 WEB_URL = "http://10.126.8.40:5500/"
 
 # Paramètres audio
@@ -168,6 +171,49 @@ class PepperOrchestrator:
             print("[DIALOG] Erreur envoi: {}".format(err_msg))
             return None
 
+    def send_to_dialog_stream(self, text, lang="fr"):
+        """
+        Variante en flux de send_to_dialog : exécute les actions et prononce chaque phrase dès sa réception.
+        Retourne l'événement final ("done") avec actions_done=True si les actions ont déjà été exécutées.
+        """
+        payload = {
+            "text": text,
+            "lang": lang,
+            "session_id": self.dialog_session_id,
+        }
+        actions_done = False
+        try:
+            resp = requests.post(RESPOND_STREAM_URL, json=payload, timeout=REQUEST_TIMEOUT, stream=True)
+            if not resp.ok:
+                print("[DIALOG] Erreur HTTP {}: {}".format(resp.status_code, resp.text[:200]))
+                return None
+            # chunk_size=1 : chaque ligne NDJSON est traitée dès son arrivée (sinon mise en tampon par 512 octets)
+            for line in resp.iter_lines(chunk_size=1):
+                if not line:
+                    continue
+                event = json.loads(line)
+                kind = event.get("type")
+                if kind == "actions":
+                    self.handle_actions(event.get("actions", {}))
+                    actions_done = True
+                elif kind == "sentence":
+                    self.robot_say(event.get("text", ""))
+                elif kind == "done":
+                    self.dialog_session_id = event.get("session_id", self.dialog_session_id)
+                    event["actions_done"] = actions_done
+                    return event
+                elif kind == "error":
+                    print("[DIALOG] Erreur serveur: {}".format(event.get("detail", "")))
+                    return None
+            print("[DIALOG] Flux interrompu avant la fin de la réponse")
+            return None
+        except Exception as e:
+            err_msg = str(e)
+            if isinstance(err_msg, unicode):
+                err_msg = err_msg.encode("utf-8")
+            print("[DIALOG] Erreur flux: {}".format(err_msg))
+            return None
+
     # ─── ACTIONS DU ROBOT ───
 
     def robot_say(self, text):
@@ -442,6 +488,17 @@ class PepperOrchestrator:
             text_log = text
         print("\n[USER] {}".format(text_log))
 
+        if STREAM_RESPONSES:
+            # actions et phrases sont traitées pendant la réception du flux
+            dialog_result = self.send_to_dialog_stream(text, lang=lang)
+            if not dialog_result:
+                self.robot_say("Désolé, je n'arrive pas à contacter le serveur.")
+                return
+            if not dialog_result.get("actions_done"):
+                self.handle_actions(dialog_result.get("actions", {}))
+            self.tablet.hidePage()
+            return
+
         dialog_result = self.send_to_dialog(text, lang=lang)
 
         if not dialog_result:
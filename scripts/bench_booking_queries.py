@@ -0,0 +1,112 @@
+"""
+Benchmark des requêtes de conflit de réservation sur une année synthétique.
+
+Compare, sur la même collection :
+ - l'ancienne requête (`$or` sur des chaînes "HH:MM", filtre salle + jour) ;
+ - la requête d'intervalle du schéma date ISO + minutes (app/booking_schema.py), servie par
+   l'index composé (salle, date, start, end).
+Rapporte p50 / p99 et documents examinés (explain) par requête.
+
+La base de benchmark (--db, défaut multisport_bench) est supprimée à la fin sauf avec --keep.
+
+Usage :
+    python -m scripts.bench_booking_queries
+    python -m scripts.bench_booking_queries --rooms 20 --per-day 10 --queries 2000
+"""
+import argparse
+import datetime
+import json
+import random
+import time
+
+from pymongo import MongoClient
+
+from app.DB_access import MONGODB_URI
+from app.booking_schema import RESERVATIONS_INDEX, overlap_query, reservation_document
+from scripts.eval_nlu import _percentile
+
+
+def synthetic_year(rooms: int, per_day: int, seed: int, start: datetime.date):
+    rng = random.Random(seed)
+    docs = []
+    for day in range(365):
+        date = (start + datetime.timedelta(days=day)).isoformat()
+        for room in range(rooms):
+            for hour in rng.sample(range(8, 22), min(per_day, 14)):
+                docs.append(reservation_document(f"salle_{room}", "bench", date, date, hour * 60, hour * 60 + 60))
+    return docs
+
+
+def legacy_query(salle, jour, heure_debut, heure_fin):
+    # requête de DialogManager._is_room_booked avant la migration
+    return {
+        "salle": salle,
+        "jour": jour,
+        "$or": [
+            {"heure_debut": {"$lt": heure_fin, "$gte": heure_debut}},
+            {"heure_fin": {"$gt": heure_debut, "$lte": heure_fin}},
+            {"heure_debut": heure_debut, "heure_fin": heure_fin},
+            {"$and": [{"heure_debut": {"$lte": heure_debut}}, {"heure_fin": {"$gte": heure_fin}}]},
+        ],
+    }
+
+
+def measure(collection, queries):
+    latencies, examined = [], 0
+    for query in queries:
+        t = time.perf_counter()
+        collection.find_one(query)
+        latencies.append((time.perf_counter() - t) * 1000.0)
+    for query in queries[:50]:
+        stats = collection.find(query).limit(1).explain().get("executionStats", {})
+        examined += stats.get("totalDocsExamined", 0)
+    latencies.sort()
+    return {
+        "p50_ms": round(_percentile(latencies, 0.50), 3),
+        "p99_ms": round(_percentile(latencies, 0.99), 3),
+        "docs_examined_per_query": round(examined / min(len(queries), 50), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uri", default=MONGODB_URI)
+    parser.add_argument("--db", default="multisport_bench")
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--per-day", type=int, default=8, help="réservations d'une heure par salle et par jour")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="ne pas supprimer la base de benchmark")
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    db = client[args.db]
+    collection = db.get_collection("reservations")
+    collection.drop()
+
+    start = datetime.date.today()
+    docs = synthetic_year(args.rooms, args.per_day, args.seed, start)
+    collection.insert_many(docs, ordered=False)
+
+    rng = random.Random(args.seed + 1)
+    probes = []
+    for _ in range(args.queries):
+        date = (start + datetime.timedelta(days=rng.randrange(365))).isoformat()
+        minutes = rng.randrange(8 * 60, 21 * 60, 15)
+        probes.append((f"salle_{rng.randrange(args.rooms)}", date, minutes, minutes + 60))
+
+    report = {"reservations": len(docs), "queries": args.queries}
+    report["legacy_no_index"] = measure(collection, [
+        legacy_query(s, d, "{:02d}:{:02d}".format(a // 60, a % 60), "{:02d}:{:02d}".format(b // 60, b % 60))
+        for s, d, a, b in probes])
+    collection.create_index(RESERVATIONS_INDEX, name="salle_date_start_end")
+    report["interval_compound_index"] = measure(collection, [overlap_query(*p) for p in probes])
+
+    if not args.keep:
+        client.drop_database(args.db)
+    client.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
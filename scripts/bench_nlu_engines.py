@@ -0,0 +1,98 @@
+"""
+Comparaison côte à côte des moteurs NLU (app/nlu_engines.py) sur RAW_TRAIN_DATA :
+latence par énoncé, mémoire résidente ajoutée par le moteur et précision d'intention.
+
+Chaque moteur est mesuré dans un sous-processus séparé.
+
+Usage :
+    python -m scripts.bench_nlu_engines
+    python -m scripts.bench_nlu_engines --engines regex hybrid --intent-model intent_model
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from scripts.bench_nlu_pipeline import ROOT, _rss_mb
+
+
+def run_worker(engine_name: str, repeat: int, overrides: dict) -> dict:
+    # RSS mesurée avant tout import applicatif : inclut fr_core_news_md chargé par nlu_train
+    rss_before = _rss_mb()
+    from app.nlu import NLU
+    from app.nlu_engines import create_engine
+    from app.nlu_train import load_nlu_config
+    from configs.intents import RAW_TRAIN_DATA
+
+    cfg = load_nlu_config()
+    cfg.update(overrides)
+    t0 = time.perf_counter()
+    try:
+        engine = create_engine(engine_name, cfg)
+    except Exception as e:
+        return {"engine": engine_name, "error": str(e)}
+    load_s = time.perf_counter() - t0
+
+    correct = 0
+    latencies = []
+    for _ in range(repeat):
+        for text, label in RAW_TRAIN_DATA:
+            t = time.perf_counter()
+            result = engine.parse(text.lower())
+            latencies.append((time.perf_counter() - t) * 1000.0)
+            intent = NLU._INTENT_MAP.get(result["intent"], result["intent"])
+            correct += intent == label
+    latencies.sort()
+    return {
+        "engine": engine_name,
+        "load_s": round(load_s, 2),
+        "rss_engine_mb": round(_rss_mb() - rss_before, 1),
+        "accuracy": round(correct / len(latencies), 3),
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engines", nargs="+", default=["regex", "trained", "hybrid"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--intent-model", help="chemin du modèle textcat (défaut : nlu_config.json)")
+    parser.add_argument("--entity-model", help="chemin du modèle NER (défaut : nlu_config.json)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    overrides = {}
+    if args.intent_model:
+        overrides["intent_model_path"] = args.intent_model
+    if args.entity_model:
+        overrides["entity_model_path"] = args.entity_model
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.repeat, overrides)))
+        return
+
+    extra = sys.argv[1:]
+    results = []
+    for engine in args.engines:
+        out = subprocess.run(
+            [sys.executable, "-m", "scripts.bench_nlu_engines", "--worker", engine] + extra,
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print("{:<8} {:>7} {:>10} {:>9} {:>9} {:>9} {:>9}".format(
+        "moteur", "load_s", "rss_mb", "accuracy", "mean_ms", "p50_ms", "p99_ms"))
+    for r in results:
+        if "error" in r:
+            print("{:<8} indisponible : {}".format(r["engine"], r["error"]))
+            continue
+        print("{:<8} {:>7} {:>10} {:>9} {:>9} {:>9} {:>9}".format(
+            r["engine"], r["load_s"], r["rss_engine_mb"], r["accuracy"], r["mean_ms"], r["p50_ms"], r["p99_ms"]))
+
+
+if __name__ == "__main__":
+    main()
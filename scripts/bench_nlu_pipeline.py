@@ -0,0 +1,92 @@
+"""
+Benchmark des profils de pipeline spaCy du NLU (app/nlu_train.py).
+
+Chaque profil est mesuré dans un sous-processus séparé pour que la mémoire
+résidente (RSS) reflète uniquement le modèle chargé avec ce profil.
+
+Usage :
+    python -m scripts.bench_nlu_pipeline                  # tous les profils
+    python -m scripts.bench_nlu_pipeline --profiles full minimal --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def _rss_mb() -> float:
+    """Mémoire résidente courante du processus (Linux : /proc, sinon ru_maxrss)."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_worker(profile: str, repeat: int) -> dict:
+    """Charge le pipeline avec `profile` et mesure la latence par énoncé."""
+    os.environ["NLU_PIPELINE_PROFILE"] = profile
+    rss_before = _rss_mb()
+    t0 = time.perf_counter()
+    from app.nlu_train import traiter_requete, nlp
+    load_s = time.perf_counter() - t0
+    from configs.intents import RAW_TRAIN_DATA
+
+    texts = [text for text, _ in RAW_TRAIN_DATA]
+    traiter_requete(texts[0])  # échauffement
+    latencies = []
+    for _ in range(repeat):
+        for text in texts:
+            t = time.perf_counter()
+            traiter_requete(text)
+            latencies.append((time.perf_counter() - t) * 1000.0)
+    latencies.sort()
+    return {
+        "profile": profile,
+        "pipes": nlp.pipe_names,
+        "load_s": round(load_s, 2),
+        "rss_mb": round(_rss_mb(), 1),
+        "rss_model_mb": round(_rss_mb() - rss_before, 1),
+        "utterances": len(latencies),
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", default=["full", "ner", "minimal"])
+    parser.add_argument("--repeat", type=int, default=3, help="passes sur RAW_TRAIN_DATA")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.repeat)))
+        return
+
+    results = []
+    for profile in args.profiles:
+        out = subprocess.run(
+            [sys.executable, "-m", "scripts.bench_nlu_pipeline", "--worker", profile, "--repeat", str(args.repeat)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print("{:<8} {:>8} {:>9} {:>9} {:>9} {:>9}  {}".format("profil", "load_s", "rss_mb", "mean_ms", "p50_ms", "p99_ms", "pipes"))
+    for r in results:
+        print("{:<8} {:>8} {:>9} {:>9} {:>9} {:>9}  {}".format(
+            r["profile"], r["load_s"], r["rss_mb"], r["mean_ms"], r["p50_ms"], r["p99_ms"], ",".join(r["pipes"])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Évaluation reproductible du NLU (NLU.parse) et garde-fou de régression.
+
+Jeux étiquetés :
+ - intentions : RAW_TRAIN_DATA (configs/intents.py) + exemples de configs/intents.json
+ - entités    : TRAIN_DATA_ENTITIES (app/nlu_train_entites.py), ACTIVITY → activity, LOCATION → location
+
+Rapport JSON : matrice de confusion, précision / rappel / F1 par intention et par type d'entité,
+débit et latences p50/p99 de NLU.parse (cache désactivé, gazetteer Mongo non démarré).
+
+Avec --baseline, le script échoue (code 1) si l'exactitude baisse de plus de --max-accuracy-drop
+ou si la p99 dépasse celle de référence de plus de --max-latency-increase (relatif) et
+--latency-slack-ms (absolu, évite les faux positifs sur des latences de l'ordre de 0,1 ms).
+
+Usage :
+    python -m scripts.eval_nlu                                   # rapport sur la sortie standard
+    python -m scripts.eval_nlu --output report.json
+    python -m scripts.eval_nlu --save-baseline configs/nlu_eval_baseline.json
+    python -m scripts.eval_nlu --baseline configs/nlu_eval_baseline.json --engine hybrid
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+_ENTITY_LABEL_TO_KEY = {"ACTIVITY": "activity", "LOCATION": "location"}
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def _prf(tp: int, fp: int, fn: int) -> Dict[str, float]:
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": round(precision, 3), "recall": round(recall, 3), "f1": round(f1, 3), "support": tp + fn}
+
+
+def intent_metrics(pairs: List[Tuple[str, str]]) -> Dict[str, Any]:
+    """pairs = [(attendu, prédit)] → exactitude, matrice de confusion, P/R/F1 par intention, macro-F1."""
+    confusion: Dict[str, Dict[str, int]] = {}
+    for gold, pred in pairs:
+        row = confusion.setdefault(gold, {})
+        row[pred] = row.get(pred, 0) + 1
+    labels = sorted(confusion)
+    per_intent = {}
+    for label in labels:
+        tp = confusion[label].get(label, 0)
+        fn = sum(confusion[label].values()) - tp
+        fp = sum(row.get(label, 0) for gold, row in confusion.items() if gold != label)
+        per_intent[label] = _prf(tp, fp, fn)
+    correct = sum(gold == pred for gold, pred in pairs)
+    return {
+        "count": len(pairs),
+        "accuracy": round(correct / len(pairs), 3) if pairs else 0.0,
+        "macro_f1": round(sum(m["f1"] for m in per_intent.values()) / len(per_intent), 3) if per_intent else 0.0,
+        "per_intent": per_intent,
+        "confusion": confusion,
+    }
+
+
+def entity_metrics(pairs: List[Tuple[Dict[str, set], Dict[str, set]]]) -> Dict[str, Any]:
+    """pairs = [(attendu, prédit)] avec {type: {valeurs}} → P/R/F1 par type d'entité."""
+    counts: Dict[str, List[int]] = {}
+    for gold, pred in pairs:
+        for key in set(gold) | set(pred):
+            g, p = gold.get(key, set()), pred.get(key, set())
+            c = counts.setdefault(key, [0, 0, 0])
+            c[0] += len(g & p)
+            c[1] += len(p - g)
+            c[2] += len(g - p)
+    return {key: _prf(*c) for key, c in sorted(counts.items())}
+
+
+def evaluate(engine: str = None, repeat: int = 3) -> Dict[str, Any]:
+    from app.nlu import NLU
+    from app.nlu_engines import load_intent_examples
+    from app.nlu_train import nlp
+    from app.nlu_train_entites import TRAIN_DATA_ENTITIES, aligned_entity_spans
+
+    nlu = NLU(engine=engine, cache_size=0, gazetteer_refresh_seconds=0)
+    intent_examples = load_intent_examples()
+
+    latencies = []
+    intent_pairs = []
+    t0 = time.perf_counter()
+    for i in range(repeat):
+        for text, label in intent_examples:
+            t = time.perf_counter()
+            result = nlu.parse(text)
+            latencies.append((time.perf_counter() - t) * 1000.0)
+            if i == 0:
+                intent_pairs.append((label, result["intent"]))
+    elapsed = time.perf_counter() - t0
+
+    entity_pairs = []
+    for text, annotations in TRAIN_DATA_ENTITIES:
+        gold: Dict[str, set] = {}
+        for span in aligned_entity_spans(nlp.make_doc(text), annotations["entities"]):
+            key = _ENTITY_LABEL_TO_KEY.get(span.label_, span.label_.lower())
+            value = span.text
+            value = nlu._normalize_destination_key(value) if key == "location" else value.lower()
+            gold.setdefault(key, set()).add(value)
+        entities = nlu.parse(text)["entities"]
+        pred = {key: {str(v).lower() for v in entities.get(key, [])} for key in gold.keys() | {"activity", "location"}}
+        entity_pairs.append((gold, {k: v for k, v in pred.items() if v}))
+
+    latencies.sort()
+    return {
+        "engine": type(nlu.engine).__name__,
+        "intents": intent_metrics(intent_pairs),
+        "entities": entity_metrics(entity_pairs),
+        "latency": {
+            "calls": len(latencies),
+            "throughput_per_s": round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+            "mean_ms": round(sum(latencies) / len(latencies), 3),
+            "p50_ms": round(_percentile(latencies, 0.50), 3),
+            "p99_ms": round(_percentile(latencies, 0.99), 3),
+        },
+    }
+
+
+def check_regression(report: Dict[str, Any], baseline: Dict[str, Any], max_accuracy_drop: float,
+                     max_latency_increase: float, latency_slack_ms: float) -> List[str]:
+    """Liste des régressions (vide si aucune)."""
+    failures = []
+    acc, ref_acc = report["intents"]["accuracy"], baseline["intents"]["accuracy"]
+    if acc < ref_acc - max_accuracy_drop:
+        failures.append(f"exactitude {acc} < référence {ref_acc} - {max_accuracy_drop}")
+    for key, metrics in baseline.get("entities", {}).items():
+        f1 = report["entities"].get(key, {}).get("f1", 0.0)
+        if f1 < metrics["f1"] - max_accuracy_drop:
+            failures.append(f"F1 entité '{key}' {f1} < référence {metrics['f1']} - {max_accuracy_drop}")
+    p99, ref_p99 = report["latency"]["p99_ms"], baseline["latency"]["p99_ms"]
+    limit = max(ref_p99 * (1 + max_latency_increase), ref_p99 + latency_slack_ms)
+    if p99 > limit:
+        failures.append(f"p99 {p99} ms > limite {round(limit, 3)} ms (référence {ref_p99} ms)")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", help="moteur NLU (défaut : nlu_config.json)")
+    parser.add_argument("--repeat", type=int, default=3, help="passes de mesure de latence")
+    parser.add_argument("--output", help="écrit le rapport JSON dans ce fichier")
+    parser.add_argument("--baseline", help="rapport de référence à ne pas régresser")
+    parser.add_argument("--save-baseline", help="écrit le rapport comme nouvelle référence")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.01)
+    parser.add_argument("--max-latency-increase", type=float, default=0.5, help="hausse relative tolérée de la p99")
+    parser.add_argument("--latency-slack-ms", type=float, default=0.5, help="hausse absolue tolérée de la p99")
+    args = parser.parse_args()
+
+    report = evaluate(args.engine, args.repeat)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["regressions"] = check_regression(
+            report, baseline, args.max_accuracy_drop, args.max_latency_increase, args.latency_slack_ms)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+
+    if report.get("regressions"):
+        for failure in report["regressions"]:
+            print(f"[eval_nlu] RÉGRESSION : {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Migration des réservations et du planning des activités vers le schéma date ISO + minutes
+(app/booking_schema.py), puis création des index composés.
+
+ - reservations : ajoute date / start / end. Les jours relatifs ("demain", "lundi") sont résolus
+   par rapport à la date de création du document (horodatage de l'ObjectId).
+ - activite.planning : ajoute jour_semaine (ou date pour un créneau ponctuel) / start / end.
+ - reservations.slots : quarts d'heure de chaque réservation existante (index unique multiclé) ;
+   les chevauchements déjà présents en base sont listés dans `double_bookings`.
+ - reservation_slots : ancienne collection de verrous, supprimée (verrous orphelins compris).
+Les champs d'origine (jour, heure_debut, heure_fin) sont conservés. Idempotent.
+
+Usage :
+    python -m scripts.migrate_booking_schema --dry-run
+    python -m scripts.migrate_booking_schema
+"""
+import argparse
+import json
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from app.DB_access import DatabaseMongo
+from app.booking_schema import ensure_indexes, planning_fields, reservation_fields, slot_numbers
+
+
+def migrate_reservations(db, dry_run: bool, batch_size: int) -> dict:
+    collection = db.get_collection("reservations")
+    query = {"$or": [{"date": {"$exists": False}}, {"start": {"$exists": False}}, {"end": {"$exists": False}}]}
+    counts = {"scanned": 0, "updated": 0, "unresolved": []}
+    ops = []
+    for doc in collection.find(query):
+        counts["scanned"] += 1
+        fields = reservation_fields(doc)
+        if not {"date", "start", "end"} <= fields.keys():
+            counts["unresolved"].append({"_id": str(doc["_id"]), "jour": doc.get("jour"),
+                                         "heure_debut": doc.get("heure_debut"), "heure_fin": doc.get("heure_fin")})
+        if fields:
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+        if len(ops) >= batch_size:
+            counts["updated"] += len(ops) if dry_run else collection.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        counts["updated"] += len(ops) if dry_run else collection.bulk_write(ops, ordered=False).modified_count
+    return counts
+
+
+def migrate_planning(db, dry_run: bool) -> dict:
+    collection = db.get_collection("activite")
+    counts = {"activites": 0, "entries": 0, "unresolved": []}
+    for doc in collection.find({"planning.0": {"$exists": True}}):
+        planning = []
+        for entry in doc["planning"]:
+            fields = planning_fields(entry)
+            if "start" not in fields or not ({"jour_semaine", "date"} & fields.keys()):
+                counts["unresolved"].append({"activite": doc.get("nom"), "entry": json.loads(json.dumps(entry, default=str))})
+            planning.append(dict(entry, **fields))
+        if planning != doc["planning"]:
+            counts["activites"] += 1
+            counts["entries"] += len(planning)
+            if not dry_run:
+                collection.update_one({"_id": doc["_id"]}, {"$set": {"planning": planning}})
+    return counts
+
+
+def migrate_reservation_slots(db) -> dict:
+    """Quarts d'heure des réservations déjà migrées (à lancer après ensure_indexes)."""
+    collection = db.get_collection("reservations")
+    counts = {"reservations": 0, "updated": 0, "double_bookings": []}
+    query = {"date": {"$exists": True}, "start": {"$exists": True}, "end": {"$exists": True}}
+    for doc in collection.find(query, {"salle": 1, "date": 1, "start": 1, "end": 1, "slots": 1}):
+        counts["reservations"] += 1
+        slots = slot_numbers(doc["start"], doc["end"])
+        if doc.get("slots") == slots:
+            continue
+        try:
+            counts["updated"] += collection.update_one({"_id": doc["_id"]}, {"$set": {"slots": slots}}).modified_count
+        except DuplicateKeyError:
+            # réservation laissée sans `slots` : à arbitrer à la main avec celle qui occupe déjà le créneau
+            taken = collection.find_one({"salle": doc["salle"], "date": doc["date"], "slots": {"$in": slots},
+                                         "_id": {"$ne": doc["_id"]}}, {"_id": 1, "slots": 1})
+            counts["double_bookings"].append({"_id": str(doc["_id"]), "date": doc["date"],
+                                              "with": str(taken["_id"]) if taken else None,
+                                              "slots": sorted(set(slots) & set(taken["slots"])) if taken else slots})
+    return counts
+
+
+def drop_legacy_slot_locks(db) -> int:
+    """Supprime l'ancienne collection de verrous `reservation_slots` (remplacée par reservations.slots)."""
+    legacy = db.get_collection("reservation_slots")
+    count = legacy.estimated_document_count()
+    legacy.drop()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="affiche ce qui serait modifié sans écrire")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    db = DatabaseMongo()
+    report = {
+        "dry_run": args.dry_run,
+        "reservations": migrate_reservations(db, args.dry_run, args.batch_size),
+        "planning": migrate_planning(db, args.dry_run),
+    }
+    if not args.dry_run:
+        ensure_indexes(db)
+        report["indexes"] = "ok"
+        report["slots"] = migrate_reservation_slots(db)
+        report["legacy_slot_locks_dropped"] = drop_legacy_slot_locks(db)
+    db.close()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
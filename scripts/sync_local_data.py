@@ -0,0 +1,36 @@
+"""
+Copie les collections Atlas (salle, activite, utilisateurs, reservations) vers une base locale,
+pour une borne isolée (DATA_BACKEND=sqlite) ou un jeu de données hors ligne (DATA_BACKEND=memory).
+
+Usage :
+    python -m scripts.sync_local_data --sqlite data/kiosk.db
+    python -m scripts.sync_local_data --json data/seed.json      # puis DATA_SEED_PATH=data/seed.json
+    python -m scripts.sync_local_data --json data/seed.json --sqlite data/kiosk.db
+"""
+import argparse
+import json
+
+from app.DB_access import DatabaseMongo
+from app.repositories import COLLECTIONS, SQLiteDatabase, dump_seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sqlite", help="fichier SQLite à (re)remplir")
+    parser.add_argument("--json", help="fichier JSON étendu à écrire (DATA_SEED_PATH)")
+    parser.add_argument("--collections", nargs="+", default=list(COLLECTIONS))
+    args = parser.parse_args()
+    if not args.sqlite and not args.json:
+        parser.error("--sqlite ou --json requis")
+
+    db = DatabaseMongo()
+    data = {name: list(db.get_collection(name).find({})) for name in args.collections}
+    if args.sqlite:
+        SQLiteDatabase(args.sqlite).import_documents(data)
+    if args.json:
+        dump_seed(args.json, data)
+    print(json.dumps({name: len(docs) for name, docs in data.items()}))
+
+
+if __name__ == "__main__":
+    main()
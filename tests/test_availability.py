@@ -0,0 +1,100 @@
+import datetime
+import threading
+import time
+
+from bson import ObjectId
+
+from app.availability import SLOT_MINUTES, AvailabilityIndex, DayIntervals, build_index
+from app.booking_schema import reservation_fields, resolve_date, slot_locks
+
+
+def test_overlap_uses_half_open_intervals():
+    day = DayIntervals()
+    day.add(14 * 60, 15 * 60)
+    assert day.overlaps(14 * 60 + 30, 15 * 60 + 30)
+    assert not day.overlaps(15 * 60, 16 * 60)
+    assert not day.overlaps(13 * 60, 14 * 60)
+
+
+def test_long_interval_is_found_behind_later_starts():
+    day = DayIntervals()
+    day.add(8 * 60, 20 * 60)
+    day.add(9 * 60, 9 * 60 + 30)
+    day.add(10 * 60, 10 * 60 + 30)
+    assert day.overlaps(18 * 60, 19 * 60)
+
+
+def _index(activites, reservations):
+    index = AvailabilityIndex(reservations_loader=lambda: [], ttl_seconds=3600)
+    index._ensure_fresh = lambda: None
+    index._days = build_index(activites, reservations)
+    return index
+
+
+def test_build_index_merges_weekly_planning_and_dated_reservations():
+    activites = [{"nom": "Yoga", "planning": [{"salle": "s1", "jour": "Lundi", "heure_debut": "9:00", "heure_fin": "10:00"}]}]
+    reservations = [{"salle": "s1", "date": "2026-10-19", "start": 18 * 60, "end": 19 * 60}]
+    index = _index(activites, reservations)
+    # "9:00" < "10:00" alors que la comparaison de chaînes disait l'inverse
+    assert index.is_booked("s1", "2026-10-19", 9 * 60 + 30, 10 * 60 + 30)
+    assert index.is_booked("s1", "2026-10-26", 9 * 60 + 30, 10 * 60 + 30)   # lundi suivant
+    assert index.is_booked("s1", "2026-10-19", 18 * 60, 19 * 60)
+    assert not index.is_booked("s1", "2026-10-26", 18 * 60, 19 * 60)       # réservation datée
+    assert not index.is_booked("s1", "2026-10-19", 10 * 60, 18 * 60)
+
+
+def test_free_starts_skip_occupied_quarters_and_closing_time():
+    index = _index([], [])
+    index.add("s1", "2026-10-19", 9 * 60, 10 * 60 + 10)
+    starts = index.free_starts(["s1"], "2026-10-19", duree=60)[0]
+    assert starts[8 * 60 // SLOT_MINUTES]
+    assert not starts[8 * 60 // SLOT_MINUTES + 1]     # 08:15-09:15 déborde sur 09:00
+    assert not starts[10 * 60 // SLOT_MINUTES]        # 10:00-10:15 encore occupé
+    assert starts[10 * 60 // SLOT_MINUTES + 1]
+    assert not starts[21 * 60 // SLOT_MINUTES + 1]    # finirait après la fermeture
+
+
+def test_legacy_reservation_day_is_resolved_from_creation_date():
+    created = ObjectId.from_datetime(datetime.datetime(2026, 10, 19, 10, 0))  # un lundi
+    fields = reservation_fields({"_id": created, "jour": "demain", "heure_debut": "9:30", "heure_fin": "10:30"})
+    assert fields == {"date": "2026-10-20", "start": 9 * 60 + 30, "end": 10 * 60 + 30}
+
+
+def test_unreadable_days_do_not_resolve():
+    assert resolve_date("2026-10-20") == "2026-10-20"
+    for jour in ("xyz", "2026-13-45", "2026-02-30", ""):
+        assert resolve_date(jour) is None, jour
+
+
+def test_slot_locks_cover_every_touched_quarter():
+    locks = slot_locks("s1", "2026-10-20", 10 * 60 + 10, 11 * 60, "r1")
+    assert [lock["slot"] for lock in locks] == [40, 41, 42, 43]
+    assert {(lock["salle"], lock["date"], lock["reservation"]) for lock in locks} == {("s1", "2026-10-20", "r1")}
+
+
+def test_expired_index_is_refreshed_in_background_without_losing_new_bookings():
+    loaded = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_loader():
+        calls.append(1)
+        if len(calls) > 1:
+            loaded.set()
+            release.wait(2)
+        return [{"salle": "s1", "date": "2026-10-19", "start": 9 * 60, "end": 10 * 60}]
+
+    index = AvailabilityIndex(reservations_loader=slow_loader, ttl_seconds=0)
+    assert index.is_booked("s1", "2026-10-19", 9 * 60, 9 * 60 + 30)    # premier chargement : synchrone
+    started = time.perf_counter()
+    assert not index.is_booked("s1", "2026-10-19", 18 * 60, 19 * 60)  # périmé : relu en arrière-plan
+    assert time.perf_counter() - started < 0.5
+    assert loaded.wait(2)
+    index.add("s1", "2026-10-19", 18 * 60, 19 * 60)                   # réservée pendant la relecture
+    release.set()
+    deadline = time.time() + 2
+    while index.rebuilds < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert index.rebuilds == 2
+    index.ttl = 3600
+    assert index.is_booked("s1", "2026-10-19", 18 * 60, 19 * 60)
@@ -0,0 +1,21 @@
+from app.dialog_routing import RoutingPolicy
+
+ACTIVITIES = ["yoga", "natation"]
+
+
+def test_generic_questions_take_the_fast_path():
+    policy = RoutingPolicy()
+    assert "8h à 22h" in policy.fast_reply("ask_hours", 0.67, "quels sont vos horaires ?", ACTIVITIES, {})
+    assert policy.fast_reply("greeting", 0.9, "bonjour", ACTIVITIES, {"wake_word": ["bonjour"]})
+    assert "yoga, natation" in policy.fast_reply("who_are_you", 0.5, "qui es-tu", ACTIVITIES)
+
+
+def test_specific_or_unsure_questions_go_to_the_llm():
+    policy = RoutingPolicy()
+    text = "À quelle heure commence le cours de yoga ?"
+    assert policy.fast_reply("ask_hours", 0.67, text, ACTIVITIES, {"activity": ["yoga"]}) is None
+    assert policy.fast_reply("ask_hours", 0.67, "horaires demain", ACTIVITIES, {"date": ["2026-10-20"]}) is None
+    assert policy.fast_reply("ask_hours", 0.3, "horaires ?", ACTIVITIES, {}) is None
+    assert policy.fast_reply("greeting", 0.9, "bonjour, c'est combien l'inscription ?", ACTIVITIES, {}) is None
+    assert policy.fast_reply("ask_activities", 0.9, "quelles activités ?", ACTIVITIES, {}) is None
+    assert RoutingPolicy({"enabled": False}).fast_reply("ask_hours", 0.9, "horaires ?", ACTIVITIES, {}) is None
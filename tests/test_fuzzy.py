@@ -0,0 +1,46 @@
+from app.dialog_manager import fuzzy_guess
+from app.fuzzy import FuzzyIndex, max_distance_for
+
+INDEX = FuzzyIndex([
+    ("course", "activity", "course"),
+    ("basket", "activity", "basket"),
+    ("tennis", "activity", "tennis"),
+    ("natation", "activity", "natation"),
+    ("entree", "location", "entree"),
+    ("salle b", "location", "salle_b"),
+    ("vestiaire", "location", "vestiaire"),
+])
+
+
+def test_common_words_are_not_matched_to_catalog_entries():
+    for text in ("quels cours sont proposés", "réserver un cours", "le centre est ouvert ce soir ?",
+                 "où est le court ?", "entre midi et deux"):
+        assert INDEX.find_in_text(text) == [], text
+
+
+def test_short_tokens_allow_at_most_one_edit():
+    assert max_distance_for("bas") == 0
+    assert INDEX.lookup("tenis")["match"] == "tennis"
+    assert INDEX.lookup("court") is None   # même clé phonétique que "course", mais à 2 éditions
+    assert INDEX.lookup("course")["distance"] == 0
+
+
+def test_misheard_entities_are_still_found():
+    found = {f["kind"]: f for f in INDEX.find_in_text("je veux aller à la salle bé")}
+    assert found["location"]["match"] == "salle_b" and found["location"]["distance"] == 1
+    assert INDEX.lookup("natacion")["match"] == "natation"
+
+
+def test_fuzzy_slots_are_confirmed_before_booking():
+    fuzzy = {"activity": ["basket"], "fuzzy": [{"kind": "activity", "input": "basquette", "match": "basket", "distance": 4}]}
+    assert fuzzy_guess("book_activity", fuzzy)["match"] == "basket"
+    assert fuzzy_guess("greeting", fuzzy) is None
+    assert fuzzy_guess("greeting", fuzzy, booking_in_progress=True)["match"] == "basket"
+    exact = {"activity": ["basket"], "fuzzy": [{"kind": "activity", "input": "basket", "match": "basket", "distance": 0}]}
+    assert fuzzy_guess("book_activity", exact) is None
+
+
+def test_unrecognised_turn_with_a_fuzzy_entity_asks_for_confirmation():
+    natacion = {"fuzzy": [{"kind": "location", "input": "natacion", "match": "natation", "distance": 1},
+                          {"kind": "activity", "input": "natacion", "match": "natation", "distance": 1}]}
+    assert fuzzy_guess("unknown", natacion)["kind"] == "activity"
@@ -0,0 +1,32 @@
+from app.history import HistoryManager
+
+
+def _converse(manager, session, turns, system_prompt=""):
+    for i in range(turns):
+        manager.append(session, "user", "question {} : quels sont les horaires de la piscine le samedi ?".format(i), system_prompt)
+        manager.append(session, "assistant", "Réponse {}. La piscine ouvre de 9h à 18h le samedi.".format(i), system_prompt)
+
+
+def test_history_stays_under_budget_with_running_summary():
+    manager = HistoryManager({"budget_tokens": 200, "keep_recent": 2, "summary_tokens": 60})
+    session = {}
+    _converse(manager, session, 20, system_prompt="Tu es un robot d'accueil.")
+    assert manager.prompt_tokens(session, "Tu es un robot d'accueil.") <= 200
+    assert session["history"][-1]["content"].startswith("Réponse 19.")
+    assert session["history"][0]["role"] == "user"
+    summary = session["history_summary"]
+    assert summary["messages"] + len(session["history"]) == 40
+    assert "Réponse" in summary["text"]
+
+
+def test_summarizer_failure_falls_back_to_extractive():
+    def broken(previous, messages, max_tokens):
+        raise RuntimeError("backend indisponible")
+
+    manager = HistoryManager({"budget_tokens": 120, "keep_recent": 2}, summarizer=broken)
+    session = {}
+    _converse(manager, session, 6)
+    system_prompt, messages = manager.prompt(session, "Système.")
+    assert "Visiteur : question" in system_prompt
+    assert [m["role"] for m in messages] == ["user", "assistant"]
+    assert set(messages[0]) == {"role", "content"}
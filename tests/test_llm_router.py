@@ -0,0 +1,175 @@
+import asyncio
+import time
+
+import pytest
+
+from app.llm import LLMError
+from app.llm_router import BackendHealth, CircuitBreaker, LLMRouter, Member
+
+HEDGING = {"min_samples": 1000, "default_delay_ms": 50}
+
+
+class StubClient:
+    """Backend factice : répond `text` après `delay` secondes, ou lève LLMError si `fail` ;
+    `cut` : le flux s'interrompt après son premier fragment."""
+
+    def __init__(self, text, delay=0.0, fail=False, cut=False):
+        self.text = text
+        self.delay = delay
+        self.fail = fail
+        self.cut = cut
+        self.calls = 0
+        self.cancelled = 0
+        self.closed = 0
+
+    def generate_chat(self, system_prompt, history):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise LLMError(self.text + " en panne")
+        return self.text
+
+    def generate_chat_stream(self, system_prompt, history):
+        yield self.generate_chat(system_prompt, history)
+        if self.cut:
+            raise LLMError(self.text + " coupé")
+
+    async def agenerate_chat(self, system_prompt, history):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise LLMError(self.text + " en panne")
+        return self.text
+
+    async def agenerate_chat_stream(self, system_prompt, history):
+        try:
+            yield await self.agenerate_chat(system_prompt, history)
+            if self.cut:
+                raise LLMError(self.text + " coupé")
+            yield "."
+        finally:
+            self.closed += 1
+
+
+def _router(*clients, threshold=3, reset=30.0):
+    breaker = {"failure_threshold": threshold, "reset_seconds": reset}
+    members = [Member("b{}".format(i), c, BackendHealth(breaker)) for i, c in enumerate(clients)]
+    return LLMRouter(members, HEDGING)
+
+
+def test_circuit_opens_after_consecutive_failures_and_probes_once():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.failure()
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open" and not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()  # une seule requête d'essai
+    breaker.failure()
+    assert breaker.state == "open" and breaker.opens == 2
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_hedge_fires_after_delay_and_loser_is_cancelled():
+    slow, fast = StubClient("lent", delay=1.0), StubClient("rapide", delay=0.01)
+    router = _router(slow, fast)
+
+    async def run():
+        started = time.perf_counter()
+        text = await router.agenerate_chat("s", [])
+        await asyncio.sleep(0)
+        return text, time.perf_counter() - started
+
+    text, elapsed = asyncio.run(run())
+    assert text == "rapide" and elapsed < 0.5
+    assert slow.cancelled == 1
+    assert router.members[1].health.hedge_wins == 1
+    assert router.members[0].health.breaker.state == "closed"
+    # en synchrone le perdant finit en arrière-plan, mais la réponse arrive au délai de couverture
+    started = time.perf_counter()
+    assert router.generate_chat("s", []) == "rapide"
+    assert time.perf_counter() - started < 0.5
+
+
+def test_hedged_stream_keeps_first_talker_and_closes_the_other():
+    slow, fast = StubClient("lent", delay=1.0), StubClient("rapide", delay=0.01)
+    router = _router(slow, fast)
+
+    async def run():
+        deltas = [d async for d in router.agenerate_chat_stream("s", [])]
+        await asyncio.sleep(0)
+        return deltas
+
+    assert asyncio.run(run()) == ["rapide", "."]
+    assert slow.cancelled == 1 and slow.closed == 1 and fast.closed == 1
+
+
+def test_failover_on_llm_error():
+    down, up = StubClient("a", fail=True), StubClient("b")
+    router = _router(down, up)
+    assert router.generate_chat("s", []) == "b"
+    assert asyncio.run(router.agenerate_chat("s", [])) == "b"
+    assert list(router.generate_chat_stream("s", [])) == ["b"]
+    assert router.members[0].health.failures == 3
+
+
+def test_all_open_fails_fast_without_calling_backends():
+    down = StubClient("a", fail=True)
+    router = _router(down, threshold=1)
+    with pytest.raises(LLMError):
+        router.generate_chat("s", [])
+    calls = down.calls
+    started = time.perf_counter()
+    with pytest.raises(LLMError, match="écartés"):
+        router.generate_chat("s", [])
+    with pytest.raises(LLMError, match="écartés"):
+        asyncio.run(router.agenerate_chat("s", []))
+    assert down.calls == calls and time.perf_counter() - started < 0.1
+
+
+def test_unused_half_open_backend_keeps_its_probe():
+    a, b = StubClient("a", fail=True), StubClient("b", fail=True)
+    router = _router(a, b, threshold=1, reset=0.05)
+    with pytest.raises(LLMError):
+        router.generate_chat("s", [])
+    time.sleep(0.06)
+    a.fail = False
+    assert router.generate_chat("s", []) == "a"  # b, en essai, n'est pas sollicité
+    assert not router.members[1].health.breaker.probe_in_flight
+    a.fail, b.fail = True, False
+    assert router.generate_chat("s", []) == "b"
+    assert router.members[1].health.breaker.state == "closed"
+
+
+def test_streams_cut_after_the_first_token_trip_the_breaker():
+    cutter = StubClient("a", cut=True)
+    router = _router(cutter, threshold=2)
+
+    async def consume():
+        return [d async for d in router.agenerate_chat_stream("s", [])]
+
+    with pytest.raises(LLMError, match="coupé"):
+        asyncio.run(consume())
+    with pytest.raises(LLMError, match="coupé"):
+        list(router.generate_chat_stream("s", []))
+    health = router.members[0].health
+    assert health.failures == 2 and health.breaker.state == "open"
+    assert health.successes == 0
+
+
+def test_sync_hedge_loser_outcome_is_recorded_and_close_frees_threads():
+    slow, fast = StubClient("lent", delay=0.2, fail=True), StubClient("rapide", delay=0.01)
+    router = _router(slow, fast)
+    assert router.generate_chat("s", []) == "rapide"
+    time.sleep(0.3)  # le perdant finit en arrière-plan : son échec compte pour son disjoncteur
+    assert router.members[0].health.failures == 1
+    router.close()
+    assert router.generate_chat("s", []) == "rapide"  # tour déjà engagé sur l'ancien routeur
@@ -0,0 +1,33 @@
+import pytest
+
+from app import nlu_engines
+from app.nlu_engines import CentroidEngine, clear_shared_models, get_centroid_classifier
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return CentroidEngine({"centroid_threshold": 0.6, "centroid_min_similarity": 0.4})
+
+
+@pytest.mark.parametrize("text", ["merci", "oui", "ok", "d'accord", "au revoir", "il fait beau"])
+def test_acknowledgements_and_out_of_domain_stay_unknown(engine, text):
+    result = engine.parse(text)
+    assert result["intent"] == "inconnu" and result["confidence"] == 0.0
+
+
+@pytest.mark.parametrize("text, intent", [("bonjour", "greeting"), ("salut", "greeting"),
+                                          ("qui es-tu", "who_are_you"), ("où sont les toilettes", "navigate")])
+def test_domain_utterances_keep_their_intent(engine, text, intent):
+    assert engine.parse(text)["intent"] == intent
+
+
+def test_reload_rebuilds_centroids_from_edited_examples(monkeypatch):
+    before = get_centroid_classifier()
+    examples = nlu_engines.load_intent_examples() + [("je voudrais un casier", "navigate")]
+    monkeypatch.setattr(nlu_engines, "load_intent_examples", lambda: examples)
+    clear_shared_models()
+    after = get_centroid_classifier()
+    assert after is not before
+    assert not (after.centroids == before.centroids).all()
+    assert CentroidEngine({}).classifier is after
+    clear_shared_models()  # les tests suivants reconstruisent depuis les vrais exemples
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from pymongo.errors import DuplicateKeyError
+
+from app.booking_schema import SLOTS_INDEX_NAME, SlotTaken, book_slot, reservation_document
+from app.repositories import SQLiteDatabase, memory_repositories, sqlite_repositories
+
+SALLE = ObjectId()
+SEED = {
+    "salle": [{"_id": SALLE, "nom": "Salle A", "activites_supportees": ["yoga"]}],
+    "activite": [{"_id": ObjectId(), "nom": "Yoga"}],
+    "utilisateurs": [{"_id": ObjectId(), "nom": "Martin", "photo": "http://exemple/photo.jpg"}, {"_id": ObjectId()}],
+}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def repositories(request, tmp_path):
+    if request.param == "memory":
+        return memory_repositories(SEED)
+    path = str(tmp_path / "kiosk.db")
+    SQLiteDatabase(path).import_documents(SEED)
+    return sqlite_repositories(path)
+
+
+def test_catalog_keeps_object_ids(repositories):
+    salles, activites = repositories.catalog.load()
+    assert salles[0]["_id"] == SALLE
+    assert [a["nom"] for a in activites] == ["Yoga"]
+    assert [u["nom"] for u in repositories.users.with_photo()] == ["Martin"]
+
+
+def test_overlapping_booking_is_rejected(repositories):
+    repositories.reservations.book(reservation_document(SALLE, "yoga", "demain", "2026-10-20", 600, 660))
+    with pytest.raises(SlotTaken):
+        repositories.reservations.book(reservation_document(SALLE, "yoga", "demain", "2026-10-20", 630, 690))
+    repositories.reservations.book(reservation_document(SALLE, "yoga", "demain", "2026-10-20", 660, 720))
+    assert sorted(r["start"] for r in repositories.reservations.all()) == [600, 660]
+
+
+class _UniqueSlotsCollection:
+    """Collection `reservations` réduite à l'index unique (salle, date, slots) de MongoDB."""
+
+    def __init__(self):
+        self.docs, self.writes = [], 0
+
+    def insert_one(self, doc):
+        self.writes += 1
+        if any(d["salle"] == doc["salle"] and d["date"] == doc["date"] and set(d["slots"]) & set(doc["slots"])
+               for d in self.docs):
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: kiosk.reservations index: "
+                                    f"{SLOTS_INDEX_NAME} dup key", 11000)
+        self.docs.append(doc)
+
+
+def test_mongo_booking_is_a_single_write_carrying_its_slots():
+    reservations = _UniqueSlotsCollection()
+    db = type("Db", (), {"get_collection": lambda self, name: reservations})()
+    book_slot(db, reservation_document(SALLE, "yoga", "demain", "2026-10-20", 600, 660))
+    assert reservations.docs[0]["slots"] == [40, 41, 42, 43]
+    with pytest.raises(SlotTaken):
+        book_slot(db, reservation_document(SALLE, "yoga", "demain", "2026-10-20", 650, 700))
+    assert reservations.writes == 2 and len(reservations.docs) == 1
+
+
+def test_session_turn_round_trip(repositories):
+    store = repositories.create_session_store(3600)
+    sid = store.create_session()
+    with store.turn(sid) as turn:
+        turn.data["history"] = [{"role": "user", "content": "bonjour"}]
+    assert store.get(sid)["history"] == [{"role": "user", "content": "bonjour"}]
+
+
+def test_async_turns_count_their_own_store_ops(repositories):
+    store = repositories.create_session_store(3600)
+    first, second = store.create_session(), store.create_session()
+
+    async def turn(sid, pause):
+        async with store.turn(sid) as t:
+            await asyncio.sleep(pause)  # l'autre tour s'exécute pendant ce temps
+            t.data["n"] = pause
+            await asyncio.to_thread(store.get, sid)  # opération faite dans un thread du tour
+
+    async def both():
+        await asyncio.gather(turn(first, 0.02), turn(second, 0.01))
+
+    asyncio.run(both())
+    stats = store.ops.stats()
+    assert stats["turns"] == 2 and stats["max_ops_per_turn"] == 3  # get + get du thread + update
+    assert store.get(first)["n"] == 0.02
+
+
+def test_upcoming_reservations_skip_past_days(repositories):
+    repositories.reservations.book(reservation_document(SALLE, "hier", "hier", "2026-10-18", 600, 660))
+    repositories.reservations.book(reservation_document(SALLE, "yoga", "demain", "2026-10-20", 600, 660))
+    assert [r["date"] for r in repositories.reservations.upcoming("2026-10-19")] == ["2026-10-20"]
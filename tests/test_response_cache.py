@@ -0,0 +1,17 @@
+from app.response_cache import ResponseCache
+
+
+def test_answers_for_different_days_do_not_share_an_entry():
+    cache = ResponseCache()
+    text = "vous êtes ouverts demain ?"
+    assert cache.cacheable("ask_hours", text)
+    cache.put(cache.key("ask_hours", text, "cat", "2026-10-20"), "Oui, mardi de 8h à 22h.")
+    assert cache.get(cache.key("ask_hours", text, "cat", "2026-10-20")) == "Oui, mardi de 8h à 22h."
+    assert cache.get(cache.key("ask_hours", text, "cat", "2026-10-25")) is None
+
+
+def test_unresolved_relative_times_are_not_cached():
+    cache = ResponseCache()
+    assert cache.cacheable("unknown", "c'est quoi les tarifs")
+    for text in ("vous êtes ouverts ce soir ?", "la piscine est ouverte ce week-end ?", "il y a du monde en ce moment"):
+        assert not cache.cacheable("unknown", text), text
@@ -0,0 +1,15 @@
+from app.streaming import ReplyStream, sentence_chunks
+
+
+def test_sentences_are_emitted_as_soon_as_complete():
+    deltas = ["Oui. La pis", "cine ouvre à 9h", " le samedi. Les tarifs", " enfants : 5,50 €. Bonne", " visite !"]
+    # "Oui." est trop court : regroupé avec la phrase suivante ; "5,50" ne coupe pas la phrase
+    assert list(sentence_chunks(iter(deltas), min_chars=24)) == ["Oui. La piscine ouvre à 9h le samedi.", "Les tarifs enfants : 5,50 €.", "Bonne visite !"]
+
+
+def test_block_reply_is_split_when_nothing_was_streamed():
+    events = []
+    stream = ReplyStream(events.append)
+    stream.finish("Je vais vous guider vers la salle A. Avancez tout droit dans le couloir.", {"type": "navigate"})
+    assert [e["type"] for e in events] == ["actions", "sentence", "sentence", "done"]
+    assert events[0]["actions"] == {"type": "navigate"}
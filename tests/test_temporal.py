@@ -0,0 +1,48 @@
+import datetime
+
+from app.temporal import extract_temporal, heure_to_minutes
+
+# lundi
+TODAY = datetime.date(2026, 10, 19)
+
+
+def test_relative_day_and_hour():
+    slots = extract_temporal("je veux réserver demain à 18h", TODAY)
+    assert slots == {"jour": "demain", "date": "2026-10-20", "heure": "18:00", "minutes": 1080}
+
+
+def test_weekday_resolves_to_next_occurrence():
+    assert extract_temporal("samedi", TODAY)["date"] == "2026-10-24"
+    assert extract_temporal("lundi à 19h30", TODAY)["minutes"] == 19 * 60 + 30
+
+
+def test_month_name_rolls_over_to_next_year():
+    slots = extract_temporal("le 12 mars à 10:00", TODAY)
+    assert slots["date"] == "2027-03-12"
+    assert slots["heure"] == "10:00"
+
+
+def test_date_is_masked_before_hour_search():
+    slots = extract_temporal("le 12/03 à 18", TODAY)
+    assert slots["date"] == "2027-03-12"
+    assert slots["minutes"] == 18 * 60
+
+
+def test_invalid_values_are_ignored():
+    assert extract_temporal("le 31/02", TODAY) == {}
+    assert "minutes" not in extract_temporal("à 25h", TODAY)
+
+
+def test_heure_to_minutes_formats():
+    assert heure_to_minutes("19h") == 1140
+    assert heure_to_minutes("18:30") == 1110
+    assert heure_to_minutes("à 19") == 1140
+    assert heure_to_minutes("19") == 1140
+    assert heure_to_minutes("") is None
+
+
+def test_heure_to_minutes_rejects_out_of_range_times():
+    for heure in ("25h", "99h", "25:00", "24", "19h75", "18:60"):
+        assert heure_to_minutes(heure) is None, heure
+    assert heure_to_minutes("23h59") == 23 * 60 + 59
+    assert heure_to_minutes("0h") == 0